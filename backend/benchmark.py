@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+"""
+Micro-benchmarks for the scoring pipeline.
+
+Times the preprocessing, analysis and model stages on a synthetic email
+corpus (short SMS, long HTML newsletters and URL-heavy phishing), plus
+the predict views through the Django test client, and saves the timings
+as a JSON baseline. Compare a later run against a baseline to see whether
+an upgrade made scoring faster or slower.
+
+Usage (from backend/):
+    python benchmark.py run --output baseline.json
+    python benchmark.py compare baseline.json                # run now and compare
+    python benchmark.py compare baseline.json current.json --threshold 15
+
+compare exits with status 1 when a benchmark regressed by more than the
+threshold (percent, on the median of the fastest round by default).
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+SHORT_HAM = [
+    "Hey {name}, are we still on for {time}?",
+    "Running late, be there in {minutes} min",
+    "Can you pick up milk on the way home?",
+    "Thanks {name}! See you at the meeting {day}.",
+    "Call me when you get this, it's about {day}",
+]
+SHORT_SPAM = [
+    "FREE entry! Txt WIN to {code} to claim your ${amount} prize NOW!!!",
+    "URGENT! Your mobile number has won a {amount} cash award. Call {phone}",
+    "Congratulations {name}, you have been selected for a FREE gift card. Reply YES",
+    "You have 1 new voicemail. Claim your bonus at {url}",
+]
+NEWSLETTER_PARAGRAPHS = [
+    "This week we are excited to share the latest updates from our product team, "
+    "including a redesigned dashboard and faster search across all your projects.",
+    "Join us for our annual conference on {day}. Early bird tickets are available "
+    "until the end of the month, and members save {percent}% on registration.",
+    "Our community grew to {amount} members this quarter. Thank you for reading, "
+    "sharing and sending us your feedback about the articles you enjoyed most.",
+    "Tip of the week: keyboard shortcuts can save you hours. Press ? anywhere in the "
+    "app to see the full list, or read the guide at {url}.",
+    "We updated our privacy policy to explain more clearly how we handle your data. "
+    "No action is needed on your part, but you can review the changes at {url}.",
+]
+PHISHING_TEMPLATES = [
+    "Dear customer, your account has been SUSPENDED due to unusual activity. "
+    "Verify your identity within 24 hours at {url} or {url}. "
+    "Failure to act will result in permanent closure. Security team: {email}",
+    "Your package could not be delivered. Pay the ${amount} redelivery fee at {url} "
+    "Tracking: {url} Questions? Call {phone} or visit {url}",
+    "Invoice #{code} is overdue! Download it from {url} and wire ${amount} today. "
+    "Login from IP {ip} was blocked, confirm it was you at {url}",
+]
+NAMES = ["John", "Priya", "Alex", "Maria", "Chen", "Fatima", "Sam"]
+DAYS = ["Monday", "Tuesday", "tomorrow", "Friday", "next week"]
+DOMAINS = ["secure-login.example.com", "account-verify.example.net", "paypa1-support.example.org",
+           "bit.example.ly", "track-parcel.example.info"]
+
+CORPUS_KINDS = ('sms', 'newsletter', 'phishing')
+
+
+def _fill(template, rng):
+    """Fill a template's placeholders with random values."""
+    url = f"http{'s' if rng.random() < 0.5 else ''}://{rng.choice(DOMAINS)}/{rng.randint(1000, 99999)}?id={rng.randint(1, 10**6)}"
+    return template.format(
+        name=rng.choice(NAMES),
+        time=f"{rng.randint(1, 12)}pm",
+        minutes=rng.randint(5, 30),
+        day=rng.choice(DAYS),
+        code=rng.randint(10000, 99999),
+        amount=f"{rng.randint(1, 999)},{rng.randint(100, 999)}",
+        phone=f"({rng.randint(200, 999)}) {rng.randint(200, 999)}-{rng.randint(1000, 9999)}",
+        percent=rng.randint(5, 50),
+        url=url,
+        email=f"support@{rng.choice(DOMAINS)}",
+        ip='.'.join(str(rng.randint(1, 254)) for _ in range(4)),
+    )
+
+
+def generate_email(kind, rng):
+    """Generate one synthetic email of the given kind."""
+    if kind == 'sms':
+        return _fill(rng.choice(SHORT_HAM + SHORT_SPAM), rng)
+
+    if kind == 'newsletter':
+        paragraphs = ''.join(
+            f"<p>{_fill(rng.choice(NEWSLETTER_PARAGRAPHS), rng)}</p>\n" for _ in range(rng.randint(8, 30)))
+        return (
+            "<html><head><style>body { font-family: Arial; } p { margin: 0 0 1em; }</style></head>\n"
+            f"<body><h1>Weekly Digest</h1>\n{paragraphs}"
+            f"<p><a href=\"{_fill('{url}', rng)}\">Unsubscribe</a> | <a href=\"{_fill('{url}', rng)}\">"
+            "View in browser</a></p></body></html>"
+        )
+
+    if kind == 'phishing':
+        return ' '.join(_fill(rng.choice(PHISHING_TEMPLATES), rng) for _ in range(rng.randint(1, 4)))
+
+    raise ValueError(f'Unknown email kind: {kind}')
+
+
+def generate_corpus(size=60, seed=42):
+    """
+    Return {kind: [emails]} with `size` emails per kind.
+    The same size and seed always produce the same corpus.
+    """
+    rng = random.Random(seed)
+    return {kind: [generate_email(kind, rng) for _ in range(size)] for kind in CORPUS_KINDS}
+
+
+def time_calls(function, inputs, rounds):
+    """
+    Call function on every input, `rounds` times after one warmup round.
+    Returns timing statistics in microseconds. best_p50_us, the median
+    of the fastest round, is the least affected by other load on the
+    machine and is what compare uses by default.
+    """
+    for item in inputs:
+        function(item)
+
+    durations = []
+    round_medians = []
+    # Like timeit, keep garbage collection out of the measurements
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            round_durations = []
+            for item in inputs:
+                start = time.perf_counter_ns()
+                function(item)
+                round_durations.append((time.perf_counter_ns() - start) / 1000)
+            round_medians.append(statistics.median(round_durations))
+            durations.extend(round_durations)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    durations.sort()
+    return {
+        'best_p50_us': round(min(round_medians), 2),
+        'calls': len(durations),
+        'mean_us': round(statistics.fmean(durations), 2),
+        'p50_us': round(durations[len(durations) // 2], 2),
+        'p95_us': round(durations[min(int(len(durations) * 0.95), len(durations) - 1)], 2),
+        'p99_us': round(durations[min(int(len(durations) * 0.99), len(durations) - 1)], 2),
+        'min_us': round(durations[0], 2),
+    }
+
+
+def build_benchmarks(batch_size):
+    """
+    Return {name: (setup, function)}. setup turns an email into the
+    input the timed function receives, outside the timed region.
+    """
+    from django.test import Client
+    from predictor import views
+    from predictor.ml.preprocess import clean_text
+    from predictor.pipeline import PredictionContext
+
+    bundle = views.active_bundle()
+    bundle.load_comparison_models()
+    client = Client()
+
+    def prepared_context(email):
+        # Clean and vectorize up front, so only the stage itself is timed
+        context = PredictionContext(email, bundle)
+        context.text_vector
+        return context
+
+    def post(path, data):
+        response = client.post(path, json.dumps(data), content_type='application/json')
+        if response.status_code != 200:
+            raise RuntimeError(f'{path} returned {response.status_code}: {response.content[:200]}')
+
+    return {
+        'clean_text': (None, clean_text),
+        'analyze_spam_indicators': (None, views.analyze_spam_indicators),
+        'extract_patterns': (None, views.extract_patterns),
+        'get_word_importance': (prepared_context, views.get_word_importance),
+        'get_all_model_predictions': (prepared_context, views.get_all_model_predictions),
+        'predict_view': (lambda email: {'email_text': email},
+                         lambda data: post('/api/predict/', data)),
+        'predict_batch_view': (lambda email: {'emails': [{'id': i, 'text': email} for i in range(batch_size)]},
+                               lambda data: post('/api/predict-batch/', data)),
+    }
+
+
+def run_benchmarks(size=60, seed=42, rounds=5, batch_size=50, only=None):
+    """Run the benchmarks and return the results document."""
+    import django
+    import numpy
+    import sklearn
+    from predictor import views
+    from predictor.cache import VerdictCache
+    from predictor.near_duplicate import NearDuplicateIndex
+
+    if views.active_bundle() is None:
+        raise RuntimeError('Models not loaded. Please train the model first.')
+
+    # Measure the pipeline itself, not cache hits on repeated emails
+    views.verdict_cache = VerdictCache(0, 0)
+    views.near_duplicate_index = NearDuplicateIndex(max_entries=0)
+
+    corpus = generate_corpus(size, seed)
+    results = {}
+    for name, (setup, function) in build_benchmarks(batch_size).items():
+        if only and name not in only:
+            continue
+        for kind, emails in corpus.items():
+            inputs = [setup(email) for email in emails] if setup else emails
+            # A batch request already scores batch_size emails
+            batch_rounds = max(1, rounds // 5) if name == 'predict_batch_view' else rounds
+            results[f'{name}/{kind}'] = time_calls(function, inputs, batch_rounds)
+            print(f"   {name}/{kind}: p50 {results[f'{name}/{kind}']['best_p50_us']:.1f} us")
+
+    return {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': numpy.__version__,
+            'sklearn': sklearn.__version__,
+            'django': django.__version__,
+            'model_version': views.active_bundle().version,
+            'compiled_scorer': views.active_bundle().compiled_scorer is not None,
+            'corpus_size': size,
+            'seed': seed,
+            'rounds': rounds,
+            'batch_size': batch_size,
+        },
+        'results': results,
+    }
+
+
+def compare_results(baseline, current, threshold=15.0, metric='best_p50_us'):
+    """
+    Compare two results documents.
+    Returns a list of (name, baseline value, current value, change in %,
+    status) where status is "regression", "improvement" or "ok".
+    """
+    rows = []
+    for name, current_stats in current['results'].items():
+        baseline_stats = baseline['results'].get(name)
+        if baseline_stats is None:
+            continue
+        before, after = baseline_stats[metric], current_stats[metric]
+        change = (after - before) / before * 100 if before else 0.0
+        if change > threshold:
+            status = 'regression'
+        elif change < -threshold:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append((name, before, after, change, status))
+    return rows
+
+
+def setup_django():
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'spam_detection.settings')
+    import django
+    from django.test.utils import setup_test_environment
+    django.setup()
+    setup_test_environment()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the spam scoring pipeline.')
+    parser.add_argument('--size', type=int, default=60, help='Emails per corpus kind')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--rounds', type=int, default=5, help='Timed passes over the corpus')
+    parser.add_argument('--batch-size', type=int, default=50, help='Emails per batch request')
+    parser.add_argument('--only', help='Comma-separated benchmark names')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='Run the benchmarks and save the results')
+    run_parser.add_argument('--output', default=f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    compare_parser = commands.add_parser('compare', help='Compare results against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current', nargs='?', help='Saved results (default: run now)')
+    compare_parser.add_argument('--threshold', type=float, default=15.0, help='Allowed slowdown in %%')
+    compare_parser.add_argument('--metric', default='best_p50_us',
+                                choices=['best_p50_us', 'mean_us', 'p50_us', 'p95_us', 'p99_us', 'min_us'])
+    compare_parser.add_argument('--output', help='Also save the new results here')
+    args = parser.parse_args()
+    only = set(args.only.split(',')) if args.only else None
+
+    if args.command == 'compare':
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    if args.command == 'compare' and args.current:
+        with open(args.current, encoding='utf-8') as f:
+            current = json.load(f)
+    else:
+        setup_django()
+        print("⏱️ Running benchmarks...")
+        current = run_benchmarks(args.size, args.seed, args.rounds, args.batch_size, only)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(current, f, indent=2)
+            print(f"✅ Results saved to {args.output}")
+
+    if args.command == 'run':
+        return 0
+
+    rows = compare_results(baseline, current, args.threshold, args.metric)
+    print(f"\n{'benchmark':<42} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, before, after, change, status in rows:
+        marker = {'regression': '❌', 'improvement': '✅', 'ok': '  '}[status]
+        print(f"{name:<42} {before:>10.1f} {after:>10.1f} {change:>+7.1f}% {marker}")
+
+    regressions = [row for row in rows if row[4] == 'regression']
+    if regressions:
+        print(f"\n❌ {len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold}%")
+        return 1
+    print(f"\n✅ No regressions above {args.threshold}% ({args.metric})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
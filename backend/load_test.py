@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+"""
+Load generator for the spam detection API.
+
+Drives /api/predict/, /api/predict-batch/ or /api/predict-stream/ on a
+running server (runserver, gunicorn or uvicorn) and reports throughput
+and latency percentiles. Uses only the standard library, with one
+keep-alive connection per worker thread (--no-keepalive opens a new
+connection per request). Django's runserver writes response headers and
+body separately, which stalls reused connections for ~40 ms (Nagle's
+algorithm against delayed ACKs); use --no-keepalive when testing it.
+
+Two ways to apply load:
+
+    closed loop   --concurrency N workers each send their next request as
+                  soon as the previous one completes
+    open loop     --rate R schedules R requests per second regardless of
+                  how fast the server answers; latency is measured from
+                  the scheduled send time, so queueing delay is included
+
+Request bodies come from the synthetic corpus in benchmark.py, or are
+replayed from a recorded JSON Lines file (--replay). Each line is either
+a request body for the chosen endpoint, e.g. {"email_text": "..."}, or
+{"path": "/api/predict/", "body": {...}, "ts": 12.5}. A string body is
+sent as is (NDJSON for the stream endpoint). With --replay-timing the
+recorded "ts" offsets (seconds) set the send schedule, sped up by --speed.
+
+Usage (from backend/, with the server running):
+    python load_test.py --concurrency 8 --duration 30
+    python load_test.py --endpoint batch --batch-size 50 --rate 20 --duration 60
+    python load_test.py --replay traffic.jsonl --replay-timing --speed 2 --output run.json
+"""
+import argparse
+import http.client
+import itertools
+import json
+import math
+import queue
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+ENDPOINTS = {
+    'predict': '/api/predict/',
+    'batch': '/api/predict-batch/',
+    'stream': '/api/predict-stream/',
+}
+PERCENTILES = (50, 95, 99, 99.9)
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    # Smallest value with at least q% of the values at or below it
+    rank = max(1, math.ceil(round(q * len(sorted_values) / 100, 9)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def synthetic_requests(endpoint, batch_size=20, detail=None, size=200, seed=42):
+    """
+    Build request dicts ({"path", "body"}) from the benchmark corpus,
+    mixing the email kinds.
+    """
+    from benchmark import generate_corpus
+
+    corpus = generate_corpus(size, seed)
+    emails = [email for group in zip(*corpus.values()) for email in group]
+    path = ENDPOINTS[endpoint]
+    rng = random.Random(seed)
+
+    if endpoint == 'predict':
+        bodies = [{'email_text': email} for email in emails]
+        if detail:
+            bodies = [dict(body, detail=detail) for body in bodies]
+        return [{'path': path, 'body': body} for body in bodies]
+
+    requests = []
+    for start in range(0, len(emails), batch_size):
+        chunk = emails[start:start + batch_size]
+        if len(chunk) < batch_size:
+            chunk += rng.sample(emails, batch_size - len(chunk))
+        entries = [{'id': i, 'text': email} for i, email in enumerate(chunk)]
+        if endpoint == 'batch':
+            body = {'emails': entries}
+            if detail:
+                body['detail'] = detail
+            requests.append({'path': path, 'body': body})
+        else:
+            query = f'?detail={detail}' if detail else ''
+            requests.append({'path': path + query,
+                             'body': ''.join(json.dumps(entry) + '\n' for entry in entries)})
+    return requests
+
+
+def load_replay(path, endpoint):
+    """Read recorded requests from a JSON Lines file."""
+    requests = []
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError(f'{path}:{line_number}: expected a JSON object')
+            if 'body' in record:
+                requests.append({'path': record.get('path', ENDPOINTS[endpoint]),
+                                 'body': record['body'], 'ts': record.get('ts')})
+            else:
+                requests.append({'path': ENDPOINTS[endpoint], 'body': record})
+    if not requests:
+        raise ValueError(f'{path} contains no requests')
+    return requests
+
+
+def encode_request(request):
+    """Return (path, body bytes, content type) for a request dict."""
+    body = request['body']
+    if isinstance(body, str):
+        content_type = 'application/x-ndjson' if 'predict-stream' in request['path'] else 'application/json'
+        return request['path'], body.encode('utf-8'), content_type
+    return request['path'], json.dumps(body).encode('utf-8'), 'application/json'
+
+
+class Recorder:
+    """Collects latencies and outcomes from all workers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.first_byte = []
+        self.outcomes = Counter()
+        self.bytes_received = 0
+        self.started = None
+        self.finished = None
+
+    def record(self, latency, first_byte, outcome, size):
+        with self._lock:
+            self.outcomes[outcome] += 1
+            if outcome == '200':
+                self.latencies.append(latency)
+                self.first_byte.append(first_byte)
+                self.bytes_received += size
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        latencies = sorted(self.latencies)
+        first_byte = sorted(self.first_byte)
+        total = sum(self.outcomes.values())
+        to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+        return {
+            'requests': total,
+            'succeeded': len(latencies),
+            'failed': total - len(latencies),
+            'error_rate': round((total - len(latencies)) / total, 4) if total else 0.0,
+            'outcomes': dict(self.outcomes),
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+            'received_mb': round(self.bytes_received / 1e6, 3),
+            'latency_ms': {
+                'mean': to_ms(sum(latencies) / len(latencies)) if latencies else None,
+                **{f'p{q:g}': to_ms(percentile(latencies, q)) for q in PERCENTILES},
+                'max': to_ms(latencies[-1]) if latencies else None,
+            },
+            'first_byte_ms': {f'p{q:g}': to_ms(percentile(first_byte, q)) for q in PERCENTILES},
+        }
+
+
+class Worker(threading.Thread):
+    """Sends requests over one keep-alive connection."""
+
+    def __init__(self, host, port, scheme, timeout, jobs, recorder, headers, keepalive=True):
+        super().__init__(daemon=True)
+        self.host, self.port, self.scheme, self.timeout = host, port, scheme, timeout
+        self.keepalive = keepalive
+        self.jobs = jobs
+        self.recorder = recorder
+        self.headers = headers
+        self.connection = None
+
+    def connect(self):
+        connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(self.host, self.port, timeout=self.timeout)
+
+    def send(self, path, body, content_type):
+        """Send one request. Returns (time to first byte, outcome, response size)."""
+        if self.connection is None:
+            self.connect()
+        start = time.perf_counter()
+        try:
+            self.connection.request('POST', path, body=body, headers={
+                'Content-Type': content_type,
+                'Connection': 'keep-alive' if self.keepalive else 'close',
+                **self.headers})
+            response = self.connection.getresponse()
+            first_byte = time.perf_counter() - start
+            size = len(response.read())
+            if not self.keepalive or response.getheader('Connection', '').lower() == 'close':
+                self.connection.close()
+                self.connection = None
+            return first_byte, str(response.status), size
+        except (OSError, http.client.HTTPException) as e:
+            self.connection.close()
+            self.connection = None
+            return time.perf_counter() - start, type(e).__name__, 0
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                break
+            scheduled, (path, body, content_type), measured = job
+            # Open-loop jobs carry their scheduled time: waiting in the queue counts
+            start = scheduled if scheduled is not None else time.perf_counter()
+            send_start = time.perf_counter()
+            first_byte, outcome, size = self.send(path, body, content_type)
+            if measured:
+                latency = time.perf_counter() - start
+                self.recorder.record(latency, first_byte + (send_start - start), outcome, size)
+            self.jobs.task_done()
+        if self.connection is not None:
+            self.connection.close()
+
+
+def run_load(url, requests, concurrency=8, duration=None, total=None, rate=None,
+             replay_timing=False, speed=1.0, warmup=0, timeout=30.0, headers=None, keepalive=True):
+    """
+    Apply load and return the Recorder. Stops after `total` requests or
+    `duration` seconds, whichever comes first; replays stop at the end
+    of the recording when replay_timing is set.
+    """
+    parts = urlsplit(url)
+    recorder = Recorder()
+    # Closed loop: a full queue blocks the producer until a worker is free
+    jobs = queue.Queue(maxsize=concurrency if rate is None and not replay_timing else 0)
+    workers = [Worker(parts.hostname, parts.port, parts.scheme, timeout, jobs, recorder,
+                      headers or {}, keepalive)
+               for _ in range(concurrency)]
+    for worker in workers:
+        worker.start()
+
+    encoded = [encode_request(request) for request in requests]
+    # Warm up connections and server caches before measuring
+    for request in itertools.islice(itertools.cycle(encoded), warmup):
+        jobs.put((None, request, False))
+    jobs.join()
+
+    recorder.started = time.perf_counter()
+    deadline = recorder.started + duration if duration else None
+
+    if replay_timing:
+        offsets = [request.get('ts') for request in requests]
+        if any(offset is None for offset in offsets):
+            raise ValueError('--replay-timing needs a "ts" in every recorded request')
+        first = min(offsets)
+        schedule = ((recorder.started + (offset - first) / speed, request)
+                    for offset, request in sorted(zip(offsets, encoded), key=lambda item: item[0]))
+    elif rate:
+        interval = 1.0 / rate
+        schedule = ((recorder.started + i * interval, request)
+                    for i, request in enumerate(itertools.cycle(encoded)))
+    else:
+        schedule = ((None, request) for request in itertools.cycle(encoded))
+
+    for sent, (scheduled, request) in enumerate(schedule):
+        if total is not None and sent >= total:
+            break
+        now = time.perf_counter()
+        if deadline is not None and (scheduled or now) >= deadline:
+            break
+        if scheduled is not None and scheduled > now:
+            time.sleep(scheduled - now)
+        jobs.put((scheduled, request, True))
+
+    for _ in workers:
+        jobs.put(None)
+    for worker in workers:
+        worker.join()
+    recorder.finished = time.perf_counter()
+    return recorder
+
+
+def print_summary(summary):
+    latency = summary['latency_ms']
+    print(f"\n📊 {summary['requests']} requests in {summary['elapsed_s']:.1f}s "
+          f"({summary['throughput_rps']:.1f} req/s), {summary['failed']} failed")
+    if summary['failed']:
+        print(f"   Outcomes: {summary['outcomes']}")
+    if latency['mean'] is None:
+        return
+    print("   Latency (ms): " + '  '.join(
+        f"{name} {latency[name]:.2f}" for name in ('mean', 'p50', 'p95', 'p99', 'p99.9', 'max')))
+    first_byte = summary['first_byte_ms']
+    print("   First byte (ms): " + '  '.join(
+        f"{name} {first_byte[name]:.2f}" for name in ('p50', 'p95', 'p99', 'p99.9')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the spam detection API.')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='Server base URL')
+    parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='predict')
+    parser.add_argument('--concurrency', type=int, default=8, help='Worker threads (requests in flight)')
+    parser.add_argument('--rate', type=float, help='Open loop: requests per second')
+    parser.add_argument('--duration', type=float, help='Seconds to run (default 10 unless --requests)')
+    parser.add_argument('--requests', type=int, help='Number of measured requests')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests sent first')
+    parser.add_argument('--batch-size', type=int, default=20, help='Emails per batch/stream request')
+    parser.add_argument('--detail', choices=['minimal', 'standard', 'full'], help='Response detail level')
+    parser.add_argument('--replay', help='JSON Lines file of recorded requests')
+    parser.add_argument('--replay-timing', action='store_true', help='Send at the recorded "ts" offsets')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed-up factor')
+    parser.add_argument('--header', action='append', default=[], help='Extra header, "Name: value"')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--no-keepalive', dest='keepalive', action='store_false',
+                        help='Open a new connection for every request')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='Exit with 1 above this error rate')
+    parser.add_argument('--output', help='Save the configuration and results as JSON')
+    args = parser.parse_args()
+
+    if args.duration is None and args.requests is None and not args.replay_timing:
+        args.duration = 10.0
+    headers = dict(header.split(':', 1) for header in args.header)
+    headers = {name.strip(): value.strip() for name, value in headers.items()}
+
+    if args.replay:
+        requests = load_replay(args.replay, args.endpoint)
+    else:
+        requests = synthetic_requests(args.endpoint, args.batch_size, args.detail)
+
+    mode = 'replay' if args.replay_timing else (f'{args.rate:g} req/s' if args.rate else 'closed loop')
+    print(f"🚀 {args.url} ({args.endpoint}, {mode}, concurrency {args.concurrency}, "
+          f"{len(requests)} distinct requests)")
+    recorder = run_load(args.url, requests, args.concurrency, args.duration, args.requests, args.rate,
+                        args.replay_timing, args.speed, args.warmup, args.timeout, headers,
+                        args.keepalive)
+    summary = recorder.summary()
+    print_summary(summary)
+
+    if args.output:
+        config = {key: value for key, value in vars(args).items() if key not in ('output', 'header')}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': config, 'results': summary}, f, indent=2)
+        print(f"✅ Results saved to {args.output}")
+
+    if summary['requests'] and summary['error_rate'] > args.max_error_rate:
+        print(f"❌ Error rate {summary['error_rate']:.2%} is above {args.max_error_rate:.2%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
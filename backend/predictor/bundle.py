@@ -0,0 +1,341 @@
+"""
+Versioned model bundles with atomic hot reload.
+
+A ModelBundle holds everything one model version needs to serve
+requests: the default model, the vectorizer, the word importance tables,
+the optional compiled scorer and (loaded on first use) the comparison
+models. Requests take the active bundle once and only use that object,
+so a reload can never pair a new vectorizer with an old model.
+
+Bundles are loaded from a version of the model registry (see
+ml/registry.py), whose files are checked against the manifest's hashes
+and whose warmup corpus must score as recorded at training time, or
+from the loose files in predictor/ml/ when no registry version exists.
+
+BundleManager loads and warms a new bundle while the old one keeps
+serving, then swaps it in with a single assignment. Reloads are
+triggered explicitly (the admin endpoint) or by a background thread
+that polls the artifact files for changes.
+"""
+import filecmp
+import hashlib
+import os
+import threading
+import time
+
+from .ml.artifacts import load_artifact
+from .ml.compiled import CompiledScorer
+from .ml.explain import WordImportanceExplainer
+from .ml.linear import LinearEnsemble
+from .ml.preprocess import clean_text
+from .ml.registry import IntegrityError, read_manifest, verify_version
+
+# Scored when a bundle without a warmup corpus is warmed, before it
+# serves its first request
+WARMUP_TEXTS = [
+    "congratulations you have won a free cash prize claim now",
+    "are we still meeting for lunch tomorrow",
+]
+
+
+def compute_model_version(paths):
+    """
+    Fingerprint model artifacts from their names, sizes and mtimes.
+    Retraining or replacing any file produces a new version.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            digest.update(f'{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    return digest.hexdigest()[:12]
+
+
+class ModelBundle:
+    """
+    One loaded model version.
+
+    Args:
+        model: Default (fitted) model
+        vectorizer: Fitted TfidfVectorizer
+        version: Version string reported on /api/health/ and used in cache keys
+        compiled_scorer: Optional CompiledScorer for the default model
+        comparison_paths: Mapping of model name to pickle path for model comparison
+        model_path: Path the default model was loaded from; comparison
+            files identical to it reuse the default model object
+        mmap: Memory-map the comparison models' arrays
+        metrics: Training metrics from the registry manifest
+        warmup_corpus: List of {"text", "prediction"} dicts scored by
+            warmup(); defaults to WARMUP_TEXTS without expected predictions
+    """
+
+    def __init__(self, model, vectorizer, version, compiled_scorer=None,
+                 comparison_paths=None, model_path=None, mmap=True,
+                 metrics=None, warmup_corpus=None):
+        self.model = model
+        self.vectorizer = vectorizer
+        self.version = version
+        self.compiled_scorer = compiled_scorer
+        self.metrics = metrics or {}
+        self.warmup_corpus = warmup_corpus or [{'text': text} for text in WARMUP_TEXTS]
+        self.explainer = WordImportanceExplainer(vectorizer, model)
+        # A linear default model is scored with one product instead of
+        # sklearn's predict_proba + predict (two libsvm passes for SVC)
+        self.default_engine = LinearEnsemble({'default': model})
+        self.loaded_at = time.time()
+
+        self.comparison_paths = dict(comparison_paths or {})
+        self.model_path = model_path
+        self.mmap = mmap
+        self.comparison_models = {}
+        self.comparison_engine = None
+        self.comparison_loaded = False
+        self._comparison_lock = threading.Lock()
+
+    def load_comparison_models(self):
+        """
+        Load the models used for model comparison, once, on first use.
+        Safe to call from several threads. Returns the loaded models.
+        """
+        if self.comparison_loaded:
+            return self.comparison_models
+
+        with self._comparison_lock:
+            if self.comparison_loaded:
+                return self.comparison_models
+
+            models = {}
+            for model_name, path in self.comparison_paths.items():
+                if os.path.exists(path):
+                    try:
+                        if self.model_path and filecmp.cmp(path, self.model_path, shallow=False):
+                            # Same artifact as the default model: share the object
+                            # so each request runs it only once
+                            models[model_name] = self.model
+                        else:
+                            models[model_name] = load_artifact(path, mmap=self.mmap)
+                        print(f"✅ {model_name} loaded!")
+                    except Exception as e:
+                        print(f"⚠️ Could not load {model_name}: {e}")
+
+            # Linear comparison models are scored together in one product
+            self.comparison_engine = LinearEnsemble(models)
+            if self.comparison_engine.names:
+                print(f"✅ Stacked {len(self.comparison_engine.names)} linear models for comparison")
+
+            self.comparison_models = models
+            self.comparison_loaded = True
+            return models
+
+    def warmup(self):
+        """
+        Score the warmup corpus with every loaded model, so the first
+        request does not pay first-call costs.
+        Raises ValueError if the default model does not reproduce the
+        predictions recorded with the corpus.
+        """
+        cleaned_texts = [clean_text(item['text']) for item in self.warmup_corpus]
+        text_matrix = self.vectorizer.transform(cleaned_texts)
+        if hasattr(self.model, 'predict_proba'):
+            self.model.predict_proba(text_matrix)
+        predictions = self.model.predict(text_matrix)
+        self.explainer.explain(text_matrix[0])
+        if self.compiled_scorer is not None:
+            compiled_predictions = [self.compiled_scorer.predict(*self.compiled_scorer.vectorize(text))[0]
+                                    for text in cleaned_texts]
+            if list(compiled_predictions) != list(predictions):
+                raise ValueError('Compiled scorer and model disagree on the warmup corpus')
+        if self.comparison_engine is not None:
+            self.comparison_engine.score(text_matrix)
+
+        # Recorded labels are strings in the manifest; models may predict 0/1 or numpy ints
+        mismatches = sum(1 for item, prediction in zip(self.warmup_corpus, predictions)
+                         if 'prediction' in item and str(item['prediction']) != str(prediction))
+        if mismatches:
+            raise ValueError(f'{mismatches} of {len(self.warmup_corpus)} warmup predictions '
+                             f'differ from the ones recorded at training time')
+
+
+def load_model_bundle(model_path, vectorizer_path, comparison_paths=None, version=None,
+                      compiled_dir=None, mmap=True, **bundle_options):
+    """
+    Load a ModelBundle from artifact files.
+    compiled_dir enables the compiled scorer; it is skipped (with a
+    warning) when missing or compiled from other model files.
+    bundle_options are passed on to ModelBundle.
+    Raises if the model or vectorizer cannot be loaded or do not fit together.
+    """
+    model = load_artifact(model_path, mmap=mmap)
+    vectorizer = load_artifact(vectorizer_path, mmap=mmap)
+
+    n_features = getattr(model, 'n_features_in_', None)
+    if n_features is not None and n_features != len(vectorizer.vocabulary_):
+        raise ValueError(f'Model expects {n_features} features but the vectorizer '
+                         f'produces {len(vectorizer.vocabulary_)}')
+
+    compiled_scorer = None
+    if compiled_dir:
+        compiled_scorer = load_compiled_scorer(compiled_dir, model_path, vectorizer_path, mmap)
+
+    if version is None:
+        version = compute_model_version([model_path, vectorizer_path] + list((comparison_paths or {}).values()))
+
+    return ModelBundle(model, vectorizer, version, compiled_scorer=compiled_scorer,
+                       comparison_paths=comparison_paths, model_path=model_path, mmap=mmap,
+                       **bundle_options)
+
+
+def load_registry_bundle(registry_dir, version, use_compiled=False, mmap=True):
+    """
+    Load a version of the model registry as a ModelBundle.
+    Raises IntegrityError if a file does not match the manifest.
+    """
+    version_dir, manifest = read_manifest(registry_dir, version)
+    verify_version(version_dir, manifest)
+
+    models = manifest['models']
+    if manifest['default_model'] not in models:
+        raise IntegrityError(f"Default model {manifest['default_model']!r} is not in the manifest")
+    compiled_dir = None
+    if use_compiled and manifest['compiled']:
+        compiled_dir = os.path.join(version_dir, manifest['compiled'])
+
+    return load_model_bundle(
+        os.path.join(version_dir, models[manifest['default_model']]),
+        os.path.join(version_dir, manifest['vectorizer']),
+        {name: os.path.join(version_dir, filename) for name, filename in models.items()},
+        version=version, compiled_dir=compiled_dir, mmap=mmap,
+        metrics=manifest['metrics'], warmup_corpus=manifest['warmup'] or None,
+    )
+
+
+def load_compiled_scorer(compiled_dir, model_path, vectorizer_path, mmap=True):
+    """
+    Load the compiled scorer if it was built from the given model files.
+    Returns None (and predictions use sklearn) otherwise.
+    """
+    try:
+        scorer = CompiledScorer(compiled_dir, mmap=mmap)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Compiled scorer not available ({e}). Run: python -m predictor.ml.compiled")
+        return None
+    if not scorer.matches_sources({'model': model_path, 'vectorizer': vectorizer_path}):
+        print("⚠️ Compiled scorer is out of date. Run: python -m predictor.ml.compiled")
+        return None
+    print("✅ Compiled scorer loaded!")
+    return scorer
+
+
+class BundleManager:
+    """
+    Holds the active ModelBundle and replaces it on reload.
+
+    Args:
+        loader: Callable returning a new, loaded ModelBundle
+        fingerprint: Callable returning the version the artifact files
+            currently have (compared with the active bundle's version)
+    """
+
+    def __init__(self, loader, fingerprint):
+        self._loader = loader
+        self._fingerprint = fingerprint
+        self._bundle = None
+        self._reload_lock = threading.Lock()
+        self._reloads = 0
+        self._last_error = None
+        self._watch_interval = 0
+        self._watch_stop = None
+        self._fork_hook_registered = False
+
+    @property
+    def bundle(self):
+        """The active bundle, or None if no model could be loaded."""
+        return self._bundle
+
+    def reload(self, force=False):
+        """
+        Load, warm and activate a new bundle unless the artifact files
+        are unchanged (or force is set). The active bundle keeps serving
+        until the swap and stays active if loading fails.
+        Returns True if a new bundle was activated.
+        """
+        with self._reload_lock:
+            current = self._bundle
+            if not force and current is not None and current.version == self._fingerprint():
+                return False
+            try:
+                bundle = self._loader()
+                # Keep comparison available without a lazy-load pause after the swap
+                if current is not None and current.comparison_loaded:
+                    bundle.load_comparison_models()
+                bundle.warmup()
+            except Exception as e:
+                self._last_error = f'{type(e).__name__}: {e}'
+                raise
+            # A single reference assignment: requests see the old or the new bundle
+            self._bundle = bundle
+            self._last_error = None
+            if current is not None:
+                self._reloads += 1
+                print(f"🔄 Models reloaded: {current.version} -> {bundle.version}")
+            return True
+
+    def start_watcher(self, interval):
+        """
+        Poll the artifact files every `interval` seconds in a daemon thread
+        and reload when they changed. A change must be seen on two polls
+        in a row, so files still being written are not loaded.
+        """
+        self.stop_watcher()
+        self._watch_interval = interval
+        self._watch_stop = threading.Event()
+        thread = threading.Thread(target=self._watch, args=(interval, self._watch_stop),
+                                  name='model-watcher', daemon=True)
+        thread.start()
+        if not self._fork_hook_registered and hasattr(os, 'register_at_fork'):
+            # Threads do not survive fork (e.g. gunicorn --preload): restart in each worker
+            os.register_at_fork(after_in_child=self._restart_watcher_after_fork)
+            self._fork_hook_registered = True
+
+    def stop_watcher(self):
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+            self._watch_stop = None
+        self._watch_interval = 0
+
+    def _restart_watcher_after_fork(self):
+        self._reload_lock = threading.Lock()
+        if self._watch_interval:
+            self.start_watcher(self._watch_interval)
+
+    def _watch(self, interval, stop):
+        pending = None
+        failed = None
+        while not stop.wait(interval):
+            try:
+                version = self._fingerprint()
+                current = self._bundle
+                if (current is not None and version == current.version) or version == failed:
+                    # Unchanged, or a version that already failed to load
+                    pending = None
+                elif version != pending:
+                    # Changed since the last poll: wait until the files settle
+                    pending = version
+                else:
+                    pending = None
+                    failed = version
+                    self.reload()
+                    failed = None
+            except Exception as e:
+                print(f"⚠️ Model reload failed: {e}")
+
+    def stats(self):
+        """Return the active version and reload counters."""
+        bundle = self._bundle
+        return {
+            'version': bundle.version if bundle is not None else None,
+            'loaded_at': bundle.loaded_at if bundle is not None else None,
+            'reloads': self._reloads,
+            'last_error': self._last_error,
+            'watch_interval': self._watch_interval,
+        }
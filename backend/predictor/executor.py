@@ -0,0 +1,85 @@
+"""
+Bounded executor for running CPU-heavy prediction work off the event loop.
+
+Async views hand preprocessing and inference to a fixed-size thread pool
+so the ASGI event loop stays free for health checks and new requests.
+Once the pool and its queue are full, new work is rejected immediately
+instead of piling up.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorSaturated(Exception):
+    """Raised when the executor's queue is full and work is rejected."""
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a bounded queue and usage counters.
+
+    Args:
+        max_workers: Number of threads running prediction work
+        max_queue: Number of jobs allowed to wait for a free thread
+    """
+
+    def __init__(self, max_workers, max_queue):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers,
+                                        thread_name_prefix='prediction')
+        self._lock = threading.Lock()
+        self._pending = 0  # queued + running
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+
+    async def run(self, fn, *args):
+        """
+        Run fn(*args) on the pool and await its result.
+        Raises ExecutorSaturated if the queue is full.
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise ExecutorSaturated(
+                    f'Prediction queue is full ({self.max_queue} waiting)')
+            self._pending += 1
+
+        future = self._pool.submit(self._call, fn, args)
+        # Release the slot when the job finishes or is cancelled,
+        # even if the awaiting request has gone away.
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _call(self, fn, args):
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+            if not future.cancelled():
+                self._completed += 1
+
+    def stats(self):
+        """Return queue depth and usage counters."""
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'active': self._running,
+                'queue_depth': self._pending - self._running,
+                'completed': self._completed,
+                'rejected': self._rejected,
+            }
+
+    def shutdown(self):
+        """Stop accepting work and let running jobs finish."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
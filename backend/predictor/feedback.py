@@ -0,0 +1,307 @@
+"""
+Online learning from corrected labels.
+
+POST /api/feedback/ appends a corrected label to a JSON-lines log. The
+OnlineLearner folds new log entries into an incrementally trainable
+model (MultinomialNB.partial_fit by default) and publishes the result
+as a new model registry version, a checkpoint, which BundleManager
+swaps into serving like any other version. A misclassified campaign is
+therefore corrected within one learning interval, without retraining
+on the whole dataset.
+
+A checkpoint starts from the active version and continues its online
+model with the vectorizer unchanged, so the feature space stays fixed.
+The updated model becomes the default model of the checkpoint, and so
+serves /api/predict/, only if it still reproduces the verdicts recorded
+for the parent's warmup corpus; otherwise the parent's default model
+keeps serving and the updated model is published alongside it.
+serve_online_model=False always keeps the parent's default model.
+Its manifest records which model was updated and how far the log has
+been read (training.feedback_offset). That makes the learner safe to
+run in every worker process: a round takes a file lock, reads the
+offset from the active version and only learns what that version has
+not seen. A version trained from scratch records no offset, so all
+logged feedback is applied to it as well; archive the log once its
+corrections are part of the training data.
+
+Only the newest `keep_checkpoints` checkpoints are kept in the registry;
+versions produced by train_all_models.py are never removed.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from .ml.artifacts import load_artifact
+from .ml.preprocess import clean_text
+from .ml.registry import (
+    MANIFEST_NAME, activate_version, current_version, delete_version, list_versions,
+    publish_version, read_manifest, verify_version
+)
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (Windows): only run one learning process
+    fcntl = None
+
+LABELS = ('spam', 'ham')
+LOCK_NAME = '.feedback.lock'
+
+
+def model_label(model, label):
+    """Map "spam"/"ham" to the class the model was trained with ('spam' or 1)."""
+    classes = list(getattr(model, 'classes_', LABELS))
+    if label in classes:
+        return label
+    return {'spam': 1, 'ham': 0}[label]
+
+
+def read_feedback(log_path, offset):
+    """
+    Return (entries, new offset) for the complete lines after `offset`.
+    A line still being written (no trailing newline) is left for later.
+    """
+    try:
+        with open(log_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], offset
+
+    complete = data[:data.rfind(b'\n') + 1]
+    entries = []
+    for line in complete.splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            print(f"⚠️ Skipping unreadable feedback line: {line[:80]!r}")
+            continue
+        if isinstance(entry, dict) and isinstance(entry.get('text'), str) and entry.get('label') in LABELS:
+            entries.append(entry)
+    return entries, offset + len(complete)
+
+
+def warmup_mismatches(model, vectorizer, warmup):
+    """Return the warmup texts whose recorded verdict `model` does not reproduce."""
+    if not warmup:
+        return []
+    predictions = model.predict(vectorizer.transform([clean_text(item['text']) for item in warmup]))
+    return [item['text'] for item, prediction in zip(warmup, predictions)
+            if str(prediction) != item['prediction']]
+
+
+def train_checkpoint(registry_dir, parent_version, entries, new_offset, model_name,
+                     sample_weight=1.0, activate=True, serve=True):
+    """
+    Publish a new version whose `model_name` model continued training on
+    the feedback entries. With serve, the updated model becomes the
+    default model if it reproduces the parent's warmup verdicts; the
+    parent's default model is kept otherwise. activate points CURRENT
+    at the new version. Returns the new version name.
+    """
+    version_dir, manifest = read_manifest(registry_dir, parent_version)
+    verify_version(version_dir, manifest)
+    if model_name not in manifest['models']:
+        raise ValueError(f'{parent_version} has no {model_name!r} model to update')
+
+    def load(filename):
+        # Not memory-mapped: partial_fit updates the arrays in place
+        return load_artifact(os.path.join(version_dir, filename), mmap=False)
+
+    vectorizer = load(manifest['vectorizer'])
+    models = {name: load(filename) for name, filename in manifest['models'].items()}
+    model = models[model_name]
+    if not hasattr(model, 'partial_fit'):
+        raise ValueError(f'{model_name} ({type(model).__name__}) cannot learn incrementally')
+
+    text_matrix = vectorizer.transform([clean_text(entry['text']) for entry in entries])
+    labels = [model_label(model, entry['label']) for entry in entries]
+    model.partial_fit(text_matrix, labels, sample_weight=np.full(len(entries), float(sample_weight)))
+
+    default_model = manifest['default_model']
+    mismatches = warmup_mismatches(model, vectorizer, manifest['warmup'])
+    if mismatches and default_model == model_name:
+        # The served model itself regressed; keep serving the parent
+        raise ValueError(f'{model_name} no longer reproduces {len(mismatches)} warmup verdicts')
+    if serve:
+        if mismatches:
+            print(f"⚠️ {model_name} does not reproduce {len(mismatches)} warmup verdicts; "
+                  f"{default_model} keeps serving")
+        else:
+            default_model = model_name
+
+    parent_training = manifest.get('training', {})
+    training = {
+        'feedback_parent': parent_version,
+        'online_model': model_name,
+        'feedback_offset': new_offset,
+        'feedback_examples': parent_training.get('feedback_examples', 0) + len(entries),
+        'base_version': parent_training.get('base_version', parent_version),
+    }
+    # The updated model's evaluation metrics no longer apply
+    metrics = {name: values for name, values in manifest['metrics'].items() if name != model_name}
+    return publish_version(
+        registry_dir, vectorizer, models, default_model,
+        metrics=metrics,
+        warmup_texts=[item['text'] for item in manifest['warmup']],
+        training=training,
+        compile_default=manifest['compiled'] is not None,
+        activate=activate,
+    )
+
+
+def prune_checkpoints(registry_dir, keep):
+    """Delete all but the newest `keep` feedback checkpoints (never the active version)."""
+    active = current_version(registry_dir)
+    checkpoints = []
+    for version in list_versions(registry_dir):
+        try:
+            version_dir, manifest = read_manifest(registry_dir, version)
+        except ValueError:
+            continue
+        if 'feedback_parent' in manifest.get('training', {}):
+            checkpoints.append((os.path.getmtime(os.path.join(version_dir, MANIFEST_NAME)), version))
+    # Version names only have second resolution; order by publication time
+    checkpoints = [version for _, version in sorted(checkpoints)]
+    for version in checkpoints[:max(len(checkpoints) - keep, 0)]:
+        if version != active:
+            delete_version(registry_dir, version)
+
+
+class OnlineLearner:
+    """
+    Records feedback and turns it into registry checkpoints.
+
+    Args:
+        registry_dir: Model registry to read and publish versions in
+        log_path: JSON-lines feedback log
+        model_name: Registry model updated with partial_fit
+        sample_weight: Weight of one feedback example
+        keep_checkpoints: Checkpoints kept in the registry
+        serve_online_model: Make the updated model the default model of
+            each checkpoint that passes the warmup check, instead of
+            keeping the parent's
+        on_checkpoint: Called with the new version after each checkpoint
+            (e.g. to reload the serving bundle)
+    """
+
+    def __init__(self, registry_dir, log_path, model_name='Naive Bayes', sample_weight=1.0,
+                 keep_checkpoints=10, serve_online_model=True, on_checkpoint=None):
+        self.registry_dir = registry_dir
+        self.log_path = log_path
+        self.model_name = model_name
+        self.sample_weight = sample_weight
+        self.keep_checkpoints = keep_checkpoints
+        self.serve_online_model = serve_online_model
+        self.on_checkpoint = on_checkpoint
+        self._checkpoints = 0
+        self._last_checkpoint = None
+        self._last_error = None
+        self._interval = 0
+        self._stop = None
+        self._fork_hook_registered = False
+
+    def record(self, text, label, **details):
+        """Append one corrected label to the feedback log."""
+        if label not in LABELS:
+            raise ValueError(f'label must be one of {LABELS}')
+        line = json.dumps(dict(details, text=text, label=label, ts=time.time()), ensure_ascii=False)
+        os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+        # One unbuffered O_APPEND write per line, so lines written by
+        # several processes never interleave
+        fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (line + '\n').encode('utf-8'))
+        finally:
+            os.close(fd)
+
+    def checkpoint(self):
+        """
+        Learn the feedback the active version has not seen and publish
+        it as a checkpoint. Returns the new version, or None if there was
+        nothing to learn or another process holds the lock.
+        """
+        os.makedirs(self.registry_dir, exist_ok=True)
+        with open(os.path.join(self.registry_dir, LOCK_NAME), 'w') as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return None
+
+            parent = current_version(self.registry_dir)
+            if parent is None:
+                raise ValueError('Online learning needs an active registry version')
+            _, manifest = read_manifest(self.registry_dir, parent)
+            offset = manifest.get('training', {}).get('feedback_offset', 0)
+            entries, new_offset = read_feedback(self.log_path, offset)
+            if not entries:
+                return None
+
+            version = train_checkpoint(self.registry_dir, parent, entries, new_offset,
+                                       self.model_name, self.sample_weight, activate=False,
+                                       serve=self.serve_online_model)
+            if current_version(self.registry_dir) != parent:
+                # A retrained version was activated meanwhile; it learns the log next round
+                print(f"⚠️ Checkpoint {version} not activated: {parent} is no longer current")
+                return None
+            activate_version(self.registry_dir, version)
+            prune_checkpoints(self.registry_dir, self.keep_checkpoints)
+
+        self._checkpoints += 1
+        self._last_checkpoint = version
+        print(f"✅ Learned {len(entries)} feedback labels: {parent} -> {version}")
+        if self.on_checkpoint is not None:
+            self.on_checkpoint(version)
+        return version
+
+    def start(self, interval):
+        """Run checkpoint() every `interval` seconds in a daemon thread."""
+        self.stop()
+        self._interval = interval
+        self._stop = threading.Event()
+        thread = threading.Thread(target=self._run, args=(interval, self._stop),
+                                  name='online-learner', daemon=True)
+        thread.start()
+        if not self._fork_hook_registered and hasattr(os, 'register_at_fork'):
+            # Threads do not survive fork (e.g. gunicorn --preload): restart in each worker
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+            self._fork_hook_registered = True
+
+    @property
+    def running(self):
+        """Whether checkpoints are being learned in the background."""
+        return self._stop is not None
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+        self._interval = 0
+
+    def _restart_after_fork(self):
+        if self._interval:
+            self.start(self._interval)
+
+    def _run(self, interval, stop):
+        while not stop.wait(interval):
+            try:
+                self.checkpoint()
+                self._last_error = None
+            except Exception as e:
+                self._last_error = f'{type(e).__name__}: {e}'
+                print(f"⚠️ Online learning failed: {e}")
+
+    def stats(self):
+        """Return checkpoint counters and the learning interval."""
+        return {
+            'model': self.model_name,
+            'serving': self.serve_online_model,
+            'interval': self._interval,
+            'checkpoints': self._checkpoints,
+            'last_checkpoint': self._last_checkpoint,
+            'last_error': self._last_error,
+        }
@@ -0,0 +1,74 @@
+"""
+Multi-pattern keyword matching for spam indicator analysis.
+
+All keyword categories are compiled into a single Aho-Corasick automaton,
+so every spam, money and urgency term is found in one pass over the text,
+however many keywords are configured. Without the optional pyahocorasick
+package, matching falls back to one substring search per keyword.
+"""
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+    print("⚠️ pyahocorasick not available. Install with: pip install pyahocorasick")
+
+
+# Default keyword lists used by analyze_spam_indicators()
+SPAM_KEYWORDS = [
+    'free', 'win', 'winner', 'cash', 'prize', 'claim', 'urgent', 'limited',
+    'offer', 'deal', 'discount', 'save', 'money', 'credit', 'loan', 'debt',
+    'guarantee', 'bonus', 'gift', 'congratulations', 'selected', 'apply now',
+    'click here', 'act now', 'order now', 'buy now', 'subscribe', 'unsubscribe'
+]
+
+MONEY_KEYWORDS = [
+    '$', '€', '£', 'usd', 'dollar', 'price', 'cost', 'pay', 'payment',
+    'money', 'cash', 'credit', 'account', 'bank', 'invest', 'profit'
+]
+
+URGENCY_KEYWORDS = [
+    'urgent', 'immediate', 'now', 'hurry', 'limited time', 'expires',
+    'act now', 'don\'t miss', 'last chance', 'today only', 'asap'
+]
+
+
+class KeywordMatcher:
+    """
+    Find which keywords of several categories occur in a text.
+
+    Args:
+        categories: Mapping of category name to a list of keywords.
+            Keywords are matched as lowercase substrings.
+    """
+
+    def __init__(self, categories):
+        self.categories = {
+            name: list(dict.fromkeys(keyword.lower() for keyword in keywords if keyword))
+            for name, keywords in categories.items()
+        }
+        self._automaton = None
+        if ahocorasick is not None and any(self.categories.values()):
+            automaton = ahocorasick.Automaton()
+            for keywords in self.categories.values():
+                for keyword in keywords:
+                    automaton.add_word(keyword, keyword)
+            automaton.make_automaton()
+            self._automaton = automaton
+
+    def find(self, text_lower):
+        """
+        Return {category: [matched keywords]} for a lowercased text.
+        Keywords keep the order they were configured in.
+        """
+        if self._automaton is not None:
+            # One pass finds every occurrence of every keyword
+            found = {keyword for _, keyword in self._automaton.iter(text_lower)}
+            return {
+                name: [keyword for keyword in keywords if keyword in found]
+                for name, keywords in self.categories.items()
+            }
+
+        return {
+            name: [keyword for keyword in keywords if keyword in text_lower]
+            for name, keywords in self.categories.items()
+        }
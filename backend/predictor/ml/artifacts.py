@@ -0,0 +1,67 @@
+"""
+Loading and saving model artifacts.
+
+joblib.dump() without compression stores NumPy arrays as raw, aligned
+buffers inside the pickle. Loading with mmap_mode='r' maps those buffers
+read-only instead of copying them, so all worker processes on a host
+share one copy of the coefficients, support vectors and IDF weights
+through the page cache. Plain Python objects (the vocabulary dict) and
+Random Forest trees (whose Cython state copies its node arrays) are
+still unpickled separately by every process.
+
+Files are never rewritten in place: they are written next to the target
+and renamed over it, so a process that still maps the old file keeps
+reading the old data instead of crashing with SIGBUS.
+"""
+import json
+import os
+from contextlib import contextmanager
+
+import joblib
+import numpy as np
+
+
+@contextmanager
+def replacing(path):
+    """
+    Yield a temporary path next to `path`. When the block succeeds, the
+    temporary file atomically replaces `path`; otherwise it is removed.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    extension = os.path.splitext(name)[1]
+    temporary_path = os.path.join(directory, f'.{name}.{os.getpid()}.tmp{extension}')
+    try:
+        yield temporary_path
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def load_artifact(path, mmap=True):
+    """Load a joblib pickle, memory-mapping its arrays read-only if mmap is set."""
+    return joblib.load(path, mmap_mode='r' if mmap else None)
+
+
+def save_artifact(obj, path):
+    """Dump obj uncompressed (so it can be memory-mapped) and replace path atomically."""
+    with replacing(path) as temporary_path:
+        joblib.dump(obj, temporary_path)
+
+
+def load_array(path, mmap=True):
+    """Load a .npy file, memory-mapping it read-only if mmap is set."""
+    return np.load(path, mmap_mode='r' if mmap else None)
+
+
+def save_array(array, path):
+    """Save an array as .npy and replace path atomically."""
+    with replacing(path) as temporary_path:
+        np.save(temporary_path, array)
+
+
+def save_json(data, path, **kwargs):
+    """Write data as JSON and replace path atomically."""
+    with replacing(path) as temporary_path:
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **kwargs)
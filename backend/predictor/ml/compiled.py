@@ -0,0 +1,235 @@
+"""
+Compiled, sklearn-free scorer for the default model.
+
+For a single email, most of the time spent in vectorizer.transform() and
+model.predict_proba() is input validation and dispatch rather than math.
+compile_model() exports the fitted TfidfVectorizer (vocabulary, IDF
+weights, tokenization settings) and the linear model (weights, bias,
+link and calibration) into a directory of plain files:
+
+    meta.json        settings, classes, link parameters and source hashes
+    vocabulary.json  terms ordered by feature index
+    idf.npy          IDF weight per feature
+    weights.npy      model weight per feature
+
+CompiledScorer loads that directory and scores an email with a dict
+lookup per token and a few NumPy operations.
+
+Compile the shipped model (run from backend/):
+
+    python -m predictor.ml.compiled [--output DIR]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from .artifacts import load_array, save_array, save_json
+from .links import LINK_LOGISTIC, LINK_PLATT, logistic_probabilities, platt_probabilities
+
+FORMAT_VERSION = 1
+
+ML_DIR = os.path.dirname(__file__)
+DEFAULT_MODEL_PATH = os.path.join(ML_DIR, 'model.pkl')
+DEFAULT_VECTORIZER_PATH = os.path.join(ML_DIR, 'vectorizer.pkl')
+DEFAULT_OUTPUT_DIR = os.path.join(ML_DIR, 'compiled')
+
+
+def file_sha256(path):
+    """Return the sha256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def compile_model(vectorizer, model, output_dir, sources=None):
+    """
+    Export a fitted TfidfVectorizer and binary linear model to output_dir.
+    sources maps artifact names to the pickle paths they were loaded from;
+    their hashes are recorded so stale compiled files can be detected.
+    Raises ValueError for vectorizer options or models it cannot export.
+    """
+    from .linear import linear_head
+
+    params = vectorizer.get_params()
+    if params['analyzer'] != 'word' or params['preprocessor'] is not None \
+            or params['tokenizer'] is not None or params['strip_accents'] is not None:
+        raise ValueError('Only word analyzers without custom preprocessing can be compiled')
+
+    head = linear_head(model)
+    if head is None:
+        raise ValueError(f'{type(model).__name__} is not a binary linear model')
+    weights, bias, link, ties_to_second = head
+
+    n_features = len(vectorizer.vocabulary_)
+    terms = [None] * n_features
+    for term, index in vectorizer.vocabulary_.items():
+        terms[index] = term
+
+    stop_words = vectorizer.get_stop_words()
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'n_features': n_features,
+        'lowercase': params['lowercase'],
+        'token_pattern': params['token_pattern'],
+        'ngram_range': list(params['ngram_range']),
+        'stop_words': sorted(stop_words) if stop_words else None,
+        'binary': params['binary'],
+        'sublinear_tf': params['sublinear_tf'],
+        'use_idf': params['use_idf'],
+        'norm': params['norm'],
+        'classes': np.asarray(model.classes_).tolist(),
+        'bias': float(bias),
+        'link': link,
+        'ties_to_second': ties_to_second,
+        'platt': [float(model.probA_[0]), float(model.probB_[0])] if link == LINK_PLATT else None,
+        'sources': {name: file_sha256(path) for name, path in (sources or {}).items()},
+    }
+
+    os.makedirs(output_dir, exist_ok=True)
+    idf = vectorizer.idf_ if params['use_idf'] else np.ones(n_features)
+    save_array(np.asarray(idf, dtype=np.float64), os.path.join(output_dir, 'idf.npy'))
+    save_array(np.asarray(weights, dtype=np.float64).ravel(), os.path.join(output_dir, 'weights.npy'))
+    save_json(terms, os.path.join(output_dir, 'vocabulary.json'), ensure_ascii=False)
+    # meta.json is written last, so a directory without it is incomplete
+    save_json(meta, os.path.join(output_dir, 'meta.json'), indent=2)
+    return meta
+
+
+class CompiledScorer:
+    """
+    NumPy-only TF-IDF vectorizer and linear scorer.
+
+    Args:
+        directory: Output directory of compile_model()
+        mmap: Memory-map the IDF and weight arrays read-only, so worker
+            processes share one copy
+    """
+
+    def __init__(self, directory, mmap=True):
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled model format: {meta.get('format_version')}")
+        with open(os.path.join(directory, 'vocabulary.json'), encoding='utf-8') as f:
+            terms = json.load(f)
+
+        self.meta = meta
+        self.n_features = meta['n_features']
+        self.vocabulary = {term: index for index, term in enumerate(terms)}
+        self.idf = load_array(os.path.join(directory, 'idf.npy'), mmap=mmap)
+        self.weights = load_array(os.path.join(directory, 'weights.npy'), mmap=mmap)
+        self.classes = np.array(meta['classes'])
+        self.bias = meta['bias']
+        self.link = meta['link']
+        self.ties_to_second = meta['ties_to_second']
+        self.platt = meta['platt']
+        self.sources = meta['sources']
+
+        self._lowercase = meta['lowercase']
+        self._token_pattern = re.compile(meta['token_pattern'])
+        self._min_n, self._max_n = meta['ngram_range']
+        self._stop_words = frozenset(meta['stop_words']) if meta['stop_words'] else None
+        self._binary = meta['binary']
+        self._sublinear_tf = meta['sublinear_tf']
+        self._norm = meta['norm']
+
+    def matches_sources(self, paths):
+        """Check that the scorer was compiled from the given artifact files."""
+        return all(self.sources.get(name) == file_sha256(path) for name, path in paths.items())
+
+    def analyze(self, text):
+        """Split text into terms exactly like the vectorizer's analyzer."""
+        if self._lowercase:
+            text = text.lower()
+        tokens = self._token_pattern.findall(text)
+        if self._stop_words is not None:
+            tokens = [token for token in tokens if token not in self._stop_words]
+
+        min_n, max_n = self._min_n, self._max_n
+        if max_n == 1:
+            return tokens
+        # Word n-grams, in the same order as sklearn's _word_ngrams
+        original_tokens = tokens
+        if min_n == 1:
+            tokens = list(original_tokens)
+            min_n += 1
+        else:
+            tokens = []
+        n_original = len(original_tokens)
+        for n in range(min_n, min(max_n + 1, n_original + 1)):
+            for i in range(n_original - n + 1):
+                tokens.append(' '.join(original_tokens[i:i + n]))
+        return tokens
+
+    def vectorize(self, text):
+        """
+        Return the TF-IDF row of a cleaned text as (indices, values),
+        sorted by feature index.
+        """
+        vocabulary = self.vocabulary
+        counts = [(vocabulary[term], count) for term, count in Counter(self.analyze(text)).items()
+                  if term in vocabulary]
+        if not counts:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+
+        counts.sort()
+        indices = np.fromiter((index for index, _ in counts), dtype=np.int32, count=len(counts))
+        values = np.fromiter((count for _, count in counts), dtype=np.float64, count=len(counts))
+        if self._binary:
+            values[:] = 1.0
+        elif self._sublinear_tf:
+            values = np.log(values) + 1
+        values *= self.idf[indices]
+
+        if self._norm == 'l2':
+            values /= np.sqrt(np.dot(values, values))
+        elif self._norm == 'l1':
+            values /= np.abs(values).sum()
+        return indices, values
+
+    def decision(self, indices, values):
+        """Return the model's decision value for a vectorized row."""
+        return float(np.dot(values, self.weights[indices])) + self.bias
+
+    def predict(self, indices, values):
+        """
+        Score a vectorized row.
+        Returns (prediction, probabilities, decision); probabilities is
+        None for models without them.
+        """
+        decision = self.decision(indices, values)
+        positive = decision >= 0 if self.ties_to_second else decision > 0
+        prediction = self.classes[int(positive)]
+
+        if self.link == LINK_LOGISTIC:
+            probabilities = logistic_probabilities(np.array([decision]))[0]
+        elif self.link == LINK_PLATT:
+            probabilities = platt_probabilities(np.array([decision]), *self.platt)[0]
+        else:
+            probabilities = None
+        return prediction, probabilities, decision
+
+
+def main():
+    import joblib
+
+    parser = argparse.ArgumentParser(description='Compile the default model for the NumPy-only scorer.')
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--vectorizer', default=DEFAULT_VECTORIZER_PATH)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    meta = compile_model(joblib.load(args.vectorizer), joblib.load(args.model), args.output,
+                         sources={'model': args.model, 'vectorizer': args.vectorizer})
+    print(f"✅ Compiled {meta['n_features']} features ({meta['link']} link) to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Word-level explanations for spam predictions.
+
+The feature names and each feature's contribution towards the spam class
+are computed once when the model is loaded. Explaining an email then only
+touches the non-zero entries of its TF-IDF row, so the cost grows with the
+number of tokens in the email rather than with the vocabulary size.
+"""
+import numpy as np
+
+
+def feature_contributions(model):
+    """
+    Return a dense per-feature score where positive values push towards
+    the second class (spam) and negative values towards the first (ham).
+    Returns None for models without linear weights (e.g. Random Forest).
+    """
+    if hasattr(model, 'coef_'):
+        # For linear models (Logistic Regression, linear SVM).
+        # SVC trained on sparse input stores coef_ as a sparse matrix.
+        coefficients = model.coef_
+        if hasattr(coefficients, 'toarray'):
+            coefficients = coefficients.toarray()
+        return np.asarray(coefficients[0], dtype=np.float64).ravel()
+
+    if hasattr(model, 'feature_log_prob_'):
+        # For Naive Bayes: difference in log probabilities (spam - ham)
+        return np.asarray(model.feature_log_prob_[1] - model.feature_log_prob_[0],
+                          dtype=np.float64)
+
+    return None
+
+
+class WordImportanceExplainer:
+    """
+    Precomputed word importance tables for one vectorizer/model pair.
+
+    Args:
+        vectorizer: Fitted TfidfVectorizer
+        model: Fitted classifier
+    """
+
+    def __init__(self, vectorizer, model):
+        self.feature_names = vectorizer.get_feature_names_out()
+        self.contributions = feature_contributions(model)
+
+    def explain(self, text_vector, top_n=20):
+        """
+        Return the top_n words of a 1-row sparse TF-IDF vector, sorted by
+        absolute importance (ties keep vocabulary order).
+        """
+        if self.contributions is None:
+            return []
+
+        row = text_vector.tocsr()
+        indices = row.indices[row.data != 0]
+        if len(indices) == 0:
+            return []
+
+        scores = self.contributions[indices]
+        magnitudes = np.abs(scores)
+
+        if len(indices) > top_n:
+            # Keep everything at least as large as the top_n-th magnitude,
+            # including ties, then order that small set exactly.
+            cutoff = np.partition(magnitudes, len(magnitudes) - top_n)[len(magnitudes) - top_n]
+            keep = magnitudes >= cutoff
+            indices, scores, magnitudes = indices[keep], scores[keep], magnitudes[keep]
+
+        order = np.lexsort((indices, -magnitudes))[:top_n]
+
+        word_scores = []
+        for position in order:
+            importance = float(scores[position])
+            word_scores.append({
+                'word': str(self.feature_names[indices[position]]),
+                'importance': importance,
+                'type': 'spam' if importance > 0 else 'ham'
+            })
+        return word_scores
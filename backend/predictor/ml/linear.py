@@ -0,0 +1,112 @@
+"""
+Stacked scoring of linear models for the model comparison.
+
+Multinomial Naive Bayes, Logistic Regression and linear SVMs all score an
+email with a dot product in TF-IDF space followed by a model-specific
+link function. Their weights are stacked into one (n_features, n_models)
+matrix, so every linear model is scored with a single sparse-dense
+product and adding a model adds one column rather than another sklearn
+call. Models that are not linear (e.g. Random Forest) are left out and
+keep using their own predict/predict_proba.
+"""
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.svm import SVC, LinearSVC
+
+from .links import LINK_LOGISTIC, LINK_PLATT, LINK_NONE, logistic_probabilities, platt_probabilities
+
+
+def linear_head(model):
+    """
+    Describe a fitted binary model as decision = X @ weights + bias,
+    positive towards classes_[1].
+    Returns (weights, bias, link, ties_to_second) or None if the model
+    cannot be stacked. ties_to_second tells whether a decision of
+    exactly 0 predicts classes_[1], as it does for libsvm.
+    """
+    classes = getattr(model, 'classes_', None)
+    if classes is None or len(classes) != 2:
+        return None
+
+    if isinstance(model, MultinomialNB):
+        # Two-class softmax of the joint log likelihoods is a sigmoid of their difference
+        weights = model.feature_log_prob_[1] - model.feature_log_prob_[0]
+        bias = model.class_log_prior_[1] - model.class_log_prior_[0]
+        return weights, bias, LINK_LOGISTIC, False
+
+    if isinstance(model, LogisticRegression):
+        weights, bias = model.coef_[0], model.intercept_[0]
+        if getattr(model, 'multi_class', 'auto') == 'multinomial' and model.solver != 'liblinear':
+            # Softmax over [-decision, decision] is a sigmoid of 2 * decision
+            weights, bias = 2 * weights, 2 * bias
+        return weights, bias, LINK_LOGISTIC, False
+
+    if isinstance(model, SVC) and model.kernel == 'linear':
+        # SVC trained on sparse input stores coef_ as a sparse matrix
+        coefficients = model.coef_
+        if hasattr(coefficients, 'toarray'):
+            coefficients = coefficients.toarray()
+        link = LINK_PLATT if model.probability else LINK_NONE
+        return coefficients[0], model.intercept_[0], link, True
+
+    if isinstance(model, LinearSVC):
+        return model.coef_[0], model.intercept_[0], LINK_NONE, False
+
+    return None
+
+
+class LinearEnsemble:
+    """
+    Score every stackable model of a collection in one pass.
+
+    Args:
+        models: Mapping of model name to fitted model. Models that
+            linear_head() cannot describe are skipped; see `names`.
+    """
+
+    def __init__(self, models):
+        heads = {}
+        for name, model in models.items():
+            head = linear_head(model)
+            if head is not None:
+                heads[name] = (model, head)
+
+        self.names = list(heads)
+        self.weights = None
+        if heads:
+            self.weights = np.column_stack([
+                np.asarray(head[0], dtype=np.float64).ravel() for _, head in heads.values()])
+            self.biases = np.array([head[1] for _, head in heads.values()], dtype=np.float64)
+        self._models = [(name, model, head[2], head[3]) for name, (model, head) in heads.items()]
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def score(self, text_matrix):
+        """
+        Score TF-IDF rows with every stacked model.
+        Returns {name: (predictions, probabilities, decisions)}, where
+        probabilities is an (n, 2) array, or None for models without them.
+        """
+        if self.weights is None:
+            return {}
+
+        # One sparse-dense product gives every model's decision values
+        decisions = np.asarray(text_matrix @ self.weights) + self.biases
+
+        results = {}
+        for column, (name, model, link, ties_to_second) in enumerate(self._models):
+            decision = decisions[:, column]
+            positive = decision >= 0 if ties_to_second else decision > 0
+            predictions = model.classes_[positive.astype(int)]
+
+            if link == LINK_LOGISTIC:
+                probabilities = logistic_probabilities(decision)
+            elif link == LINK_PLATT:
+                probabilities = platt_probabilities(decision, model.probA_[0], model.probB_[0])
+            else:
+                probabilities = None
+
+            results[name] = (predictions, probabilities, decision)
+        return results
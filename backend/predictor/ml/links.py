@@ -0,0 +1,96 @@
+"""
+Link functions turning linear decision values into class probabilities.
+
+Shared by the stacked comparison engine (linear.py) and the compiled
+scorer (compiled.py). Only NumPy is needed here, so the compiled
+scorer can use them without importing sklearn or SciPy.
+"""
+import math
+
+import numpy as np
+
+# How a decision value becomes class probabilities
+LINK_LOGISTIC = 'logistic'  # P(classes_[1]) = sigmoid(decision)
+LINK_PLATT = 'platt'        # libsvm's Platt scaling (SVC with probability=True)
+LINK_NONE = 'none'          # no probabilities, decision value only
+
+# libsvm clips pairwise probabilities to [MIN_PROB, 1 - MIN_PROB]
+MIN_PROB = 1e-7
+
+
+def sigmoid(decision):
+    """
+    Logistic sigmoid of one value, computed like scipy.special.expit:
+    1 / (1 + exp(-x)) with the C library's exp, which NumPy's vectorized
+    exp can differ from in the last bit.
+    """
+    try:
+        return 1.0 / (1.0 + math.exp(-decision))
+    except OverflowError:
+        return 0.0
+
+
+def expit(decisions):
+    """Logistic sigmoid of an array; matches scipy.special.expit exactly."""
+    return np.array([sigmoid(decision) for decision in np.asarray(decisions, dtype=np.float64).tolist()])
+
+
+def logistic_probabilities(decisions):
+    """
+    Return an (n, 2) array of class probabilities for logistic models,
+    computed like LogisticRegression.predict_proba.
+    """
+    second = expit(decisions)
+    return np.column_stack([1 - second, second])
+
+
+def platt_probabilities(decisions, prob_a, prob_b):
+    """
+    Reproduce SVC.predict_proba for two classes from decision values.
+    Returns an (n, 2) array of class probabilities.
+    """
+    probabilities = np.empty((len(decisions), 2))
+    for row, decision in enumerate(decisions.tolist()):
+        # libsvm's decision value has the opposite sign of sklearn's
+        f = -decision * prob_a + prob_b
+        if f >= 0:
+            pairwise = math.exp(-f) / (1.0 + math.exp(-f))
+        else:
+            pairwise = 1.0 / (1 + math.exp(f))
+        pairwise = min(max(pairwise, MIN_PROB), 1 - MIN_PROB)
+        probabilities[row] = couple_pairwise_probabilities(pairwise)
+    return probabilities
+
+
+def couple_pairwise_probabilities(r):
+    """
+    libsvm's multiclass_probability() for two classes. r is the pairwise
+    probability of the first class. The iterative solver stops at a
+    tolerance, so its result differs slightly from (r, 1 - r); its steps
+    are repeated exactly (in plain floats, which are C doubles) to match
+    predict_proba. Returns (p0, p1).
+    """
+    k = 2
+    eps = 0.005 / k
+    q = [[(1 - r) * (1 - r), -(1 - r) * r],
+         [-(1 - r) * r, r * r]]
+    p = [1.0 / k, 1.0 / k]
+    qp = [0.0, 0.0]
+
+    for _ in range(100):
+        pqp = 0.0
+        for t in range(k):
+            qp[t] = q[t][0] * p[0] + q[t][1] * p[1]
+            pqp += p[t] * qp[t]
+        if max(abs(qp[0] - pqp), abs(qp[1] - pqp)) < eps:
+            break
+
+        for t in range(k):
+            diff = (-qp[t] + pqp) / q[t][t]
+            p[t] += diff
+            pqp = (pqp + diff * (diff * q[t][t] + 2 * qp[t])) / (1 + diff) / (1 + diff)
+            for j in range(k):
+                qp[j] = (qp[j] + diff * q[t][j]) / (1 + diff)
+                p[j] /= (1 + diff)
+
+    return p[0], p[1]
@@ -5,9 +5,16 @@ This module contains functions to clean and preprocess email text
 before feeding it to the ML model.
 """
 
+import atexit
+import math
+import os
 import re
 import string
-from typing import List
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache, partial
+from typing import Iterable, List, Optional
 
 try:
     import nltk
@@ -32,32 +39,41 @@ except ImportError:
     print("⚠️ NLTK not available. Install with: pip install nltk")
 
 
+# Precompiled patterns and translation tables shared by the helpers
+# below and by the fused clean_text() pipeline.
+URL_PATTERN = re.compile(r'https?://\S+|www\.\S+')
+HTML_PATTERN = re.compile(r'<.*?>')
+EMAIL_PATTERN = re.compile(r'\S+@\S+')
+DIGITS_PATTERN = re.compile(r'\d+')
+PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+# Deleting punctuation and ASCII digits in one translate() call is
+# equivalent to deleting them one after the other.
+PUNCTUATION_DIGITS_TABLE = str.maketrans('', '', string.punctuation + string.digits)
+
+
 def remove_urls(text: str) -> str:
     """Remove URLs from text."""
-    url_pattern = re.compile(r'https?://\S+|www\.\S+')
-    return url_pattern.sub('', text)
+    return URL_PATTERN.sub('', text)
 
 
 def remove_html_tags(text: str) -> str:
     """Remove HTML tags from text."""
-    html_pattern = re.compile(r'<.*?>')
-    return html_pattern.sub('', text)
+    return HTML_PATTERN.sub('', text)
 
 
 def remove_emails(text: str) -> str:
     """Remove email addresses from text."""
-    email_pattern = re.compile(r'\S+@\S+')
-    return email_pattern.sub('', text)
+    return EMAIL_PATTERN.sub('', text)
 
 
 def remove_punctuation(text: str) -> str:
     """Remove punctuation from text."""
-    return text.translate(str.maketrans('', '', string.punctuation))
+    return text.translate(PUNCTUATION_TABLE)
 
 
 def remove_digits(text: str) -> str:
     """Remove digits from text."""
-    return re.sub(r'\d+', '', text)
+    return DIGITS_PATTERN.sub('', text)
 
 
 def remove_extra_whitespace(text: str) -> str:
@@ -75,14 +91,76 @@ def remove_stopwords(text: str) -> str:
     return ' '.join(filtered_words)
 
 
+# Maximum number of token -> lemma entries kept by the lemma cache.
+# Email vocabulary is heavily Zipfian, so a bounded LRU cache takes most
+# WordNet lookups off the hot path.
+LEMMA_CACHE_SIZE = 50000
+
+
+def _lemmatize_word(word: str) -> str:
+    """Lemmatize a single word with WordNet (uncached)."""
+    return lemmatizer.lemmatize(word)
+
+
+_cached_lemmatize = lru_cache(maxsize=LEMMA_CACHE_SIZE)(_lemmatize_word)
+
+
+def configure_lemma_cache(maxsize: int = LEMMA_CACHE_SIZE) -> None:
+    """
+    Replace the lemma cache with an empty one of the given size.
+    Least recently used entries are evicted once it is full;
+    maxsize=0 disables caching and None makes it unbounded.
+    """
+    global _cached_lemmatize
+    _cached_lemmatize = lru_cache(maxsize=maxsize)(_lemmatize_word)
+
+
+def clear_lemma_cache() -> None:
+    """Drop all cached lemmas and reset the hit/miss counters."""
+    _cached_lemmatize.cache_clear()
+
+
+def lemma_cache_info() -> dict:
+    """Return hit/miss counters and the current size of the lemma cache."""
+    info = _cached_lemmatize.cache_info()
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'max_size': info.maxsize,
+    }
+
+
+def warm_lemma_cache(words: Iterable[str]) -> int:
+    """
+    Pre-seed the lemma cache, e.g. with a trained vectorizer's vocabulary.
+    
+    Returns:
+        Number of words looked up (0 if lemmatization is unavailable)
+    """
+    if lemmatizer is None:
+        return 0
+
+    count = 0
+    try:
+        for word in words:
+            _cached_lemmatize(word)
+            count += 1
+    except LookupError:
+        # wordnet data is missing; nothing to cache
+        pass
+    return count
+
+
 def lemmatize_text(text: str) -> str:
     """Lemmatize words in text."""
     if lemmatizer is None:
         return text
 
     words = text.split()
+    lemmatize_word = _cached_lemmatize
     try:
-        lemmatized_words = [lemmatizer.lemmatize(word) for word in words]
+        lemmatized_words = [lemmatize_word(word) for word in words]
         return ' '.join(lemmatized_words)
     except LookupError:
         # If NLTK's wordnet data is missing in production,
@@ -120,51 +198,146 @@ def clean_text(text: str,
     if not text or not isinstance(text, str):
         return ""
     
+    # The steps below produce exactly the same output as calling the
+    # individual helpers in order, but each regex only runs when its
+    # trigger character is present and the token steps share one split.
+    
     # Step 1: Convert to lowercase
     text = text.lower()
     
     # Step 2: Remove URLs
-    text = remove_urls(text)
+    if 'http' in text or 'www.' in text:
+        text = URL_PATTERN.sub('', text)
     
     # Step 3: Remove HTML tags
-    text = remove_html_tags(text)
+    if '<' in text:
+        text = HTML_PATTERN.sub('', text)
     
     # Step 4: Remove email addresses
-    text = remove_emails(text)
+    if '@' in text:
+        text = EMAIL_PATTERN.sub('', text)
     
-    # Step 5: Remove punctuation
-    text = remove_punctuation(text)
-    
-    # Step 6: Remove digits (optional)
+    # Steps 5-6: Remove punctuation and (optionally) digits in one pass
     if remove_nums:
-        text = remove_digits(text)
+        text = text.translate(PUNCTUATION_DIGITS_TABLE)
+        # Non-ASCII text may still contain Unicode digits matched by \d
+        if not text.isascii():
+            text = DIGITS_PATTERN.sub('', text)
+    else:
+        text = text.translate(PUNCTUATION_TABLE)
     
     # Step 7: Remove extra whitespace
-    text = remove_extra_whitespace(text)
+    words = text.split()
     
     # Step 8: Remove stopwords (optional)
+    # Words are already lowercase, so no per-word lower() is needed
     if remove_stop_words and STOP_WORDS:
-        text = remove_stopwords(text)
+        words = [word for word in words if word not in STOP_WORDS]
     
     # Step 9: Lemmatize (optional)
     if lemmatize and lemmatizer is not None:
-        text = lemmatize_text(text)
+        lemmatize_word = _cached_lemmatize
+        try:
+            words = [lemmatize_word(word) for word in words]
+        except LookupError:
+            # Same fallback as lemmatize_text(): skip lemmatization
+            # when NLTK's wordnet data is missing.
+            pass
     
-    return text
+    return ' '.join(words)
+
 
+# Inputs smaller than this are cleaned serially even when n_jobs > 1,
+# since starting and feeding worker processes would cost more than it saves.
+PARALLEL_MIN_TEXTS = 2000
 
-def batch_clean_texts(texts: List[str], **kwargs) -> List[str]:
+# Worker pool reused across batch_clean_texts() calls. Request threads
+# share it, so it is only created, replaced and fed under the lock.
+_process_pool = None
+_process_pool_workers = 0
+_process_pool_lock = threading.Lock()
+
+
+def _resolve_n_jobs(n_jobs: Optional[int]) -> int:
+    """Translate an sklearn-style n_jobs value into a worker count."""
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    if n_jobs < 0:
+        # -1 means all CPUs, -2 all but one, ...
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return n_jobs
+
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Return the shared process pool, (re)creating it for a new size.
+    The caller must hold _process_pool_lock.
+    """
+    global _process_pool, _process_pool_workers
+    if _process_pool is None or _process_pool_workers != workers:
+        if _process_pool is not None:
+            # Work other threads already submitted still completes
+            _process_pool.shutdown(wait=False)
+        _process_pool = ProcessPoolExecutor(max_workers=workers)
+        _process_pool_workers = workers
+    return _process_pool
+
+
+def shutdown_process_pool(pool: Optional[ProcessPoolExecutor] = None) -> None:
+    """
+    Stop the worker processes used for parallel cleaning, if any.
+    With pool given, only stop it if it is still the shared pool.
+    """
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is not None and pool in (None, _process_pool):
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+            _process_pool_workers = 0
+
+
+atexit.register(shutdown_process_pool)
+
+
+def batch_clean_texts(texts: List[str],
+                      n_jobs: Optional[int] = 1,
+                      chunksize: Optional[int] = None,
+                      **kwargs) -> List[str]:
     """
     Clean multiple texts in batch.
     
     Args:
         texts: List of raw email texts
+        n_jobs: Number of worker processes (-1 uses all CPUs). Inputs
+            shorter than PARALLEL_MIN_TEXTS are always cleaned serially.
+        chunksize: Texts sent to a worker per task (default: split the
+            input into about four chunks per worker)
         **kwargs: Arguments to pass to clean_text()
     
     Returns:
-        List of cleaned texts
+        List of cleaned texts, in the same order as the input
     """
-    return [clean_text(text, **kwargs) for text in texts]
+    workers = _resolve_n_jobs(n_jobs)
+    if workers <= 1 or len(texts) < PARALLEL_MIN_TEXTS:
+        return [clean_text(text, **kwargs) for text in texts]
+
+    if chunksize is None:
+        chunksize = max(1, math.ceil(len(texts) / (workers * 4)))
+
+    clean = partial(clean_text, **kwargs)
+    pool = None
+    try:
+        # map() submits every chunk before returning, so holding the lock
+        # keeps other threads from replacing the pool mid-submission
+        with _process_pool_lock:
+            pool = _get_process_pool(workers)
+            results = pool.map(clean, texts, chunksize=chunksize)
+        # Executor.map preserves input order
+        return list(results)
+    except BrokenProcessPool:
+        # A worker died; drop the pool (unless already replaced) and finish serially
+        shutdown_process_pool(pool)
+        return [clean(text) for text in texts]
 
 
 # Example usage
@@ -0,0 +1,280 @@
+"""
+Registry of immutable, versioned model bundles.
+
+Training publishes every model version into its own directory instead of
+overwriting the files in predictor/ml/. A version is never modified
+after it is published, and its manifest records exactly which files
+belong together:
+
+    registry/
+        CURRENT                      name of the version servers load
+        20261017-093000-1f2e3d4c/
+            manifest.json            files, sha256 hashes, metrics, warmup corpus
+            vectorizer.pkl
+            model_svm.pkl, model_nb.pkl, ...
+            compiled/                NumPy-only scorer (see compiled.py)
+
+A version is written to a hidden temporary directory and renamed into
+place when complete, and CURRENT is replaced atomically, so a server
+never sees a half-written version. Switching CURRENT back to an older
+version is a rollback.
+
+Manage the registry (run from backend/):
+
+    python -m predictor.ml.registry list
+    python -m predictor.ml.registry verify [VERSION]
+    python -m predictor.ml.registry activate VERSION
+    python -m predictor.ml.registry publish     # package the files in predictor/ml/
+"""
+import argparse
+import copy
+import filecmp
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from .artifacts import replacing, save_artifact, save_json
+from .compiled import compile_model, file_sha256
+from .preprocess import clean_text
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+CURRENT_NAME = 'CURRENT'
+
+ML_DIR = os.path.dirname(__file__)
+DEFAULT_REGISTRY_DIR = os.path.join(ML_DIR, 'registry')
+
+# File names of the known models, matching the legacy files in predictor/ml/
+MODEL_FILENAMES = {
+    'Naive Bayes': 'model_nb.pkl',
+    'Logistic Regression': 'model_lr.pkl',
+    'Random Forest': 'model_rf.pkl',
+    'SVM': 'model_svm.pkl',
+}
+
+
+class IntegrityError(ValueError):
+    """A registry version is incomplete or its files do not match the manifest."""
+
+
+def model_filename(model_name):
+    """Return the file name a model is stored under."""
+    if model_name in MODEL_FILENAMES:
+        return MODEL_FILENAMES[model_name]
+    slug = ''.join(c if c.isalnum() else '_' for c in model_name.lower()).strip('_')
+    return f'model_{slug}.pkl'
+
+
+def publish_version(registry_dir, vectorizer, models, default_model, metrics=None,
+                    warmup_texts=(), training=None, compile_default=True, activate=True):
+    """
+    Write a new immutable version to the registry.
+
+    Args:
+        registry_dir: Registry directory (created if missing)
+        vectorizer: Fitted TfidfVectorizer
+        models: Mapping of model name to fitted model
+        default_model: Name of the model serving /api/predict/
+        metrics: Mapping of model name to evaluation metrics
+        warmup_texts: Raw emails scored before the version serves traffic.
+            The default model's predictions are recorded with them and
+            must be reproduced by the server.
+        training: Extra information about the training run (dataset size, ...)
+        compile_default: Also export the default model for the compiled scorer
+        activate: Point CURRENT at the new version
+
+    Returns the version name.
+    """
+    if default_model not in models:
+        raise ValueError(f'Default model {default_model!r} is not among the published models')
+
+    os.makedirs(registry_dir, exist_ok=True)
+    staging_dir = os.path.join(registry_dir, f'.staging.{os.getpid()}.{time.time_ns()}')
+    os.makedirs(staging_dir)
+    try:
+        files = {}
+
+        # stop_words_ only lists pruned terms and can be huge; prediction does not use it.
+        # Strip it from a shallow copy so the caller's vectorizer is left as it was.
+        vectorizer = copy.copy(vectorizer)
+        vectorizer.stop_words_ = None
+        save_artifact(vectorizer, os.path.join(staging_dir, 'vectorizer.pkl'))
+        files['vectorizer.pkl'] = file_sha256(os.path.join(staging_dir, 'vectorizer.pkl'))
+
+        model_files = {}
+        for model_name, model in models.items():
+            filename = model_filename(model_name)
+            save_artifact(model, os.path.join(staging_dir, filename))
+            files[filename] = file_sha256(os.path.join(staging_dir, filename))
+            model_files[model_name] = filename
+
+        compiled = None
+        if compile_default:
+            compiled_dir = os.path.join(staging_dir, 'compiled')
+            try:
+                compile_model(vectorizer, models[default_model], compiled_dir, sources={
+                    'model': os.path.join(staging_dir, model_files[default_model]),
+                    'vectorizer': os.path.join(staging_dir, 'vectorizer.pkl'),
+                })
+            except ValueError as e:
+                print(f"⚠️ Default model not compiled: {e}")
+            else:
+                compiled = 'compiled'
+                for name in sorted(os.listdir(compiled_dir)):
+                    files[f'compiled/{name}'] = file_sha256(os.path.join(compiled_dir, name))
+
+        # Record what the default model predicts, so servers can check they reproduce it
+        warmup = []
+        if warmup_texts:
+            text_matrix = vectorizer.transform([clean_text(text) for text in warmup_texts])
+            predictions = models[default_model].predict(text_matrix)
+            warmup = [{'text': text, 'prediction': str(prediction)}
+                      for text, prediction in zip(warmup_texts, predictions)]
+
+        content_hash = hashlib.sha256(
+            ''.join(f'{name}:{digest};' for name, digest in sorted(files.items())).encode()
+        ).hexdigest()
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{content_hash[:8]}"
+
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'version': version,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'vectorizer': 'vectorizer.pkl',
+            'default_model': default_model,
+            'models': model_files,
+            'compiled': compiled,
+            'files': files,
+            'metrics': metrics or {},
+            'training': training or {},
+            'warmup': warmup,
+        }
+        save_json(manifest, os.path.join(staging_dir, MANIFEST_NAME), indent=2, ensure_ascii=False)
+
+        # The complete directory appears under its final name in one rename
+        os.rename(staging_dir, os.path.join(registry_dir, version))
+    finally:
+        if os.path.exists(staging_dir):
+            shutil.rmtree(staging_dir)
+
+    if activate:
+        activate_version(registry_dir, version)
+    return version
+
+
+def list_versions(registry_dir):
+    """Return the published versions, oldest first."""
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(registry_dir)
+        if not name.startswith('.') and os.path.isfile(os.path.join(registry_dir, name, MANIFEST_NAME))
+    )
+
+
+def current_version(registry_dir):
+    """Return the version CURRENT points at, or None if no version is active."""
+    try:
+        with open(os.path.join(registry_dir, CURRENT_NAME), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def activate_version(registry_dir, version):
+    """Point CURRENT at a published version."""
+    if version not in list_versions(registry_dir):
+        raise ValueError(f'Unknown model version: {version}')
+    with replacing(os.path.join(registry_dir, CURRENT_NAME)) as temporary_path:
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            f.write(version + '\n')
+
+
+def delete_version(registry_dir, version):
+    """Remove a published version. The active version cannot be deleted."""
+    if version not in list_versions(registry_dir):
+        raise ValueError(f'Unknown model version: {version}')
+    if version == current_version(registry_dir):
+        raise ValueError(f'{version} is the active version')
+    shutil.rmtree(os.path.join(registry_dir, version))
+
+
+def read_manifest(registry_dir, version):
+    """Return (version directory, manifest) of a published version."""
+    version_dir = os.path.join(registry_dir, version)
+    try:
+        with open(os.path.join(version_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise IntegrityError(f'Model version {version} has no manifest') from None
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise IntegrityError(f"Unsupported manifest format: {manifest.get('format_version')}")
+    if manifest.get('version') != version:
+        raise IntegrityError(f"Manifest of {version} describes version {manifest.get('version')}")
+    return version_dir, manifest
+
+
+def verify_version(version_dir, manifest):
+    """Check every file of a version against the sha256 recorded in its manifest."""
+    for name, digest in manifest['files'].items():
+        path = os.path.join(version_dir, name)
+        if not os.path.isfile(path):
+            raise IntegrityError(f'{name} is missing')
+        if file_sha256(path) != digest:
+            raise IntegrityError(f'{name} does not match its sha256 in the manifest')
+
+
+def main():
+    from . import artifacts
+
+    parser = argparse.ArgumentParser(description='Manage the versioned model registry.')
+    parser.add_argument('--registry', default=DEFAULT_REGISTRY_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='List published versions')
+    verify_parser = commands.add_parser('verify', help='Check file hashes of a version')
+    verify_parser.add_argument('version', nargs='?')
+    activate_parser = commands.add_parser('activate', help='Serve a published version')
+    activate_parser.add_argument('version')
+    commands.add_parser('publish', help='Publish the model files in predictor/ml/ as a new version')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        active = current_version(args.registry)
+        for version in list_versions(args.registry):
+            print(f"{'*' if version == active else ' '} {version}")
+
+    elif args.command == 'verify':
+        version = args.version or current_version(args.registry)
+        if version is None:
+            parser.error('no version given and no version is active')
+        verify_version(*read_manifest(args.registry, version))
+        print(f"✅ {version} matches its manifest")
+
+    elif args.command == 'activate':
+        verify_version(*read_manifest(args.registry, args.version))
+        activate_version(args.registry, args.version)
+        print(f"✅ {args.version} is now the active version")
+
+    elif args.command == 'publish':
+        from ..bundle import WARMUP_TEXTS
+
+        models = {}
+        for model_name, filename in MODEL_FILENAMES.items():
+            path = os.path.join(ML_DIR, filename)
+            if os.path.exists(path):
+                models[model_name] = artifacts.load_artifact(path, mmap=False)
+        # model.pkl is the default model, trained as the SVM
+        default_path = os.path.join(ML_DIR, 'model.pkl')
+        svm_path = os.path.join(ML_DIR, MODEL_FILENAMES['SVM'])
+        if not os.path.exists(svm_path) or not filecmp.cmp(default_path, svm_path, shallow=False):
+            print(f"⚠️ {MODEL_FILENAMES['SVM']} differs from model.pkl; publishing model.pkl as the SVM")
+            models['SVM'] = artifacts.load_artifact(default_path, mmap=False)
+        vectorizer = artifacts.load_artifact(os.path.join(ML_DIR, 'vectorizer.pkl'), mmap=False)
+        version = publish_version(args.registry, vectorizer, models, 'SVM', warmup_texts=WARMUP_TEXTS)
+        print(f"✅ Published and activated {version}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+Content-addressed cache of the cleaned corpus and TF-IDF features used
+for training.
+
+Cleaning every message and refitting the vectorizer dominate a training
+run, but neither changes when only a model hyperparameter does. Both are
+cached on disk in two layers, each under a hash of everything its output
+depends on:
+
+    .cache/
+        corpus-<key>/      cleaned.json.gz              key: dataset sha256,
+                           meta.json                    preprocessing fingerprint
+        features-<key>/    vectorizer.pkl               key: corpus key, vectorizer
+                           X_train.npz, X_test.npz      class and parameters,
+                           split.npz (row indices)      scikit-learn version, split
+                           meta.json
+
+Editing the dataset, preprocess.py or the installed NLTK data changes
+the corpus key; changing the vectorizer settings or the split only
+refits the features. Nothing is ever invalidated by hand: a stale entry
+is simply not looked up again, and only the newest KEEP_ENTRIES entries
+of each layer are kept.
+
+Entries are written to a hidden temporary directory and renamed into
+place, like registry versions.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import namedtuple
+
+import numpy as np
+import scipy.sparse
+import sklearn
+from sklearn.model_selection import train_test_split
+
+from . import preprocess
+from .artifacts import load_artifact, save_artifact, save_json
+from .compiled import file_sha256
+
+CACHE_FORMAT = 1
+KEEP_ENTRIES = 3
+
+# Cleaned for the fingerprint: whether stop words are removed and words
+# lemmatized depends on the NLTK data installed, not only on the code
+CANARY_TEXT = 'The striped bats were hanging on their feet and ate the best berries'
+
+TrainingFeatures = namedtuple(
+    'TrainingFeatures', 'key vectorizer X_train X_test train_index test_index')
+
+
+def preprocessing_fingerprint():
+    """Describe everything besides the dataset that clean_text() output depends on."""
+    return {
+        'preprocess_sha256': file_sha256(preprocess.__file__),
+        'stop_words_sha256': hashlib.sha256('\n'.join(sorted(preprocess.STOP_WORDS)).encode()).hexdigest(),
+        'canary': preprocess.clean_text(CANARY_TEXT),
+    }
+
+
+def make_key(inputs):
+    """Hash a JSON-serializable description of a cache entry's inputs."""
+    encoded = json.dumps(dict(inputs, format=CACHE_FORMAT), sort_keys=True, default=repr)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:16]
+
+
+def _lookup(cache_dir, name):
+    """Return the directory of an existing entry (marking it recently used), or None."""
+    if cache_dir is None:
+        return None
+    entry_dir = os.path.join(cache_dir, name)
+    if not os.path.isfile(os.path.join(entry_dir, 'meta.json')):
+        return None
+    os.utime(entry_dir)
+    return entry_dir
+
+
+def _store(cache_dir, name, inputs, write):
+    """Create an entry by calling write(directory), then drop old entries of its layer."""
+    os.makedirs(cache_dir, exist_ok=True)
+    staging_dir = os.path.join(cache_dir, f'.staging.{os.getpid()}.{time.time_ns()}')
+    os.makedirs(staging_dir)
+    try:
+        write(staging_dir)
+        # Written last: an entry without meta.json is never used
+        save_json({'name': name, 'inputs': inputs}, os.path.join(staging_dir, 'meta.json'),
+                  indent=2, default=repr)
+        try:
+            os.rename(staging_dir, os.path.join(cache_dir, name))
+        except OSError:
+            # Another run stored the same entry meanwhile
+            pass
+    finally:
+        if os.path.exists(staging_dir):
+            shutil.rmtree(staging_dir)
+    prune(cache_dir, name.split('-', 1)[0])
+
+
+def prune(cache_dir, layer, keep=KEEP_ENTRIES):
+    """Remove all but the `keep` most recently used entries of a layer."""
+    entries = [
+        os.path.join(cache_dir, name) for name in os.listdir(cache_dir)
+        if name.startswith(f'{layer}-')
+    ]
+    entries.sort(key=os.path.getmtime, reverse=True)
+    for entry_dir in entries[keep:]:
+        shutil.rmtree(entry_dir, ignore_errors=True)
+
+
+def load_or_clean(cache_dir, dataset_path, messages, clean_texts):
+    """
+    Return (corpus key, cleaned messages), cleaning only on a cache miss.
+
+    Args:
+        cache_dir: Cache directory, or None to always clean
+        dataset_path: File the messages were read from; its hash is part of the key
+        messages: Raw messages, in dataset order
+        clean_texts: Function cleaning a list of texts (e.g. batch_clean_texts)
+    """
+    inputs = {'dataset_sha256': file_sha256(dataset_path), 'preprocessing': preprocessing_fingerprint()}
+    key = make_key(inputs)
+    name = f'corpus-{key}'
+
+    entry_dir = _lookup(cache_dir, name)
+    if entry_dir is not None:
+        with gzip.open(os.path.join(entry_dir, 'cleaned.json.gz'), 'rt', encoding='utf-8') as f:
+            cleaned = json.load(f)
+        if len(cleaned) == len(messages):
+            print(f"♻️ Reusing cleaned corpus {key}")
+            return key, cleaned
+        print(f"⚠️ Cached corpus {key} does not match the dataset; cleaning again")
+
+    cleaned = clean_texts(messages)
+    if cache_dir is not None:
+        def write(directory):
+            with gzip.open(os.path.join(directory, 'cleaned.json.gz'), 'wt', encoding='utf-8') as f:
+                json.dump(cleaned, f, ensure_ascii=False)
+        _store(cache_dir, name, inputs, write)
+    return key, cleaned
+
+
+def load_or_vectorize(cache_dir, corpus_key, cleaned, vectorizer, test_size, random_state):
+    """
+    Split the cleaned corpus and fit the vectorizer on the training rows,
+    reusing a cached result for the same inputs.
+
+    Args:
+        cache_dir: Cache directory, or None to always fit
+        corpus_key: Key returned by load_or_clean()
+        cleaned: Cleaned messages, in dataset order
+        vectorizer: Unfitted vectorizer; only its class and parameters
+            are used on a cache hit
+        test_size, random_state: Passed to train_test_split()
+
+    Returns a TrainingFeatures tuple. train_index and test_index are the
+    dataset rows of each split, in the order of the matrix rows.
+    """
+    inputs = {
+        'corpus': corpus_key,
+        'vectorizer': type(vectorizer).__name__,
+        'params': vectorizer.get_params(),
+        'sklearn': sklearn.__version__,
+        'test_size': test_size,
+        'random_state': random_state,
+    }
+    key = make_key(inputs)
+    name = f'features-{key}'
+
+    entry_dir = _lookup(cache_dir, name)
+    if entry_dir is not None:
+        print(f"♻️ Reusing fitted vectorizer and features {key}")
+        split = np.load(os.path.join(entry_dir, 'split.npz'))
+        return TrainingFeatures(
+            key,
+            load_artifact(os.path.join(entry_dir, 'vectorizer.pkl'), mmap=False),
+            scipy.sparse.load_npz(os.path.join(entry_dir, 'X_train.npz')),
+            scipy.sparse.load_npz(os.path.join(entry_dir, 'X_test.npz')),
+            split['train_index'],
+            split['test_index'],
+        )
+
+    train_index, test_index = train_test_split(
+        np.arange(len(cleaned)), test_size=test_size, random_state=random_state)
+    X_train = vectorizer.fit_transform([cleaned[i] for i in train_index])
+    X_test = vectorizer.transform([cleaned[i] for i in test_index])
+    # stop_words_ only lists pruned terms and can be huge; transform() does not use it
+    vectorizer.stop_words_ = None
+
+    if cache_dir is not None:
+        def write(directory):
+            save_artifact(vectorizer, os.path.join(directory, 'vectorizer.pkl'))
+            scipy.sparse.save_npz(os.path.join(directory, 'X_train.npz'), X_train.tocsr())
+            scipy.sparse.save_npz(os.path.join(directory, 'X_test.npz'), X_test.tocsr())
+            np.savez(os.path.join(directory, 'split.npz'), train_index=train_index, test_index=test_index)
+        _store(cache_dir, name, inputs, write)
+    return TrainingFeatures(key, vectorizer, X_train, X_test, train_index, test_index)
@@ -0,0 +1,212 @@
+"""
+Near-duplicate index for spam campaigns.
+
+Campaign emails often differ only in a name, a number or a tracking URL.
+clean_text() already strips URLs and digits, so the cleaned token sets
+of such variants are almost identical. Each scored email is summarized
+by a MinHash signature of its token set and indexed with banded
+locality-sensitive hashing (LSH). A new email whose estimated Jaccard
+similarity to an indexed one reaches the threshold reuses that verdict.
+"""
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+NearDuplicateMatch = namedtuple('NearDuplicateMatch', ['key', 'similarity', 'value'])
+
+
+class NearDuplicateIndex:
+    """
+    Bounded MinHash-LSH index of recently scored emails.
+
+    Args:
+        threshold: Minimum estimated Jaccard similarity for a match
+        max_entries: Maximum number of indexed emails (oldest are evicted)
+        ttl: Seconds an entry stays in the index (0 means no expiry)
+        min_tokens: Emails with fewer distinct tokens are not indexed,
+            since similarity between very short texts is unreliable
+        num_perm: Number of MinHash permutations (signature length)
+        bands: Number of LSH bands; num_perm must be divisible by it
+        max_candidates: Maximum number of candidates verified per lookup
+        seed: Seed for the MinHash permutations
+    """
+
+    def __init__(self, threshold=0.85, max_entries=100000, ttl=3600,
+                 min_tokens=10, num_perm=64, bands=16, max_candidates=32,
+                 seed=1):
+        if num_perm % bands:
+            raise ValueError('num_perm must be divisible by bands')
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_candidates = max_candidates
+
+        # Multiply-shift hash family: h(x) = (a * x + b) >> 32 (mod 2**64)
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+        self._lock = threading.Lock()
+        self._version = None
+        # key -> (expires_at, signature bytes, value), oldest first
+        self._entries = OrderedDict()
+        # band key -> entry key, or a set of entry keys once they collide
+        self._buckets = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def signature(self, tokens):
+        """Return the MinHash signature of a token set, or None if it is too short."""
+        unique_tokens = set(tokens)
+        if len(unique_tokens) < self.min_tokens:
+            return None
+        # crc32 is stable across processes (unlike hash()), so every worker
+        # computes the same signature for the same email
+        token_hashes = np.fromiter((zlib.crc32(token.encode('utf-8', 'surrogatepass'))
+                                    for token in unique_tokens),
+                                   dtype=np.uint64, count=len(unique_tokens))
+        hashed = (token_hashes[:, None] * self._a + self._b) >> np.uint64(32)
+        return hashed.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        # signature is the raw bytes of a uint32 MinHash signature
+        width = self.rows * 4
+        return [hash((band, signature[band * width:(band + 1) * width]))
+                for band in range(self.bands)]
+
+    def query(self, tokens, version):
+        """
+        Find a recently indexed email similar to `tokens`.
+        Entries indexed under another model version never match.
+        Returns a NearDuplicateMatch or None.
+        """
+        if not self.enabled:
+            return None
+        signature = self.signature(tokens)
+        if signature is None:
+            return None
+        band_keys = self._band_keys(signature.tobytes())
+
+        with self._lock:
+            self._check_version(version)
+            self._expire(time.monotonic())
+
+            candidates = set()
+            for band_key in band_keys:
+                keys = self._buckets.get(band_key)
+                if keys is None:
+                    continue
+                if isinstance(keys, set):
+                    candidates.update(keys)
+                else:
+                    candidates.add(keys)
+                if len(candidates) >= self.max_candidates:
+                    break
+
+            best = None
+            for key in candidates:
+                _, candidate_signature, value = self._entries[key]
+                matches = int(np.count_nonzero(
+                    np.frombuffer(candidate_signature, dtype=np.uint32) == signature))
+                similarity = matches / self.num_perm
+                if similarity >= self.threshold and (best is None or similarity > best.similarity):
+                    best = NearDuplicateMatch(key, similarity, value)
+
+            if best is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+            return best
+
+    def add(self, key, tokens, value, version):
+        """Index a scored email under `key` with its reusable verdict `value`."""
+        if not self.enabled:
+            return
+        signature = self.signature(tokens)
+        if signature is None:
+            return
+        signature = signature.tobytes()
+        band_keys = self._band_keys(signature)
+        now = time.monotonic()
+        expires_at = now + self.ttl if self.ttl > 0 else None
+
+        with self._lock:
+            self._check_version(version)
+            self._expire(now)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, signature, value)
+            buckets = self._buckets
+            for band_key in band_keys:
+                keys = buckets.get(band_key)
+                if keys is None:
+                    buckets[band_key] = key
+                elif isinstance(keys, set):
+                    keys.add(key)
+                else:
+                    buckets[band_key] = {keys, key}
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def _check_version(self, version):
+        # A new model version makes every stored verdict stale
+        if version != self._version:
+            self._clear()
+            self._version = version
+
+    def _expire(self, now):
+        # Entries are kept in insertion order, so expired ones are at the front
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry[0] is None or entry[0] > now:
+                break
+            self._remove(key)
+            self._evictions += 1
+
+    def _remove(self, key):
+        _, signature, _ = self._entries.pop(key)
+        buckets = self._buckets
+        for band_key in self._band_keys(signature):
+            keys = buckets.get(band_key)
+            if isinstance(keys, set):
+                keys.discard(key)
+                if len(keys) == 1:
+                    buckets[band_key] = keys.pop()
+            elif keys == key:
+                del buckets[band_key]
+
+    def _clear(self):
+        self._entries.clear()
+        self._buckets.clear()
+
+    def clear(self):
+        """Drop every indexed email (counters are kept)."""
+        with self._lock:
+            self._clear()
+
+    def stats(self):
+        """Return size limits and hit/miss/eviction counters."""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'threshold': self.threshold,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+            }
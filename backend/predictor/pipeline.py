@@ -0,0 +1,98 @@
+"""
+Per-request state for the single-email prediction pipeline.
+
+The cleaning, vectorizing and inference steps used to be repeated by
+every stage that needed them. A PredictionContext computes each of them
+at most once, and only when a stage first asks for it, so the verdict,
+word importance and model comparison stages all share one TF-IDF vector
+and each model runs once per email.
+"""
+from functools import cached_property
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from .ml.preprocess import clean_text
+
+
+def predict_with_probabilities(trained_model, text_vector):
+    """
+    Return (prediction, probabilities) for a 1-row vector.
+    probabilities is None for models without predict_proba.
+    """
+    if not hasattr(trained_model, 'predict_proba'):
+        return trained_model.predict(text_vector)[0], None
+
+    probabilities = trained_model.predict_proba(text_vector)[0]
+    # SVC's predict() follows the decision function, which can disagree
+    # with its Platt-scaled probabilities; every other model predicts
+    # the most probable class, so one call is enough.
+    if getattr(trained_model, 'probability', False):
+        return trained_model.predict(text_vector)[0], probabilities
+    return trained_model.classes_[probabilities.argmax()], probabilities
+
+
+class PredictionContext:
+    """
+    Lazily computed inputs shared by the stages scoring one email.
+
+    Args:
+        email_text: Raw email text
+        bundle: ModelBundle scoring this email. Its compiled scorer, if
+            any, vectorizes the email instead of the sklearn vectorizer.
+        cleaned_text: Output of clean_text(email_text), if already known
+    """
+
+    def __init__(self, email_text, bundle, cleaned_text=None):
+        self.email_text = email_text
+        self.bundle = bundle
+        self.vectorizer = bundle.vectorizer
+        self.scorer = bundle.compiled_scorer
+        if cleaned_text is not None:
+            self.__dict__['cleaned_text'] = cleaned_text
+        # id(model) -> (model, prediction, probabilities)
+        self._model_outputs = {}
+
+    @cached_property
+    def cleaned_text(self):
+        return clean_text(self.email_text)
+
+    @cached_property
+    def tokens(self):
+        return self.cleaned_text.split()
+
+    @cached_property
+    def text_lower(self):
+        return self.email_text.lower()
+
+    @cached_property
+    def features(self):
+        """(indices, values) of the TF-IDF row, from the compiled scorer."""
+        return self.scorer.vectorize(self.cleaned_text)
+
+    @cached_property
+    def text_vector(self):
+        if self.scorer is not None:
+            # The compiled row as a 1-row sparse matrix, like vectorizer.transform()
+            indices, values = self.features
+            return csr_matrix((values, indices, np.array([0, len(indices)], dtype=np.int32)),
+                              shape=(1, self.scorer.n_features))
+        return self.vectorizer.transform([self.cleaned_text])
+
+    @cached_property
+    def compiled_outputs(self):
+        """(prediction, probabilities, decision) from the compiled scorer."""
+        return self.scorer.predict(*self.features)
+
+    def model_outputs(self, trained_model):
+        """
+        Return (prediction, probabilities) of trained_model for this email.
+        Each model object is run at most once per context.
+        """
+        outputs = self._model_outputs.get(id(trained_model))
+        if outputs is None:
+            prediction, probabilities = predict_with_probabilities(trained_model, self.text_vector)
+            # Keep a reference so the id cannot be reused by another object
+            outputs = (trained_model, prediction, probabilities)
+            self._model_outputs[id(trained_model)] = outputs
+        return outputs[1], outputs[2]
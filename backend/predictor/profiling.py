@@ -0,0 +1,157 @@
+"""
+Opt-in profiling of individual prediction requests.
+
+A slow classification usually cannot be reproduced once the email that
+caused it is gone. With profiling enabled, a request that carries the
+X-Profile header (together with the admin token) or that is picked by
+PROFILE_SAMPLE_RATE runs under cProfile, and its stats are stored under
+the sha256 of the request body:
+
+    profiles/
+        20261017-093000-123456-1f2e3d4c5b6a7980-predict.prof     pstats data
+        20261017-093000-123456-1f2e3d4c5b6a7980-predict.json     metadata
+
+Only the hash of the input is kept, never the email itself, so a
+profile can be matched to a customer's report without storing their
+mail. The store keeps the newest PROFILE_MAX_FILES profiles. It lives on
+disk, so every worker process writes to and serves the same profiles.
+
+Read a downloaded profile with:
+
+    python -m pstats PROFILE.prof
+"""
+import cProfile
+import hashlib
+import json
+import os
+import pstats
+import re
+import time
+from io import StringIO
+
+from .ml.artifacts import replacing, save_json
+
+PROFILE_SUFFIX = '.prof'
+METADATA_SUFFIX = '.json'
+# Profile ids are generated by the store; anything else is rejected
+PROFILE_ID_PATTERN = re.compile(r'^\d{8}-\d{6}-\d{6}-(?:[0-9a-f]{16}-)?[a-z_]+$')
+
+
+def hash_input(body):
+    """Return the sha256 hex digest of a request body."""
+    return hashlib.sha256(body).hexdigest()
+
+
+class ProfileStore:
+    """
+    Directory of profiles, rotated to the newest max_profiles.
+
+    Args:
+        directory: Where profiles are written (created on first save)
+        max_profiles: Number of profiles kept
+    """
+
+    def __init__(self, directory, max_profiles):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def save(self, profiler, endpoint, body, metadata=None):
+        """
+        Write the stats of a finished cProfile.Profile and return its id.
+
+        Args:
+            profiler: Disabled cProfile.Profile
+            endpoint: Name of the profiled endpoint
+            body: Raw request body; only its hash and size are stored.
+                None if the body could not be read (over Django's upload limit).
+            metadata: Extra JSON-serializable details (duration, status, ...)
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        input_sha256 = hash_input(body) if body is not None else None
+        now = time.time_ns()
+        # Microseconds keep ids (and so the rotation order) strictly increasing
+        profile_id = '{}-{:06d}-{}{}'.format(
+            time.strftime('%Y%m%d-%H%M%S', time.localtime(now // 10**9)),
+            now // 1000 % 10**6, f'{input_sha256[:16]}-' if input_sha256 else '', endpoint
+        )
+
+        with replacing(self._path(profile_id, PROFILE_SUFFIX)) as temporary_path:
+            profiler.dump_stats(temporary_path)
+        save_json(dict(metadata or {}, **{
+            'id': profile_id,
+            'endpoint': endpoint,
+            'input_sha256': input_sha256,
+            'input_bytes': len(body) if body is not None else None,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(now // 10**9)),
+        }), self._path(profile_id, METADATA_SUFFIX), indent=2)
+
+        self.rotate()
+        return profile_id
+
+    def rotate(self):
+        """Delete the oldest profiles beyond max_profiles."""
+        for profile_id in self.ids()[self.max_profiles:]:
+            for suffix in (PROFILE_SUFFIX, METADATA_SUFFIX):
+                try:
+                    os.remove(self._path(profile_id, suffix))
+                except FileNotFoundError:
+                    # Another worker rotated it first
+                    pass
+
+    def ids(self):
+        """Return the stored profile ids, newest first."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        ids = (name[:-len(PROFILE_SUFFIX)] for name in names if name.endswith(PROFILE_SUFFIX))
+        return sorted((profile_id for profile_id in ids if PROFILE_ID_PATTERN.match(profile_id)), reverse=True)
+
+    def metadata(self, profile_id):
+        """Return the metadata of a profile, or None if it does not exist."""
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id, METADATA_SUFFIX), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def list(self):
+        """Return the metadata of every stored profile, newest first."""
+        profiles = (self.metadata(profile_id) for profile_id in self.ids())
+        return [profile for profile in profiles if profile is not None]
+
+    def profile_path(self, profile_id):
+        """Return the path of a profile's pstats file, or None if it does not exist."""
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = self._path(profile_id, PROFILE_SUFFIX)
+        return path if os.path.isfile(path) else None
+
+    def summary(self, profile_id, limit=40, sort='cumulative'):
+        """Return the pstats report of a profile as text, or None if it does not exist."""
+        path = self.profile_path(profile_id)
+        if path is None:
+            return None
+        output = StringIO()
+        pstats.Stats(path, stream=output).sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def _path(self, profile_id, suffix):
+        return os.path.join(self.directory, profile_id + suffix)
+
+
+def run_profiled(view, request, *args, **kwargs):
+    """
+    Call view under cProfile.
+    Returns (response, profiler, seconds).
+    """
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        response = view(request, *args, **kwargs)
+    finally:
+        profiler.disable()
+    return response, profiler, time.perf_counter() - start
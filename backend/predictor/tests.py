@@ -1,3 +1,1504 @@
-from django.test import TestCase
+import asyncio
+import copy
+import json
+import os
+import threading
+import random
+import re
+import subprocess
+import sys
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.http import JsonResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, override_settings
+
+from . import keywords, views
+from .cache import VerdictCache, make_cache_key
+from .executor import BoundedExecutor, ExecutorSaturated
+from .metrics import FOLD_THRESHOLD, MetricsRegistry
+from .ml import links, preprocess
+from .bundle import BundleManager, ModelBundle, load_model_bundle, load_registry_bundle
+from .near_duplicate import NearDuplicateIndex
+from .pipeline import PredictionContext
+from .feedback import OnlineLearner
+from .profiling import ProfileStore, hash_input
+from .ml.explain import WordImportanceExplainer
+from .ml.artifacts import load_artifact, save_artifact
+from .ml.compiled import CompiledScorer, compile_model
+from .ml.linear import LinearEnsemble, linear_head
+from .ml.training_cache import load_or_clean, load_or_vectorize
+from .ml.registry import (
+    IntegrityError, activate_version, current_version, list_versions, publish_version, read_manifest
+)
+from .ml.preprocess import (
+    clean_text, remove_urls, remove_html_tags, remove_emails,
+    remove_punctuation, remove_digits, remove_extra_whitespace,
+    remove_stopwords, lemmatize_text, configure_lemma_cache,
+    clear_lemma_cache, lemma_cache_info, warm_lemma_cache,
+)
+
+
+def legacy_clean_text(text, remove_stop_words=True, lemmatize=True, remove_nums=True):
+    """The original step-by-step clean_text() pipeline, kept as a reference."""
+    if not text or not isinstance(text, str):
+        return ""
+    text = text.lower()
+    text = remove_urls(text)
+    text = remove_html_tags(text)
+    text = remove_emails(text)
+    text = remove_punctuation(text)
+    if remove_nums:
+        text = remove_digits(text)
+    text = remove_extra_whitespace(text)
+    if remove_stop_words and preprocess.STOP_WORDS:
+        text = remove_stopwords(text)
+    if lemmatize and preprocess.lemmatizer is not None:
+        text = lemmatize_text(text)
+    return text
+
+
+class SuffixLemmatizer:
+    """Tiny stand-in for WordNetLemmatizer that strips a trailing 's'."""
+
+    def lemmatize(self, word):
+        return word[:-1] if word.endswith('s') and len(word) > 3 else word
+
+
+class MissingDataLemmatizer:
+    """Behaves like WordNetLemmatizer without the wordnet corpus."""
+
+    def lemmatize(self, word):
+        raise LookupError("wordnet")
+
+
+def build_corpus(size=400, seed=1234):
+    samples = [
+        "",
+        "   ",
+        "Congratulations! You have won $1,000,000!\nClick here: http://spam-site.com NOW!!!",
+        "Contact us at spam@fake.com or visit www.example.org/offer?id=42",
+        "<html><body><p>Hello&nbsp;<b>World</b></p></body></html>",
+        "Meeting at 3pm in room 101 -- see you there.",
+        "Arabic digits ١٢٣ and fullwidth ４５６ numbers",
+        "ΣΊΣΥΦΟΣ and İstanbul and ß Straße",
+        "broken <tag without close and foo@ bar and http:// spaces",
+        "foo@http://bar.com mixed <a href='x@y.com'>link</a>",
+        "The cats are running and the dogs were barking",
+        "tabs\tand\nnewlines\r\nand non-breaking spaces",
+    ]
+    alphabet = list("abcdefgHIJKLMxyz  \t\n0123456789") + list("!@#$%<>/:.?-_'\"") + [
+        "http://", "https://", "www.", "<b>", "</b>", "@", "١", "٣", "Σ", "İ", "é", "the", "and",
+    ]
+    rng = random.Random(seed)
+    for _ in range(size):
+        samples.append(''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 80))))
+    return samples
+
+
+class CleanTextEquivalenceTests(SimpleTestCase):
+    """The fused clean_text() must match the original helper pipeline byte for byte."""
+
+    corpus = build_corpus()
+    option_sets = [
+        {},
+        {'remove_nums': False},
+        {'remove_stop_words': False},
+        {'lemmatize': False},
+        {'remove_stop_words': False, 'lemmatize': False, 'remove_nums': False},
+    ]
+
+    def setUp(self):
+        # Cached lemmas must not leak between the patched lemmatizers
+        clear_lemma_cache()
+
+    def tearDown(self):
+        clear_lemma_cache()
+
+    def assert_equivalent(self):
+        for options in self.option_sets:
+            for text in self.corpus:
+                with self.subTest(text=text, options=options):
+                    self.assertEqual(clean_text(text, **options),
+                                     legacy_clean_text(text, **options))
+
+    def test_matches_legacy_pipeline(self):
+        self.assert_equivalent()
+
+    def test_matches_legacy_pipeline_with_stopwords_and_lemmatizer(self):
+        with mock.patch.object(preprocess, 'STOP_WORDS', {'the', 'and', 'are', 'at', 'in'}), \
+                mock.patch.object(preprocess, 'lemmatizer', SuffixLemmatizer()):
+            self.assert_equivalent()
+
+    def test_matches_legacy_pipeline_without_nltk(self):
+        with mock.patch.object(preprocess, 'STOP_WORDS', set()), \
+                mock.patch.object(preprocess, 'lemmatizer', None):
+            self.assert_equivalent()
+
+    def test_matches_legacy_pipeline_when_wordnet_is_missing(self):
+        with mock.patch.object(preprocess, 'lemmatizer', MissingDataLemmatizer()):
+            self.assert_equivalent()
+
+    def test_non_string_input(self):
+        self.assertEqual(clean_text(None), "")
+        self.assertEqual(clean_text(42), "")
+
+
+class LemmaCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(preprocess, 'lemmatizer', SuffixLemmatizer())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(configure_lemma_cache)
+
+    def test_counts_hits_and_misses(self):
+        configure_lemma_cache(10)
+        self.assertEqual(lemmatize_text("cats dogs cats"), "cat dog cat")
+        info = lemma_cache_info()
+        self.assertEqual((info['hits'], info['misses'], info['size']), (1, 2, 2))
+
+    def test_evicts_least_recently_used(self):
+        configure_lemma_cache(2)
+        clean_text("cats dogs birds")
+        clean_text("cats")
+        info = lemma_cache_info()
+        self.assertEqual(info['size'], 2)
+        self.assertEqual(info['misses'], 4)
+
+    def test_warm_lemma_cache(self):
+        configure_lemma_cache(10)
+        self.assertEqual(warm_lemma_cache(['cats', 'dogs']), 2)
+        clean_text("cats dogs")
+        self.assertEqual(lemma_cache_info()['hits'], 2)
+
+    def test_warm_without_wordnet_data(self):
+        with mock.patch.object(preprocess, 'lemmatizer', MissingDataLemmatizer()):
+            self.assertEqual(warm_lemma_cache(['cats']), 0)
+
+
+class BatchCleanTextsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.addCleanup(preprocess.shutdown_process_pool)
+        self.texts = [text for text in build_corpus(size=40) if text.strip()]
+
+    def test_parallel_cleaning_preserves_order(self):
+        with mock.patch.object(preprocess, 'PARALLEL_MIN_TEXTS', 4):
+            cleaned = preprocess.batch_clean_texts(self.texts, n_jobs=2, chunksize=3)
+        self.assertEqual(cleaned, [clean_text(text) for text in self.texts])
+
+    def test_small_batches_are_cleaned_serially(self):
+        with mock.patch.object(preprocess, '_get_process_pool') as get_pool:
+            cleaned = preprocess.batch_clean_texts(self.texts, n_jobs=4)
+        get_pool.assert_not_called()
+        self.assertEqual(cleaned, [clean_text(text) for text in self.texts])
+
+    def test_broken_pool_falls_back_to_serial(self):
+        pool = mock.Mock()
+        pool.map.side_effect = preprocess.BrokenProcessPool()
+        with mock.patch.object(preprocess, 'PARALLEL_MIN_TEXTS', 4), \
+                mock.patch.object(preprocess, '_process_pool', pool), \
+                mock.patch.object(preprocess, '_process_pool_workers', 2):
+            cleaned = preprocess.batch_clean_texts(self.texts, n_jobs=2)
+            self.assertIsNone(preprocess._process_pool)
+        pool.shutdown.assert_called_once()
+        self.assertEqual(cleaned, [clean_text(text) for text in self.texts])
+
+    def test_concurrent_callers_share_one_pool(self):
+        def slow_pool(max_workers):
+            started.wait(1)
+            pool = mock.Mock()
+            pool.map.side_effect = lambda clean, texts, chunksize: map(clean, texts)
+            return pool
+
+        started = threading.Event()
+        with mock.patch.object(preprocess, 'ProcessPoolExecutor', side_effect=slow_pool) as executor:
+            threads = [threading.Thread(target=preprocess.batch_clean_texts, args=(self.texts,),
+                                        kwargs={'n_jobs': 2}) for _ in range(4)]
+            with mock.patch.object(preprocess, 'PARALLEL_MIN_TEXTS', 4):
+                for thread in threads:
+                    thread.start()
+                started.set()
+                for thread in threads:
+                    thread.join()
+        self.assertEqual(executor.call_count, 1)
+
+
+class VerdictCacheTests(SimpleTestCase):
+
+    def test_key_depends_on_model_version(self):
+        self.assertNotEqual(make_cache_key("win cash", "v1"), make_cache_key("win cash", "v2"))
+        self.assertEqual(make_cache_key("win cash", "v1"), make_cache_key("win cash", "v1"))
+
+    def test_evicts_least_recently_used(self):
+        cache = VerdictCache(max_entries=2, ttl=0)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        stats = cache.stats()
+        self.assertEqual((stats['size'], stats['evictions'], stats['hits'], stats['misses']), (2, 1, 2, 1))
+
+    def test_entries_expire(self):
+        cache = VerdictCache(max_entries=10, ttl=60)
+        with mock.patch('predictor.cache.time.monotonic', return_value=1000.0):
+            cache.set('a', 1)
+        with mock.patch('predictor.cache.time.monotonic', return_value=1061.0):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_disabled_cache(self):
+        cache = VerdictCache(max_entries=0, ttl=60)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['misses'], 0)
+
+
+class NearDuplicateIndexTests(SimpleTestCase):
+
+    campaign = ("dear customer you have been selected to receive an exclusive "
+                "cash prize claim your free gift card before the offer expires").split()
+
+    def test_matches_campaign_variant(self):
+        index = NearDuplicateIndex(threshold=0.8, ttl=0)
+        index.add('original', self.campaign, {'prediction': 'spam'}, 'v1')
+        variant = ['valued' if word == 'customer' else word for word in self.campaign]
+        match = index.query(variant, 'v1')
+        self.assertIsNotNone(match)
+        self.assertEqual(match.key, 'original')
+        self.assertEqual(match.value, {'prediction': 'spam'})
+        self.assertGreaterEqual(match.similarity, 0.8)
+
+    def test_unrelated_and_short_texts_do_not_match(self):
+        index = NearDuplicateIndex(ttl=0)
+        index.add('original', self.campaign, {}, 'v1')
+        self.assertIsNone(index.query("hi john can we move our meeting to thursday "
+                                      "afternoon after the project review".split(), 'v1'))
+        self.assertIsNone(index.query(self.campaign[:5], 'v1'))
+
+    def test_new_model_version_invalidates_entries(self):
+        index = NearDuplicateIndex(ttl=0)
+        index.add('original', self.campaign, {}, 'v1')
+        self.assertIsNone(index.query(self.campaign, 'v2'))
+        self.assertEqual(index.stats()['size'], 0)
+
+    def test_bounded_size_and_expiry(self):
+        index = NearDuplicateIndex(max_entries=2, ttl=60)
+        with mock.patch('predictor.near_duplicate.time.monotonic', return_value=1000.0):
+            for n in range(3):
+                index.add(f'email-{n}', self.campaign + [f'token{n}'], {}, 'v1')
+            self.assertEqual(index.stats()['size'], 2)
+        with mock.patch('predictor.near_duplicate.time.monotonic', return_value=1061.0):
+            self.assertIsNone(index.query(self.campaign, 'v1'))
+        self.assertEqual(index.stats()['size'], 0)
+
+
+class KeywordMatcherTests(SimpleTestCase):
+
+    categories = {
+        'spam': ['win', 'winner', 'act now', 'Free'],
+        'urgency': ['now', 'asap'],
+        'money': ['$', '€'],
+    }
+    text = "winner! act now to get $5 free"
+    expected = {'spam': ['win', 'winner', 'act now', 'free'], 'urgency': ['now'], 'money': ['$']}
+
+    def test_finds_overlapping_keywords(self):
+        self.assertEqual(keywords.KeywordMatcher(self.categories).find(self.text), self.expected)
+
+    def test_fallback_without_pyahocorasick(self):
+        with mock.patch.object(keywords, 'ahocorasick', None):
+            matcher = keywords.KeywordMatcher(self.categories)
+        self.assertEqual(matcher.find(self.text), self.expected)
+
+    def test_empty_categories(self):
+        self.assertEqual(keywords.KeywordMatcher({'spam': []}).find(self.text), {'spam': []})
+
+    def assert_indicators_match_legacy(self, matcher):
+        with mock.patch.object(views, 'keyword_matcher', matcher):
+            for text in build_keyword_corpus():
+                with self.subTest(text=text[:80]):
+                    self.assertEqual(views.analyze_spam_indicators(text), legacy_analyze_spam_indicators(text))
+
+    def test_indicators_match_legacy_analysis(self):
+        if keywords.ahocorasick is None:
+            self.skipTest('pyahocorasick is not installed')
+        matcher = keywords.KeywordMatcher(views.keyword_matcher.categories)
+        self.assertIsNotNone(matcher._automaton)
+        self.assert_indicators_match_legacy(matcher)
+
+    def test_fallback_indicators_match_legacy_analysis(self):
+        with mock.patch.object(keywords, 'ahocorasick', None):
+            matcher = keywords.KeywordMatcher(views.keyword_matcher.categories)
+        self.assertIsNone(matcher._automaton)
+        self.assert_indicators_match_legacy(matcher)
+
+
+def legacy_analyze_spam_indicators(text):
+    """The original keyword-loop analyze_spam_indicators(), kept as a reference."""
+    indicators = {
+        'suspicious_keywords': [], 'url_count': 0, 'caps_percentage': 0.0,
+        'exclamation_count': 0, 'money_terms': [], 'urgency_words': []
+    }
+    text_lower = text.lower()
+    for keyword in keywords.SPAM_KEYWORDS:
+        if keyword in text_lower:
+            indicators['suspicious_keywords'].append(keyword.upper())
+    url_pattern = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
+    indicators['url_count'] = len(re.findall(url_pattern, text))
+    if len(text) > 0:
+        caps_count = sum(1 for c in text if c.isupper())
+        indicators['caps_percentage'] = round((caps_count / len(text)) * 100, 2)
+    indicators['exclamation_count'] = text.count('!')
+    for term in keywords.MONEY_KEYWORDS:
+        if term in text_lower:
+            indicators['money_terms'].append(term.upper())
+    for word in keywords.URGENCY_KEYWORDS:
+        if word in text_lower:
+            indicators['urgency_words'].append(word.upper())
+    # The original passed money and urgency terms through set(), which only
+    # made their order arbitrary; keyword-list order is kept here
+    for key in ('suspicious_keywords', 'money_terms', 'urgency_words'):
+        indicators[key] = indicators[key][:10]
+    return indicators
+
+
+def build_keyword_corpus(seed=7):
+    rng = random.Random(seed)
+    terms = keywords.SPAM_KEYWORDS + keywords.MONEY_KEYWORDS + keywords.URGENCY_KEYWORDS
+    fragments = [
+        'Hello team, ', 'See https://example.com/offer?id={n} ', 'WINNER!!! ', 'Ärger über Geld ',
+        'winnerwinner ', 'ACT NOW ', 'Payment of €{n} ', 'İstanbul office ', 'lunch at noon. ',
+    ]
+    corpus = build_pattern_corpus(seed)
+    for size in (1, 5, 40):
+        for _ in range(20):
+            words = [rng.choice(terms) if rng.random() < 0.5 else rng.choice(fragments).format(n=rng.randint(0, 999))
+                     for _ in range(size)]
+            corpus.append(''.join(word.upper() if rng.random() < 0.2 else word for word in words))
+    corpus.extend(['', ' '.join(terms), ' '.join(terms).upper()])
+    return corpus
+
+
+def legacy_extract_patterns(text):
+    """The original six-findall extract_patterns(), kept as a reference."""
+    patterns = {
+        'urls': re.findall(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', text),
+        'email_addresses': re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', text),
+        'phone_numbers': re.findall(r'(?:\+?1[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}', text),
+        'ip_addresses': re.findall(r'\b(?:\d{1,3}\.){3}\d{1,3}\b', text),
+        'dollar_amounts': re.findall(r'\$\s*\d+(?:,\d{3})*(?:\.\d{2})?', text),
+        'percentages': re.findall(r'\d+(?:\.\d+)?%', text),
+    }
+    return {key: matches[:10] for key, matches in patterns.items()}
+
+
+def build_pattern_corpus(seed=99):
+    rng = random.Random(seed)
+    fragments = [
+        'Read more at https://news.example.com/a/{n}?utm=x ', 'Save {n}% today! ',
+        'Only ${n}.99 ', 'Total $ 1,{n:03d},000.50 ', 'Call 555-{n:03d}-1234 ',
+        'or +1 (555) 123-{n:04d} ', 'Contact jane{n}@example.org. ', 'Server 10.0.{n}.1 ',
+        'Lorem ipsum dolor sit amet. ', '١٢٣٤٥٦٧٨٩٠ ', '٪ and ₹{n} ', 'www.example.com ',
+    ]
+    corpus = build_corpus(size=300, seed=seed)
+    for size in (1, 5, 40, 400):
+        for _ in range(10):
+            corpus.append(''.join(rng.choice(fragments).format(n=rng.randint(0, 999))
+                                  for _ in range(size)))
+    return corpus
+
+
+class ExtractPatternsTests(SimpleTestCase):
+
+    def test_matches_legacy_extractor(self):
+        for text in build_pattern_corpus():
+            with self.subTest(text=text[:80]):
+                self.assertEqual(views.extract_patterns(text), legacy_extract_patterns(text))
+
+    def test_limits_each_category(self):
+        text = ' '.join(f'http://example.com/{n} {n}% ${n}' for n in range(50))
+        patterns = views.extract_patterns(text)
+        self.assertEqual(len(patterns['urls']), 10)
+        self.assertEqual(len(patterns['percentages']), 10)
+        self.assertEqual(patterns['dollar_amounts'][0], '$0')
+
+
+class WordImportanceExplainerTests(SimpleTestCase):
+
+    def setUp(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        self.vectorizer = TfidfVectorizer().fit(["alpha beta gamma delta", "epsilon zeta eta theta"])
+        self.model = LogisticRegression()
+        self.model.classes_ = np.array(['ham', 'spam'])
+        # beta and gamma tie on magnitude; ties keep vocabulary order
+        weights = {'alpha': 0.5, 'beta': -2.0, 'gamma': 2.0, 'delta': 1.0, 'zeta': 3.0}
+        self.model.coef_ = np.array([[weights.get(word, 0.1) for word in
+                                      self.vectorizer.get_feature_names_out()]])
+        self.model.intercept_ = np.zeros(1)
+
+    def test_orders_by_absolute_importance(self):
+        explainer = WordImportanceExplainer(self.vectorizer, self.model)
+        words = explainer.explain(self.vectorizer.transform(["alpha beta gamma delta zeta"]), top_n=3)
+        self.assertEqual([w['word'] for w in words], ['zeta', 'beta', 'gamma'])
+        self.assertEqual([w['type'] for w in words], ['spam', 'ham', 'spam'])
+
+    def test_empty_text(self):
+        explainer = WordImportanceExplainer(self.vectorizer, self.model)
+        self.assertEqual(explainer.explain(self.vectorizer.transform([""])), [])
+
+    def test_model_without_linear_weights(self):
+        explainer = WordImportanceExplainer(self.vectorizer, object())
+        self.assertEqual(explainer.explain(self.vectorizer.transform(["alpha"])), [])
+
+
+class PredictionContextTests(SimpleTestCase):
+
+    def setUp(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.naive_bayes import MultinomialNB
+        texts = ["free cash prize now", "meeting lunch tomorrow", "claim free prize", "see you at lunch"]
+        self.vectorizer = TfidfVectorizer().fit(texts)
+        self.model = MultinomialNB().fit(self.vectorizer.transform(texts), ['spam', 'ham', 'spam', 'ham'])
+        self.bundle = ModelBundle(self.model, self.vectorizer, 'test')
+
+    def test_vectorizes_and_predicts_once(self):
+        context = PredictionContext("free prize", self.bundle, cleaned_text="free prize")
+        with mock.patch.object(self.vectorizer, 'transform', wraps=self.vectorizer.transform) as transform, \
+                mock.patch.object(self.model, 'predict_proba', wraps=self.model.predict_proba) as predict_proba:
+            first = context.model_outputs(self.model)
+            second = context.model_outputs(self.model)
+            context.text_vector
+        self.assertEqual(transform.call_count, 1)
+        self.assertEqual(predict_proba.call_count, 1)
+        self.assertEqual(first[0], 'spam')
+        self.assertIs(first[1], second[1])
+        self.assertEqual(first[0], self.model.predict(context.text_vector)[0])
+
+    def test_cleans_lazily(self):
+        context = PredictionContext("Hello World", self.bundle)
+        self.assertNotIn('cleaned_text', context.__dict__)
+        self.assertEqual(context.tokens, clean_text("Hello World").split())
+
+
+class LinearEnsembleTests(SimpleTestCase):
+
+    def setUp(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        rng = random.Random(7)
+        spam_words = ['free', 'cash', 'prize', 'winner', 'claim', 'offer', 'urgent']
+        ham_words = ['meeting', 'lunch', 'tomorrow', 'project', 'thanks', 'report', 'team']
+        texts, labels = [], []
+        for _ in range(120):
+            label = rng.choice(['ham', 'spam'])
+            words = spam_words if label == 'spam' else ham_words
+            # Mix in the other vocabulary so the classes overlap
+            texts.append(' '.join(rng.choice(words + ham_words[:2] + spam_words[:2])
+                                  for _ in range(rng.randint(3, 12))))
+            labels.append(label)
+        self.vectorizer = TfidfVectorizer().fit(texts)
+        self.X = self.vectorizer.transform(texts)
+        self.labels = labels
+
+    def test_matches_sklearn(self):
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.naive_bayes import MultinomialNB
+        from sklearn.svm import SVC, LinearSVC
+        models = {
+            'Naive Bayes': MultinomialNB().fit(self.X, self.labels),
+            'Logistic Regression': LogisticRegression().fit(self.X, self.labels),
+            'SVM': SVC(kernel='linear', probability=True, random_state=0).fit(self.X, self.labels),
+            'Linear SVM': LinearSVC().fit(self.X, self.labels),
+        }
+        results = LinearEnsemble(models).score(self.X)
+        for name, model in models.items():
+            with self.subTest(model=name):
+                predictions, probabilities, decisions = results[name]
+                np.testing.assert_array_equal(predictions, model.predict(self.X))
+                if hasattr(model, 'decision_function'):
+                    np.testing.assert_allclose(decisions, model.decision_function(self.X))
+                if hasattr(model, 'predict_proba'):
+                    np.testing.assert_allclose(probabilities, model.predict_proba(self.X), atol=1e-9)
+                else:
+                    self.assertIsNone(probabilities)
+
+    def test_logistic_regression_without_multi_class(self):
+        from sklearn.linear_model import LogisticRegression
+        model = LogisticRegression().fit(self.X, self.labels)
+        expected = linear_head(model)
+        # Newer scikit-learn releases drop the multi_class parameter
+        del model.multi_class
+        weights, bias, _, _ = linear_head(model)
+        np.testing.assert_array_equal(weights, expected[0])
+        self.assertEqual(bias, expected[1])
+
+    def test_skips_non_linear_models(self):
+        from sklearn.ensemble import RandomForestClassifier
+        forest = RandomForestClassifier(n_estimators=3, random_state=0).fit(self.X, self.labels)
+        engine = LinearEnsemble({'Random Forest': forest})
+        self.assertNotIn('Random Forest', engine)
+        self.assertEqual(engine.score(self.X), {})
+
+
+class DefaultEngineTests(SimpleTestCase):
+    """Serving the default model from LinearEnsemble must not change any verdict."""
+
+    def setUp(self):
+        if views.active_bundle() is None:
+            self.skipTest('Model files not available')
+        self.bundle = views.active_bundle()
+        if 'default' not in self.bundle.default_engine:
+            self.skipTest('Default model is not linear')
+        self.texts = [text for text in build_corpus(size=200, seed=5) if text.strip()] + [
+            'draw ac boxnqp', 'hanging private allow ctzmks', 'order skilgme xwwmbd',
+            'URGENT!!! You WON a free cash prize, claim now at http://win.example.com',
+            'See you at lunch tomorrow, bring the report',
+        ]
+
+    def sklearn_bundle(self):
+        bundle = copy.copy(self.bundle)
+        bundle.default_engine = LinearEnsemble({})
+        return bundle
+
+    def test_verdicts_match_sklearn(self):
+        sklearn_bundle = self.sklearn_bundle()
+        for text in self.texts:
+            with self.subTest(text=text):
+                engine = views.score_email_verdict(PredictionContext(text, self.bundle), frozenset())
+                reference = views.score_email_verdict(PredictionContext(text, sklearn_bundle), frozenset())
+                self.assertEqual(engine['prediction'], reference['prediction'])
+                self.assertAlmostEqual(engine['confidence'], reference['confidence'], places=9)
+
+    def test_batch_verdicts_match_sklearn(self):
+        cleaned = [preprocess.clean_text(text) for text in self.texts]
+        labels, confidences = views.score_cleaned_texts(cleaned, self.bundle)
+        reference_labels, reference_confidences = views.score_cleaned_texts(cleaned, self.sklearn_bundle())
+        self.assertEqual(labels, reference_labels)
+        np.testing.assert_allclose(confidences, reference_confidences, atol=1e-9)
+
+
+class CompiledScorerTests(SimpleTestCase):
+
+    def setUp(self):
+        texts = build_corpus(200, seed=99)
+        rng = random.Random(3)
+        self.texts = [clean_text(text) for text in texts] + texts
+        self.labels = [rng.choice(['ham', 'spam']) for _ in self.texts]
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def assert_matches_sklearn(self, vectorizer, model):
+        # transform() (as used when serving) returns rows with sorted indices
+        X = vectorizer.fit(self.texts).transform(self.texts)
+        model.fit(X, self.labels)
+        compile_model(vectorizer, model, self.directory.name)
+        scorer = CompiledScorer(self.directory.name)
+
+        probabilities = model.predict_proba(X)
+        predictions = model.predict(X)
+        for row, text in enumerate(self.texts):
+            indices, values = scorer.vectorize(text)
+            np.testing.assert_array_equal(indices, X[row].indices)
+            np.testing.assert_allclose(values, X[row].data, rtol=1e-12)
+            prediction, row_probabilities, _ = scorer.predict(indices, values)
+            self.assertEqual(prediction, predictions[row])
+            np.testing.assert_allclose(row_probabilities, probabilities[row], atol=1e-9)
+
+    def test_logistic_regression(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        self.assert_matches_sklearn(TfidfVectorizer(max_features=300), LogisticRegression())
+
+    def test_calibrated_svc_with_ngrams(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.svm import SVC
+        vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, stop_words=['and', 'the'])
+        self.assert_matches_sklearn(vectorizer, SVC(kernel='linear', probability=True, random_state=0))
+
+    def test_detects_stale_sources(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.naive_bayes import MultinomialNB
+        vectorizer = TfidfVectorizer()
+        model = MultinomialNB().fit(vectorizer.fit_transform(self.texts), self.labels)
+        source = os.path.join(self.directory.name, 'model.bin')
+        with open(source, 'wb') as f:
+            f.write(b'one')
+        compile_model(vectorizer, model, self.directory.name, sources={'model': source})
+        scorer = CompiledScorer(self.directory.name)
+        self.assertTrue(scorer.matches_sources({'model': source}))
+        with open(source, 'wb') as f:
+            f.write(b'two')
+        self.assertFalse(scorer.matches_sources({'model': source}))
+
+    def test_scores_without_scipy(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        vectorizer = TfidfVectorizer()
+        model = LogisticRegression().fit(vectorizer.fit_transform(self.texts), self.labels)
+        compile_model(vectorizer, model, self.directory.name)
+        code = ("import sys; sys.modules['scipy'] = None\n"
+                "from predictor.ml.compiled import CompiledScorer\n"
+                "scorer = CompiledScorer(sys.argv[1])\n"
+                "print(scorer.predict(*scorer.vectorize(sys.argv[2]))[0])")
+        result = subprocess.run([sys.executable, '-c', code, self.directory.name, self.texts[0]],
+                                cwd=os.path.dirname(os.path.dirname(__file__)),
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), model.predict(vectorizer.transform(self.texts[:1]))[0])
+
+    def test_expit_matches_scipy(self):
+        from scipy.special import expit
+        decisions = np.concatenate([np.random.default_rng(0).normal(0, 10, 10000),
+                                    [0.0, -709.7, -709.8, 745.0, -np.inf, np.inf]])
+        np.testing.assert_array_equal(links.expit(decisions), expit(decisions))
+
+
+class ArtifactTests(SimpleTestCase):
+
+    def test_replacing_keeps_mapped_arrays_valid(self):
+        from sklearn.linear_model import LogisticRegression
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'model.pkl')
+
+        old_model = LogisticRegression()
+        old_model.coef_ = np.arange(1000, dtype=np.float64).reshape(1, -1)
+        save_artifact(old_model, path)
+        loaded = load_artifact(path)
+        self.assertIsInstance(loaded.coef_, np.memmap)
+        self.assertFalse(loaded.coef_.flags.writeable)
+
+        new_model = LogisticRegression()
+        new_model.coef_ = -np.ones((1, 1000))
+        save_artifact(new_model, path)
+
+        # The old mapping still sees the old file, new loads see the new one
+        np.testing.assert_array_equal(loaded.coef_, old_model.coef_)
+        np.testing.assert_array_equal(load_artifact(path).coef_, new_model.coef_)
+        self.assertEqual(os.listdir(directory.name), ['model.pkl'])
+
+
+class LazyComparisonModelsTests(SimpleTestCase):
+
+    def setUp(self):
+        if views.active_bundle() is None:
+            self.skipTest('Model files not available')
+        # Start from a worker that has not loaded the comparison models yet
+        self.bundle = views.load_bundle()
+        patchers = [
+            mock.patch.object(views.model_bundles, '_bundle', self.bundle),
+            mock.patch.object(views, 'verdict_cache', VerdictCache(0, 0)),
+            mock.patch.object(views, 'near_duplicate_index', NearDuplicateIndex(max_entries=0)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_loaded_on_first_comparison(self):
+        text = "WINNER! Claim your free cash prize now"
+        response, status = views.build_prediction_response({'email_text': text, 'compare': False})
+        self.assertEqual(status, 200)
+        self.assertNotIn('model_comparison', response)
+        self.assertEqual(self.bundle.comparison_models, {})
+
+        response, status = views.build_prediction_response({'email_text': text})
+        self.assertIn('model_comparison', response)
+        self.assertTrue(self.bundle.comparison_loaded)
+        self.assertEqual(response['model_comparison']['total_models'], len(self.bundle.comparison_models))
+
+    def test_disabled_by_setting(self):
+        with self.settings(MODEL_COMPARISON_ENABLED=False):
+            response, _ = views.build_prediction_response({'email_text': "See you at lunch tomorrow"})
+        self.assertNotIn('model_comparison', response)
+        self.assertFalse(self.bundle.comparison_loaded)
+
+
+class ResponseDetailTests(SimpleTestCase):
+
+    def setUp(self):
+        if views.active_bundle() is None:
+            self.skipTest('Model files not available')
+        patchers = [
+            mock.patch.object(views, 'verdict_cache', VerdictCache(100, 300)),
+            mock.patch.object(views, 'near_duplicate_index', NearDuplicateIndex(max_entries=0)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.text = "URGENT!!! You WON a free cash prize, claim now at http://win.example.com"
+
+    def test_minimal_skips_other_stages(self):
+        with mock.patch.object(views, 'analyze_spam_indicators') as indicators, \
+                mock.patch.object(views, 'extract_patterns') as patterns, \
+                mock.patch.object(views, 'get_word_importance') as importance, \
+                mock.patch.object(views, 'get_all_model_predictions') as comparison:
+            response, status = views.build_prediction_response({'email_text': self.text, 'detail': 'minimal'})
+        self.assertEqual(status, 200)
+        self.assertEqual(set(response), {'status', 'prediction', 'confidence', 'email_length', 'cleaned_length'})
+        for stage in (indicators, patterns, importance, comparison):
+            stage.assert_not_called()
+
+    def test_fields_and_levels_match_full_response(self):
+        full, _ = views.build_prediction_response({'email_text': self.text})
+        standard, _ = views.build_prediction_response({'email_text': self.text, 'detail': 'standard'})
+        self.assertEqual(standard, {key: full[key] for key in standard})
+        self.assertNotIn('word_importance', standard)
+
+        selected, _ = views.build_prediction_response(
+            {'email_text': self.text, 'fields': 'risk_level, word_importance'})
+        self.assertEqual(selected['risk_level'], full['risk_level'])
+        self.assertEqual(selected['word_importance'], full['word_importance'])
+        self.assertNotIn('spam_indicators', selected)
+
+    def test_unknown_detail_is_rejected(self):
+        for data in ({'detail': 'everything'}, {'detail': ['full']}, {'detail': {'level': 'full'}},
+                     {'fields': ['prediction', 'headers']}, {'fields': 3}):
+            response, status = views.build_prediction_response(dict(data, email_text=self.text))
+            self.assertEqual(status, 400, data)
+            response = self.client.post('/api/predict/', dict(data, email_text=self.text),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 400, data)
+            response, status = views.build_batch_response(
+                dict(data, emails=[{'id': 1, 'text': self.text}]))
+            self.assertEqual(status, 400 if 'detail' in data else 200, data)
+
+    def test_default_detail_setting(self):
+        with mock.patch.object(views, 'PREDICT_DEFAULT_DETAIL', 'minimal'):
+            response, status = views.build_prediction_response({'email_text': self.text})
+        self.assertEqual(set(response), {'status', 'prediction', 'confidence', 'email_length', 'cleaned_length'})
+        with override_settings(PREDICT_DEFAULT_DETAIL='standard'):
+            self.assertEqual(views.configured_default_detail(), 'standard')
+        with override_settings(PREDICT_DEFAULT_DETAIL='everything'):
+            self.assertEqual(views.configured_default_detail(), 'full')
+
+    def test_minimal_batch(self):
+        response, status = views.build_batch_response(
+            {'emails': [{'id': 1, 'text': self.text}], 'detail': 'minimal'})
+        self.assertEqual(status, 200)
+        self.assertEqual(set(response['results'][0]),
+                         {'id', 'status', 'prediction', 'confidence', 'email_length'})
+
+
+class PredictionCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        if views.active_bundle() is None:
+            self.skipTest('Model files not available')
+        patchers = [
+            mock.patch.object(views, 'verdict_cache', VerdictCache(100, 300)),
+            mock.patch.object(views, 'near_duplicate_index', NearDuplicateIndex(min_tokens=3)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.text = ("Dear customer your account has been selected to receive a free cash prize, "
+                     "reply today with your bank details to claim the reward before it expires")
+
+    def predict(self, text):
+        response = self.client.post('/api/predict/', {'email_text': text}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_repeated_email_is_answered_from_cache(self):
+        first = self.predict(self.text)
+        with mock.patch.object(views, 'score_email_verdict') as score, \
+                mock.patch.object(views, 'PredictionContext') as context:
+            second = self.predict(self.text)
+        score.assert_not_called()
+        context.assert_not_called()
+        self.assertEqual(second, first)
+
+        health = self.client.get('/api/health/').json()
+        self.assertEqual((health['verdict_cache']['hits'], health['verdict_cache']['size']), (1, 1))
+        self.assertEqual(health['near_duplicate_index']['size'], 1)
+
+    def test_new_model_version_is_not_answered_from_cache(self):
+        self.predict(self.text)
+        bundle = copy.copy(views.active_bundle())
+        bundle.version = 'retrained'
+        with mock.patch.object(views, 'active_bundle', return_value=bundle), \
+                mock.patch.object(views, 'score_email_verdict', wraps=views.score_email_verdict) as score:
+            self.predict(self.text)
+        score.assert_called_once()
+        self.assertEqual(views.verdict_cache.stats()['hits'], 0)
+        self.assertEqual(views.near_duplicate_index.stats()['hits'], 0)
+
+    def test_near_duplicate_reuses_verdict(self):
+        original = self.text + ' see you tomorrow'
+        variant = self.text + ' see you tonight'
+        first = self.predict(original)
+        with mock.patch.object(views, 'score_email_verdict') as score:
+            second = self.predict(variant)
+        score.assert_not_called()
+        self.assertEqual(second['near_duplicate_of'], make_cache_key(original, views.active_bundle().version))
+        self.assertGreaterEqual(second['near_duplicate_similarity'], views.near_duplicate_index.threshold)
+        self.assertEqual((second['prediction'], second['confidence']), (first['prediction'], first['confidence']))
+        self.assertNotIn('near_duplicate_of', first)
+
+        # Explanations describe the submitted email, not the matched one
+        self.assertIn('tomorrow', [item['word'] for item in first['word_importance']])
+        variant_words = set(clean_text(variant).split())
+        for item in second['word_importance']:
+            self.assertIn(item['word'], variant_words)
+        context = PredictionContext(variant, views.active_bundle())
+        self.assertEqual(second['word_importance'], json.loads(json.dumps(views.get_word_importance(context))))
+        self.assertEqual(second['model_comparison'],
+                         json.loads(json.dumps(views.get_all_model_predictions(context))))
+
+        health = self.client.get('/api/health/').json()
+        self.assertEqual(health['near_duplicate_index']['hits'], 1)
+        self.assertEqual(health['verdict_cache']['size'], 2)
+
+
+class BatchEndpointTests(SimpleTestCase):
+
+    def setUp(self):
+        if views.active_bundle() is None:
+            self.skipTest('Model files not available')
+        patchers = [
+            mock.patch.object(views, 'verdict_cache', VerdictCache(0, 300)),
+            mock.patch.object(views, 'near_duplicate_index', NearDuplicateIndex(max_entries=0)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post_batch(self, data):
+        return self.client.post('/api/predict-batch/', data, content_type='application/json')
+
+    def test_verdicts_match_single_prediction(self):
+        # For these texts the SVM's predict() disagrees with the argmax of predict_proba()
+        texts = ['draw ac boxnqp', 'hanging private allow ctzmks', 'order skilgme xwwmbd',
+                 'Win a free prize now', 'See you at lunch tomorrow']
+        single = [
+            self.client.post('/api/predict/', {'email_text': text, 'detail': 'minimal'},
+                             content_type='application/json').json()
+            for text in texts
+        ]
+        batch = self.post_batch({'emails': [{'id': i, 'text': text} for i, text in enumerate(texts)]}).json()
+        stream = self.client.post(
+            '/api/predict-stream/', ''.join(json.dumps({'id': i, 'text': text}) + '\n'
+                                            for i, text in enumerate(texts)),
+            content_type='application/x-ndjson')
+        streamed = [json.loads(line) for line in b''.join(stream.streaming_content).splitlines()][:-1]
+
+        for expected, result, streamed_result in zip(single, batch['results'], streamed):
+            self.assertEqual(result['prediction'], expected['prediction'])
+            self.assertEqual(result['confidence'], expected['confidence'])
+            self.assertEqual(streamed_result['prediction'], expected['prediction'])
+            self.assertEqual(streamed_result['confidence'], expected['confidence'])
+
+    def test_batch_is_vectorized_once(self):
+        texts = ['Win a free prize now', 'See you at lunch tomorrow', 'URGENT: claim your cash']
+        with mock.patch.object(views, 'score_cleaned_texts', wraps=views.score_cleaned_texts) as scorer:
+            response = self.post_batch({'emails': [{'id': i, 'text': text} for i, text in enumerate(texts)]})
+        self.assertEqual(response.status_code, 200)
+        scorer.assert_called_once()
+        self.assertEqual(scorer.call_args[0][0], [preprocess.clean_text(text) for text in texts])
+        self.assertEqual([result['id'] for result in response.json()['results']], [0, 1, 2])
+
+    def test_invalid_entries_get_error_results(self):
+        response = self.post_batch({'emails': [
+            'not an object', {'id': 2, 'text': ''}, {'id': 3, 'text': 5}, {'id': 4, 'text': 'Win a free prize'},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([result['status'] for result in data['results']], ['error', 'error', 'error', 'success'])
+        self.assertEqual([result['message'] for result in data['results'][:3]],
+                         ['Invalid email entry', 'Empty email text', 'Email text must be a string'])
+        self.assertEqual(data['results'][3]['id'], 4)
+        self.assertEqual((data['summary']['processed'], data['summary']['failed']), (1, 3))
+
+    @override_settings(BATCH_MAX_EMAILS=2)
+    def test_too_many_emails_are_rejected(self):
+        response = self.post_batch({'emails': [{'id': i, 'text': 'hello'} for i in range(3)]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'Maximum 2 emails allowed per batch')
+
+    @override_settings(BATCH_MAX_BYTES=64)
+    def test_body_over_byte_budget_is_rejected(self):
+        response = self.post_batch({'emails': [{'id': 1, 'text': 'x' * 100}]})
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()['message'], 'Batch request body exceeds 64 bytes')
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=1024, BATCH_MAX_BYTES=4096)
+    def test_batch_body_limit_is_independent_of_upload_limit(self):
+        body = json.dumps({'emails': [{'id': 1, 'text': 'Win a free prize'}]}) + ' ' * 2048
+        response = self.post_batch(body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['summary']['processed'], 1)
+        # Other endpoints keep Django's limit
+        response = self.client.post('/api/feedback/', body, content_type='application/json')
+        self.assertNotEqual(response.status_code, 200)
+
+
+class StreamEndpointTests(SimpleTestCase):
+
+    def setUp(self):
+        if views.active_bundle() is None:
+            self.skipTest('Model files not available')
+        self.body = '\n'.join([
+            json.dumps({'id': 1, 'text': 'Win a free prize now'}),
+            '{"id": 2, "text": ',
+            '',
+            json.dumps({'id': 3, 'text': ''}),
+            json.dumps({'id': 4, 'text': 'See you at lunch tomorrow'}),
+        ]) + '\n'
+
+    def assert_ndjson(self, content):
+        self.assertTrue(content.endswith(b'\n'))
+        lines = [json.loads(line) for line in content.decode().split('\n')[:-1]]
+        self.assertEqual([line.get('id') for line in lines[:-1]], [1, '', 3, 4])
+        self.assertEqual([line['status'] for line in lines[:-1]], ['success', 'error', 'error', 'success'])
+        self.assertEqual(lines[1]['message'], 'Invalid JSON on line 2')
+        self.assertEqual(lines[2]['message'], 'Empty email text')
+        self.assertEqual(lines[-1]['summary'], dict(lines[-1]['summary'], total=4, processed=2, failed=2))
+
+    @override_settings(STREAM_BATCH_SIZE=1)
+    def test_results_are_ndjson_in_input_order(self):
+        response = self.client.post('/api/predict-stream/', self.body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assert_ndjson(b''.join(response.streaming_content))
+
+    def test_unknown_detail_is_rejected(self):
+        response = self.client.post('/api/predict-stream/?detail=bogus', self.body,
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(STREAM_BATCH_SIZE=1)
+    async def test_async_view_streams_an_async_iterator(self):
+        request = AsyncRequestFactory().post('/api/predict-stream/', self.body,
+                                             content_type='application/x-ndjson')
+        response = await views.predict_stream_async(request)
+        self.assertTrue(response.is_async)
+        self.assert_ndjson(b''.join([chunk async for chunk in response.streaming_content]))
+
+        request = AsyncRequestFactory().post('/api/predict-stream/?detail=bogus', self.body,
+                                             content_type='application/x-ndjson')
+        self.assertEqual((await views.predict_stream_async(request)).status_code, 400)
+
+
+class BoundedExecutorTests(SimpleTestCase):
+
+    async def fill(self, executor, release):
+        """Occupy every worker and queue slot with a job waiting for `release`."""
+        jobs = [asyncio.ensure_future(executor.run(release.wait))
+                for _ in range(executor.max_workers + executor.max_queue)]
+        while executor.stats()['active'] < executor.max_workers:
+            await asyncio.sleep(0.001)
+        return jobs
+
+    async def test_rejects_work_beyond_queue_and_counts_it(self):
+        executor = BoundedExecutor(max_workers=1, max_queue=1)
+        self.addCleanup(executor.shutdown)
+        release = threading.Event()
+        jobs = await self.fill(executor, release)
+        with self.assertRaises(ExecutorSaturated):
+            await executor.run(sum, [1, 2])
+        stats = executor.stats()
+        self.assertEqual((stats['active'], stats['queue_depth'], stats['rejected']), (1, 1, 1))
+
+        release.set()
+        await asyncio.gather(*jobs)
+        self.assertEqual(await executor.run(sum, [1, 2]), 3)
+        stats = executor.stats()
+        self.assertEqual((stats['active'], stats['queue_depth'], stats['completed']), (0, 0, 3))
+
+    async def test_saturated_views_answer_503_and_health_stays_up(self):
+        executor = BoundedExecutor(max_workers=1, max_queue=0)
+        self.addCleanup(executor.shutdown)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        with mock.patch.object(views, 'prediction_executor', executor):
+            await self.fill(executor, release)
+            factory = AsyncRequestFactory()
+            for view, body in ((views.predict_email_async, {'email_text': 'Win a free prize'}),
+                               (views.predict_batch_async, {'emails': [{'id': 1, 'text': 'Win a free prize'}]})):
+                response = await view(factory.post('/', body, content_type='application/json'))
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response['Retry-After'], '1')
+
+            health = await views.health_check_async(factory.get('/'))
+            self.assertEqual(health.status_code, 200)
+            self.assertEqual(json.loads(health.content)['executor']['rejected'], 2)
+
+    async def test_async_views_match_sync_responses(self):
+        if views.active_bundle() is None:
+            self.skipTest('Model files not available')
+        factory = AsyncRequestFactory()
+        data = {'email_text': 'URGENT!!! You WON a free cash prize', 'detail': 'minimal'}
+        response = await views.predict_email_async(factory.post('/', data, content_type='application/json'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['prediction'],
+                         views.build_prediction_response(data)[0]['prediction'])
+
+        data = {'emails': [{'id': 1, 'text': 'Win a free prize'}, {'id': 2, 'text': ''}]}
+        response = await views.predict_batch_async(factory.post('/', data, content_type='application/json'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), views.build_batch_response(data)[0])
+
+
+class BundleManagerTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.model_path = os.path.join(directory.name, 'model.pkl')
+        self.vectorizer_path = os.path.join(directory.name, 'vectorizer.pkl')
+        self.version = 'v1'
+        self.save_models(["free cash prize", "lunch tomorrow"])
+        self.manager = BundleManager(
+            lambda: load_model_bundle(self.model_path, self.vectorizer_path, version=self.version),
+            lambda: self.version)
+
+    def save_models(self, texts):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        vectorizer = TfidfVectorizer().fit(texts)
+        model = LogisticRegression().fit(vectorizer.transform(texts), ['spam', 'ham'])
+        save_artifact(vectorizer, self.vectorizer_path)
+        save_artifact(model, self.model_path)
+
+    def test_swaps_in_new_version(self):
+        self.assertTrue(self.manager.reload())
+        first = self.manager.bundle
+        self.assertFalse(self.manager.reload())
+        self.assertIs(self.manager.bundle, first)
+
+        self.save_models(["free cash prize winner", "lunch meeting tomorrow"])
+        self.version = 'v2'
+        self.assertTrue(self.manager.reload())
+        self.assertEqual(self.manager.bundle.version, 'v2')
+        self.assertEqual(len(self.manager.bundle.vectorizer.vocabulary_), 7)
+        # Requests holding the old bundle still see a consistent pair
+        self.assertEqual(len(first.vectorizer.vocabulary_), 5)
+        self.assertEqual(self.manager.stats()['reloads'], 1)
+
+    def test_failed_reload_keeps_active_bundle(self):
+        self.manager.reload()
+        first = self.manager.bundle
+        # A vectorizer that does not match the model is rejected
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        save_artifact(TfidfVectorizer().fit(["one two three four five six seven"]), self.vectorizer_path)
+        self.version = 'v2'
+        with self.assertRaises(ValueError):
+            self.manager.reload()
+        self.assertIs(self.manager.bundle, first)
+        self.assertIn('ValueError', self.manager.stats()['last_error'])
+
+    def test_reload_endpoint_requires_token(self):
+        response = self.client.post('/api/admin/reload/')
+        self.assertEqual(response.status_code, 403)
+        with self.settings(ADMIN_API_TOKEN='secret'):
+            response = self.client.post('/api/admin/reload/', headers={'X-Admin-Token': 'wrong'})
+            self.assertEqual(response.status_code, 403)
+            with mock.patch.object(views.model_bundles, 'reload', return_value=False):
+                response = self.client.post('/api/admin/reload/', {}, content_type='application/json',
+                                            headers={'X-Admin-Token': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['reloaded'])
+
+
+class ModelRegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.registry_dir = directory.name
+
+    def publish(self, texts, labels):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.naive_bayes import MultinomialNB
+        vectorizer = TfidfVectorizer().fit(texts)
+        text_matrix = vectorizer.transform(texts)
+        models = {
+            'Logistic Regression': LogisticRegression().fit(text_matrix, labels),
+            'Naive Bayes': MultinomialNB().fit(text_matrix, labels),
+        }
+        return publish_version(self.registry_dir, vectorizer, models, 'Logistic Regression',
+                               metrics={'Logistic Regression': {'accuracy': 1.0}},
+                               warmup_texts=texts)
+
+    def test_publish_and_load(self):
+        version = self.publish(["free cash prize", "lunch tomorrow"], ['spam', 'ham'])
+        self.assertEqual(current_version(self.registry_dir), version)
+
+        bundle = load_registry_bundle(self.registry_dir, version, use_compiled=True)
+        self.assertEqual(bundle.version, version)
+        self.assertIsNotNone(bundle.compiled_scorer)
+        self.assertEqual(bundle.metrics['Logistic Regression']['accuracy'], 1.0)
+        self.assertEqual([item['prediction'] for item in bundle.warmup_corpus], ['spam', 'ham'])
+        bundle.warmup()
+        self.assertEqual(sorted(bundle.load_comparison_models()), ['Logistic Regression', 'Naive Bayes'])
+
+    def test_publish_leaves_the_vectorizer_unchanged(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.naive_bayes import MultinomialNB
+        texts = ["free cash prize", "free lunch tomorrow", "free prize now"]
+        vectorizer = TfidfVectorizer(max_df=0.9).fit(texts)
+        # Set by older scikit-learn releases
+        vectorizer.stop_words_ = {'free'}
+        model = MultinomialNB().fit(vectorizer.transform(texts), ['spam', 'ham', 'spam'])
+        version = publish_version(self.registry_dir, vectorizer, {'Naive Bayes': model}, 'Naive Bayes')
+        self.assertEqual(vectorizer.stop_words_, {'free'})
+        version_dir, manifest = read_manifest(self.registry_dir, version)
+        self.assertIsNone(load_artifact(os.path.join(version_dir, manifest['vectorizer'])).stop_words_)
+
+    def test_versions_are_immutable_and_activatable(self):
+        first = self.publish(["free cash prize", "lunch tomorrow"], ['spam', 'ham'])
+        second = self.publish(["claim your prize", "meeting at noon"], ['spam', 'ham'])
+        self.assertNotEqual(first, second)
+        self.assertEqual(list_versions(self.registry_dir), sorted([first, second]))
+        self.assertEqual(current_version(self.registry_dir), second)
+
+        # Rolling back is pointing CURRENT at the older version
+        activate_version(self.registry_dir, first)
+        self.assertEqual(current_version(self.registry_dir), first)
+        with self.assertRaises(ValueError):
+            activate_version(self.registry_dir, 'missing')
+
+    def test_rejects_modified_files(self):
+        version = self.publish(["free cash prize", "lunch tomorrow"], ['spam', 'ham'])
+        with open(os.path.join(self.registry_dir, version, 'model_nb.pkl'), 'ab') as f:
+            f.write(b'\0')
+        with self.assertRaises(IntegrityError):
+            load_registry_bundle(self.registry_dir, version)
+
+    def test_numeric_labels_pass_warmup(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        texts = ["free cash prize", "lunch tomorrow"]
+        vectorizer = TfidfVectorizer().fit(texts)
+        model = LogisticRegression().fit(vectorizer.transform(texts), np.array([1, 0]))
+        version = publish_version(self.registry_dir, vectorizer, {'Logistic Regression': model},
+                                  'Logistic Regression', warmup_texts=texts)
+        bundle = load_registry_bundle(self.registry_dir, version)
+        self.assertEqual([item['prediction'] for item in bundle.warmup_corpus], ['1', '0'])
+        bundle.warmup()
+        activate_version(self.registry_dir, version)
+
+    def test_warmup_detects_changed_predictions(self):
+        version = self.publish(["free cash prize", "lunch tomorrow"], ['spam', 'ham'])
+        bundle = load_registry_bundle(self.registry_dir, version)
+        bundle.warmup_corpus[0]['prediction'] = 'ham'
+        with self.assertRaises(ValueError):
+            bundle.warmup()
+
+
+@override_settings(ADMIN_API_TOKEN='secret')
+class OnlineLearningTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.registry_dir = os.path.join(directory.name, 'registry')
+        self.learner = OnlineLearner(self.registry_dir, os.path.join(directory.name, 'feedback.jsonl'),
+                                     keep_checkpoints=1)
+
+    def publish_base(self, default_model='Logistic Regression'):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.naive_bayes import MultinomialNB
+        texts = ["free cash prize", "claim your prize now", "lunch tomorrow", "parcel arrives at noon"]
+        labels = ['spam', 'spam', 'ham', 'ham']
+        vectorizer = TfidfVectorizer().fit(texts)
+        text_matrix = vectorizer.transform(texts)
+        models = {
+            'Logistic Regression': LogisticRegression().fit(text_matrix, labels),
+            'Naive Bayes': MultinomialNB().fit(text_matrix, labels),
+        }
+        return publish_version(self.registry_dir, vectorizer, models, default_model,
+                               metrics={name: {'accuracy': 1.0} for name in models}, warmup_texts=texts)
+
+    def online_prediction(self, version, text):
+        version_dir, manifest = read_manifest(self.registry_dir, version)
+        vectorizer = load_artifact(os.path.join(version_dir, manifest['vectorizer']))
+        model = load_artifact(os.path.join(version_dir, manifest['models']['Naive Bayes']))
+        return model.predict(vectorizer.transform([text]))[0]
+
+    def test_checkpoints_learn_new_feedback_only(self):
+        base = self.publish_base()
+        self.assertIsNone(self.learner.checkpoint())
+
+        for _ in range(3):
+            self.learner.record('claim your parcel now', 'spam')
+        first = self.learner.checkpoint()
+        self.assertEqual(current_version(self.registry_dir), first)
+        self.assertEqual(self.online_prediction(first, 'parcel'), 'spam')
+        # The updated model serves; metrics of the trained models are kept
+        manifest = read_manifest(self.registry_dir, first)[1]
+        self.assertEqual(manifest['default_model'], 'Naive Bayes')
+        self.assertEqual(manifest['metrics'], {'Logistic Regression': {'accuracy': 1.0}})
+        load_registry_bundle(self.registry_dir, first).warmup()
+        training = read_manifest(self.registry_dir, first)[1]['training']
+        self.assertEqual(training['feedback_offset'], os.path.getsize(self.learner.log_path))
+        self.assertEqual(training['feedback_examples'], 3)
+
+        # Nothing new to learn
+        self.assertIsNone(self.learner.checkpoint())
+
+        self.learner.record('lunch at noon', 'ham')
+        second = self.learner.checkpoint()
+        self.assertEqual(read_manifest(self.registry_dir, second)[1]['training']['feedback_examples'], 4)
+        # Only one checkpoint is kept; the trained version stays
+        self.assertEqual(list_versions(self.registry_dir), sorted([base, second]))
+
+    def test_serving_the_online_model_can_be_turned_off(self):
+        self.publish_base()
+        self.learner.serve_online_model = False
+        self.learner.record('claim your parcel now', 'spam')
+        version = self.learner.checkpoint()
+        load_registry_bundle(self.registry_dir, version).warmup()
+        self.assertEqual(read_manifest(self.registry_dir, version)[1]['default_model'], 'Logistic Regression')
+
+    def test_model_failing_warmup_does_not_serve(self):
+        self.publish_base()
+        for _ in range(10):
+            self.learner.record('free cash prize', 'ham')
+        version = self.learner.checkpoint()
+        self.assertEqual(self.online_prediction(version, 'free cash prize'), 'ham')
+        self.assertEqual(read_manifest(self.registry_dir, version)[1]['default_model'], 'Logistic Regression')
+
+        # A served model that fails warmup is not checkpointed at all
+        base = self.publish_base(default_model='Naive Bayes')
+        self.learner.record('free cash prize', 'ham')
+        with self.assertRaises(ValueError):
+            self.learner.checkpoint()
+        self.assertEqual(current_version(self.registry_dir), base)
+
+    def test_learner_does_not_start_without_active_version(self):
+        with mock.patch.object(views, 'online_learner', self.learner):
+            self.assertFalse(views.start_online_learning(60))
+            self.assertFalse(self.learner.running)
+            self.publish_base()
+            self.assertTrue(views.start_online_learning(60))
+            self.assertTrue(self.learner.running)
+            self.learner.stop()
+
+    def test_feedback_endpoint(self):
+        with mock.patch.object(views, 'online_learner', self.learner):
+            self.assertEqual(self.client.post('/api/feedback/', {'email_text': 'hi', 'label': 'spam'},
+                                              content_type='application/json').status_code, 403)
+            response = self.client.post('/api/feedback/', {'email_text': 'hi', 'label': 'junk'},
+                                        content_type='application/json', HTTP_X_ADMIN_TOKEN='secret')
+            self.assertEqual(response.status_code, 400)
+            response = self.client.post('/api/feedback/', {'email_text': 'Win now', 'label': 'spam'},
+                                        content_type='application/json', HTTP_X_ADMIN_TOKEN='secret')
+            self.assertEqual(response.status_code, 202)
+            self.assertFalse(response.json()['online_learning'])
+        with open(self.learner.log_path, encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual([(entry['text'], entry['label']) for entry in entries], [('Win now', 'spam')])
+
+
+class MetricsTests(SimpleTestCase):
+
+    def test_histogram_renders_cumulative_buckets(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1), labelnames=('stage',))
+        child = histogram.labels('cleaning')
+        for value in [0.05, 0.5, 0.5, 5] + [0.05] * FOLD_THRESHOLD:
+            child.observe(value)
+        registry.counter('requests_total', 'Requests', labelnames=('status',)).labels(200).inc()
+        text = registry.render()
+        self.assertIn('# TYPE latency_seconds histogram', text)
+        self.assertIn(f'latency_seconds_bucket{{stage="cleaning",le="0.1"}} {FOLD_THRESHOLD + 1}', text)
+        self.assertIn(f'latency_seconds_bucket{{stage="cleaning",le="1.0"}} {FOLD_THRESHOLD + 3}', text)
+        self.assertIn(f'latency_seconds_bucket{{stage="cleaning",le="+Inf"}} {FOLD_THRESHOLD + 4}', text)
+        self.assertIn(f'latency_seconds_count{{stage="cleaning"}} {FOLD_THRESHOLD + 4}', text)
+        self.assertIn('requests_total{status="200"} 1', text)
+
+    def test_counter_folds_buffered_increments(self):
+        counter = MetricsRegistry().counter('events_total', 'Events').labels()
+        for _ in range(FOLD_THRESHOLD + 2):
+            counter.inc()
+        counter.inc(3)
+        self.assertEqual(counter.value, FOLD_THRESHOLD + 5)
+
+    def test_metrics_endpoint_reports_predict_stages(self):
+        response = self.client.post('/api/predict/', {'email_text': 'Win a free prize now'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('spam_predict_stage_seconds_bucket{stage="cleaning",le="+Inf"}', text)
+        self.assertRegex(text, r'spam_requests_total\{endpoint="predict",status="200"\} [1-9]')
+        self.assertIn('spam_model_info{version=', text)
+
+
+@override_settings(ADMIN_API_TOKEN='secret')
+class ProfilingTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = ProfileStore(directory.name, max_profiles=2)
+        patches = [
+            mock.patch.object(views, 'PROFILING_ENABLED', True),
+            mock.patch.object(views, 'profile_store', self.store),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def profiled_view(self):
+        return views.profile_request('predict')(lambda request: JsonResponse({'status': 'success'}))
+
+    def test_header_with_admin_token_stores_profile(self):
+        view = self.profiled_view()
+        factory = RequestFactory()
+        body = b'{"email_text": "slow email"}'
+
+        response = view(factory.post('/', body, content_type='application/json', HTTP_X_PROFILE='1'))
+        self.assertNotIn('X-Profile-Id', response)
+
+        response = view(factory.post('/', body, content_type='application/json',
+                                     HTTP_X_PROFILE='1', HTTP_X_ADMIN_TOKEN='secret'))
+        profile_id = response['X-Profile-Id']
+        metadata = self.store.metadata(profile_id)
+        self.assertEqual(metadata['input_sha256'], hash_input(body))
+        self.assertEqual(metadata['trigger'], 'header')
+        self.assertEqual(metadata['status'], 200)
+
+        listed = self.client.get('/api/admin/profiles/', HTTP_X_ADMIN_TOKEN='secret').json()
+        self.assertEqual([profile['id'] for profile in listed['profiles']], [profile_id])
+        download = self.client.get(f'/api/admin/profiles/{profile_id}/', HTTP_X_ADMIN_TOKEN='secret')
+        self.assertEqual(download.status_code, 200)
+        self.assertTrue(b''.join(download.streaming_content))
+        self.assertEqual(self.client.get(f'/api/admin/profiles/{profile_id}/').status_code, 403)
+        self.assertEqual(self.client.get('/api/admin/profiles/..%2Fmanage/',
+                                         HTTP_X_ADMIN_TOKEN='secret').status_code, 404)
+
+    def test_false_header_does_not_profile(self):
+        view = self.profiled_view()
+        factory = RequestFactory()
+        for value in ('0', 'false', 'no', ''):
+            response = view(factory.post('/', b'{}', content_type='application/json',
+                                         HTTP_X_PROFILE=value, HTTP_X_ADMIN_TOKEN='secret'))
+            self.assertNotIn('X-Profile-Id', response, value)
+        self.assertEqual(self.store.ids(), [])
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=16)
+    def test_body_over_upload_limit_is_not_hashed(self):
+        view = views.profile_request('batch')(
+            lambda request: JsonResponse({'status': 'error'}, status=413))
+        response = view(RequestFactory().post('/', b'{"emails": ["' + b'x' * 64 + b'"]}',
+                                              content_type='application/json',
+                                              HTTP_X_PROFILE='true', HTTP_X_ADMIN_TOKEN='secret'))
+        self.assertEqual(response.status_code, 413)
+        metadata = self.store.metadata(response['X-Profile-Id'])
+        self.assertIsNone(metadata['input_sha256'])
+        self.assertEqual(metadata['status'], 413)
+
+    def test_sampling_and_rotation(self):
+        view = self.profiled_view()
+        factory = RequestFactory()
+        with mock.patch.object(views, 'PROFILE_SAMPLE_RATE', 1.0):
+            profile_ids = [view(factory.post('/', f'{i}', content_type='application/json'))['X-Profile-Id']
+                           for i in range(3)]
+        self.assertEqual(len(self.store.ids()), 2)
+        self.assertIsNone(self.store.profile_path(min(profile_ids)))
+        self.assertEqual(self.store.metadata(max(profile_ids))['trigger'], 'sample')
+
+    def test_disabled_profiling_leaves_view_unwrapped(self):
+        def view(request):
+            pass
+        with mock.patch.object(views, 'PROFILING_ENABLED', False):
+            self.assertIs(views.profile_request('predict')(view), view)
+
+
+class TrainingCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_dir = os.path.join(directory.name, 'cache')
+        self.dataset_path = os.path.join(directory.name, 'spam.csv')
+        self.messages = ['Win a FREE prize now', 'Lunch at noon?', 'Claim your cash reward',
+                         'See you at the meeting', 'URGENT: verify your account', 'Thanks for the notes']
+        with open(self.dataset_path, 'w') as f:
+            f.write('\n'.join(self.messages))
+
+    def clean(self, texts):
+        self.cleaned_calls += 1
+        return [text.lower() for text in texts]
+
+    def test_corpus_is_cached_until_the_dataset_changes(self):
+        self.cleaned_calls = 0
+        key, cleaned = load_or_clean(self.cache_dir, self.dataset_path, self.messages, self.clean)
+        self.assertEqual(load_or_clean(self.cache_dir, self.dataset_path, self.messages, self.clean),
+                         (key, cleaned))
+        self.assertEqual(self.cleaned_calls, 1)
+
+        with open(self.dataset_path, 'a') as f:
+            f.write('\nOne more message')
+        new_key, _ = load_or_clean(self.cache_dir, self.dataset_path, self.messages + ['One more message'],
+                                   self.clean)
+        self.assertNotEqual(new_key, key)
+        self.assertEqual(self.cleaned_calls, 2)
+
+    def test_features_are_reused_for_the_same_settings(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        cleaned = [message.lower() for message in self.messages]
+        fitted = load_or_vectorize(self.cache_dir, 'corpus', cleaned, TfidfVectorizer(), 0.5, 42)
+        cached = load_or_vectorize(self.cache_dir, 'corpus', cleaned, TfidfVectorizer(), 0.5, 42)
+        self.assertEqual(cached.key, fitted.key)
+        self.assertEqual((cached.X_train != fitted.X_train).nnz, 0)
+        np.testing.assert_array_equal(cached.test_index, fitted.test_index)
+        self.assertEqual(cached.vectorizer.vocabulary_, fitted.vectorizer.vocabulary_)
+
+        refitted = load_or_vectorize(self.cache_dir, 'corpus', cleaned, TfidfVectorizer(max_features=3), 0.5, 42)
+        self.assertNotEqual(refitted.key, fitted.key)
+        self.assertEqual(len(refitted.vectorizer.vocabulary_), 3)
+
+
+class BenchmarkTests(SimpleTestCase):
+
+    def test_corpus_is_reproducible(self):
+        import benchmark
+        corpus = benchmark.generate_corpus(size=5, seed=7)
+        self.assertEqual(corpus, benchmark.generate_corpus(size=5, seed=7))
+        self.assertEqual(set(corpus), set(benchmark.CORPUS_KINDS))
+        self.assertTrue(all('<html>' in email for email in corpus['newsletter']))
+        self.assertTrue(all('://' in email for email in corpus['phishing']))
+
+    def test_compare_flags_regressions(self):
+        import benchmark
+        baseline = {'results': {'a': {'best_p50_us': 100.0}, 'b': {'best_p50_us': 100.0},
+                                'c': {'best_p50_us': 100.0}}}
+        current = {'results': {'a': {'best_p50_us': 130.0}, 'b': {'best_p50_us': 105.0},
+                               'c': {'best_p50_us': 50.0}, 'new': {'best_p50_us': 1.0}}}
+        statuses = {row[0]: row[4] for row in benchmark.compare_results(baseline, current, threshold=10)}
+        self.assertEqual(statuses, {'a': 'regression', 'b': 'ok', 'c': 'improvement'})
+
+
+class LoadTestTests(SimpleTestCase):
+
+    def test_percentiles(self):
+        import load_test
+        values = list(range(1, 1001))
+        self.assertEqual(load_test.percentile(values, 50), 500)
+        self.assertEqual(load_test.percentile(values, 99.9), 999)
+        self.assertEqual(load_test.percentile([7], 99), 7)
+        self.assertIsNone(load_test.percentile([], 50))
+
+    def test_replay_file_formats(self):
+        import load_test
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            f.write('{"email_text": "hello"}\n\n')
+            f.write('{"path": "/api/predict-stream/", "body": "{\\"text\\": \\"hi\\"}\\n", "ts": 1.5}\n')
+        self.addCleanup(os.remove, f.name)
+        first, second = load_test.load_replay(f.name, 'predict')
+        self.assertEqual(load_test.encode_request(first),
+                         ('/api/predict/', b'{"email_text": "hello"}', 'application/json'))
+        self.assertEqual(load_test.encode_request(second),
+                         ('/api/predict-stream/', b'{"text": "hi"}\n', 'application/x-ndjson'))
+        self.assertEqual(second['ts'], 1.5)
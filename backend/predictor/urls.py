@@ -1,11 +1,29 @@
 """
 URL configuration for predictor app.
 """
+from django.conf import settings
 from django.urls import path
-from .views import predict_email, health_check, predict_batch
+from .views import (
+    predict_email, health_check, predict_batch, predict_stream,
+    predict_email_async, health_check_async, predict_batch_async, predict_stream_async,
+    reload_models, metrics_view, list_profiles, download_profile, submit_feedback
+)
+
+# Under an ASGI server (uvicorn/daphne), serve the async views so that
+# inference runs on the bounded executor instead of blocking the loop.
+if getattr(settings, 'USE_ASYNC_VIEWS', False):
+    predict_email, health_check, predict_batch, predict_stream = (
+        predict_email_async, health_check_async, predict_batch_async, predict_stream_async
+    )
 
 urlpatterns = [
     path('predict/', predict_email, name='predict'),
     path('predict-batch/', predict_batch, name='predict_batch'),
+    path('predict-stream/', predict_stream, name='predict_stream'),
     path('health/', health_check, name='health_check'),
+    path('admin/reload/', reload_models, name='reload_models'),
+    path('feedback/', submit_feedback, name='submit_feedback'),
+    path('metrics/', metrics_view, name='metrics'),
+    path('admin/profiles/', list_profiles, name='list_profiles'),
+    path('admin/profiles/<str:profile_id>/', download_profile, name='download_profile'),
 ]
@@ -1,14 +1,36 @@
 """
 Views for spam prediction API.
 """
+import asyncio
+import hmac
 import json
 import os
+import random
 import re
-import joblib
-from django.http import JsonResponse
+from functools import wraps
+from inspect import iscoroutinefunction
+from itertools import islice
+from time import perf_counter
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.http import FileResponse, HttpResponse, HttpResponseNotFound, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from .ml.preprocess import clean_text
+from .cache import VerdictCache, make_cache_key
+from .executor import BoundedExecutor, ExecutorSaturated
+from .feedback import LABELS as FEEDBACK_LABELS, OnlineLearner
+from .metrics import MetricsRegistry, NullChild, BATCH_SIZE_BUCKETS, EMAIL_LENGTH_BUCKETS
+from .keywords import KeywordMatcher, SPAM_KEYWORDS, MONEY_KEYWORDS, URGENCY_KEYWORDS
+from .near_duplicate import NearDuplicateIndex
+from .bundle import BundleManager, compute_model_version, load_model_bundle, load_registry_bundle
+from .ml.registry import current_version as current_registry_version
+from .pipeline import PredictionContext
+from .profiling import ProfileStore, run_profiled
+from .ml.preprocess import (
+    batch_clean_texts, configure_lemma_cache,
+    warm_lemma_cache, lemma_cache_info
+)
 
 # Load model and vectorizer once at startup (best practice)
 MODEL_PATH = os.path.join(os.path.dirname(__file__), 'ml', 'model.pkl')
@@ -23,30 +45,72 @@ MODEL_PATHS = {
     'SVM': os.path.join(ML_DIR, 'model_svm.pkl')
 }
 
-# Global variables to store loaded models
-model = None
-vectorizer = None
-all_models = {}
+# NumPy-only scorer for the default model (USE_COMPILED_SCORER)
+COMPILED_MODEL_DIR = getattr(settings, 'COMPILED_MODEL_DIR', None) or os.path.join(ML_DIR, 'compiled')
+# Memory-map model arrays so worker processes share one copy
+MODEL_MMAP = getattr(settings, 'MODEL_MMAP', True)
+# Versioned model bundles written by train_all_models.py
+MODEL_REGISTRY_DIR = getattr(settings, 'MODEL_REGISTRY_DIR', None) or os.path.join(ML_DIR, 'registry')
 
-def load_models():
-    """Load ML model and vectorizer if they exist."""
-    global model, vectorizer, all_models
+
+def registry_version():
+    """Registry version to serve: MODEL_VERSION, else CURRENT, else None."""
+    return getattr(settings, 'MODEL_VERSION', None) or current_registry_version(MODEL_REGISTRY_DIR)
+
+
+def model_artifact_paths():
+    """Files whose changes produce a new model version."""
+    paths = [MODEL_PATH, VECTORIZER_PATH] + list(MODEL_PATHS.values())
+    if getattr(settings, 'USE_COMPILED_SCORER', False):
+        paths.append(os.path.join(COMPILED_MODEL_DIR, 'meta.json'))
+    return paths
+
+
+def current_model_version():
+    """
+    Version of the models on disk; part of every verdict cache key.
+    Registry versions are immutable, so their name is the version.
+    """
+    return registry_version() or compute_model_version(model_artifact_paths())
+
+
+def load_bundle():
+    """Load a new model bundle from the registry, or from the files in predictor/ml/."""
+    use_compiled = getattr(settings, 'USE_COMPILED_SCORER', False)
+    version = registry_version()
+    if version is not None:
+        bundle = load_registry_bundle(MODEL_REGISTRY_DIR, version,
+                                      use_compiled=use_compiled, mmap=MODEL_MMAP)
+    else:
+        bundle = load_model_bundle(MODEL_PATH, VECTORIZER_PATH, MODEL_PATHS,
+                                   version=compute_model_version(model_artifact_paths()),
+                                   compiled_dir=COMPILED_MODEL_DIR if use_compiled else None,
+                                   mmap=MODEL_MMAP)
+    
+    # Pre-seed the lemma cache with the trained vocabulary
+    if getattr(settings, 'LEMMA_CACHE_WARMUP', True):
+        warmed = warm_lemma_cache(bundle.vectorizer.vocabulary_)
+        if warmed:
+            print(f"✅ Lemma cache warmed with {warmed} words")
     
-    if os.path.exists(MODEL_PATH) and os.path.exists(VECTORIZER_PATH):
+    return bundle
+
+
+# The active model bundle; requests read it once and use only that object
+model_bundles = BundleManager(load_bundle, current_model_version)
+
+
+def active_bundle():
+    """Return the active ModelBundle, or None if no model is loaded."""
+    return model_bundles.bundle
+
+
+def load_models():
+    """Load (or reload) ML model and vectorizer if they exist."""
+    if registry_version() is not None or (os.path.exists(MODEL_PATH) and os.path.exists(VECTORIZER_PATH)):
         try:
-            model = joblib.load(MODEL_PATH)
-            vectorizer = joblib.load(VECTORIZER_PATH)
-            print("✅ Models loaded successfully!")
-            
-            # Try to load all 4 models for comparison
-            for model_name, model_path in MODEL_PATHS.items():
-                if os.path.exists(model_path):
-                    try:
-                        all_models[model_name] = joblib.load(model_path)
-                        print(f"✅ {model_name} loaded!")
-                    except Exception as e:
-                        print(f"⚠️ Could not load {model_name}: {e}")
-            
+            model_bundles.reload()
+            print(f"✅ Models loaded successfully! (version {active_bundle().version})")
             return True
         except Exception as e:
             print(f"❌ Error loading models: {e}")
@@ -55,13 +119,262 @@ def load_models():
         print("⚠️ Model files not found. Please train the model first.")
         return False
 
+# Size the lemma cache before any text is cleaned
+configure_lemma_cache(getattr(settings, 'LEMMA_CACHE_SIZE', 50000))
+
 # Load models at startup
 load_models()
 
+# Reload automatically when retrained model files appear
+if getattr(settings, 'MODEL_RELOAD_INTERVAL', 0) > 0:
+    model_bundles.start_watcher(settings.MODEL_RELOAD_INTERVAL)
+
+# Labels posted to /api/feedback/ are learned into registry checkpoints
+ONLINE_LEARNING_INTERVAL = getattr(settings, 'ONLINE_LEARNING_INTERVAL', 0)
+online_learner = OnlineLearner(
+    MODEL_REGISTRY_DIR,
+    getattr(settings, 'FEEDBACK_LOG', None) or os.path.join(ML_DIR, 'feedback.jsonl'),
+    model_name=getattr(settings, 'ONLINE_LEARNING_MODEL', 'Naive Bayes'),
+    sample_weight=getattr(settings, 'FEEDBACK_SAMPLE_WEIGHT', 1.0),
+    keep_checkpoints=getattr(settings, 'FEEDBACK_KEEP_CHECKPOINTS', 10),
+    serve_online_model=getattr(settings, 'ONLINE_LEARNING_SERVE', True),
+    # Serve a checkpoint as soon as it is published; other workers
+    # follow through their watcher
+    on_checkpoint=lambda version: model_bundles.reload()
+)
+
 
-def analyze_spam_indicators(text):
+def start_online_learning(interval):
+    """
+    Start learning checkpoints every `interval` seconds, unless they could
+    not be served. Returns whether the learner runs.
+    """
+    if interval <= 0:
+        return False
+    if getattr(settings, 'MODEL_VERSION', None):
+        print("⚠️ MODEL_VERSION pins the served version; online learning is disabled")
+        return False
+    if current_registry_version(online_learner.registry_dir) is None:
+        # Checkpoints continue the active registry version
+        print("⚠️ No active model registry version; online learning is disabled. "
+              "Publish one with: python -m predictor.ml.registry publish")
+        return False
+    online_learner.start(interval)
+    return True
+
+
+start_online_learning(ONLINE_LEARNING_INTERVAL)
+
+# Keyword lists for spam indicator analysis, compiled once
+keyword_matcher = KeywordMatcher({
+    'suspicious_keywords': getattr(settings, 'SPAM_KEYWORDS', SPAM_KEYWORDS),
+    'money_terms': getattr(settings, 'MONEY_KEYWORDS', MONEY_KEYWORDS),
+    'urgency_words': getattr(settings, 'URGENCY_KEYWORDS', URGENCY_KEYWORDS)
+})
+
+# Cache of full /api/predict/ responses for repeated email bodies
+verdict_cache = VerdictCache(
+    max_entries=getattr(settings, 'VERDICT_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'VERDICT_CACHE_TTL', 300)
+)
+
+# Index of recently scored emails for reusing near-duplicate verdicts
+near_duplicate_index = NearDuplicateIndex(
+    threshold=getattr(settings, 'NEAR_DUPLICATE_THRESHOLD', 0.85),
+    max_entries=getattr(settings, 'NEAR_DUPLICATE_MAX_ENTRIES', 100000),
+    ttl=getattr(settings, 'NEAR_DUPLICATE_TTL', 3600),
+    min_tokens=getattr(settings, 'NEAR_DUPLICATE_MIN_TOKENS', 10)
+)
+
+# Bounded pool used by the async views for preprocessing and inference
+prediction_executor = BoundedExecutor(
+    max_workers=getattr(settings, 'PREDICTION_EXECUTOR_WORKERS', os.cpu_count() or 1),
+    max_queue=getattr(settings, 'PREDICTION_EXECUTOR_MAX_QUEUE', 64)
+)
+# How long an admitted stream waits before retrying a full executor
+STREAM_RETRY_SECONDS = 0.05
+
+
+# In-process metrics, served in the Prometheus text format on /api/metrics/
+METRICS_ENABLED = getattr(settings, 'METRICS_ENABLED', True)
+metrics = MetricsRegistry()
+request_seconds = metrics.histogram(
+    'spam_request_duration_seconds', 'Time to build a response, per endpoint', labelnames=('endpoint',))
+requests_total = metrics.counter(
+    'spam_requests_total', 'Responses sent, per endpoint and HTTP status', labelnames=('endpoint', 'status'))
+predict_stage_seconds = metrics.histogram(
+    'spam_predict_stage_seconds', 'Time spent in each /api/predict/ stage', labelnames=('stage',))
+batch_stage_seconds = metrics.histogram(
+    'spam_batch_stage_seconds', 'Time spent in each batch scoring stage, per batch', labelnames=('stage',))
+batch_size_emails = metrics.histogram(
+    'spam_batch_size_emails', 'Emails per scored batch', BATCH_SIZE_BUCKETS, labelnames=('endpoint',))
+email_length_chars = metrics.histogram(
+    'spam_email_length_chars', 'Length of scored emails', EMAIL_LENGTH_BUCKETS, labelnames=('endpoint',))
+
+# Look up the children once; the hot path then only observes. Stages are
+# timed with explicit perf_counter() calls: a context manager per stage
+# would cost three times as much.
+NULL_CHILD = NullChild()
+PREDICT_STAGES = {stage: predict_stage_seconds.labels(stage) if METRICS_ENABLED else NULL_CHILD for stage in (
+    'cleaning', 'vectorizing', 'prediction', 'indicators', 'risk',
+    'recommendations', 'word_importance', 'patterns', 'model_comparison'
+)}
+BATCH_STAGES = {stage: batch_stage_seconds.labels(stage) if METRICS_ENABLED else NULL_CHILD for stage in (
+    'cleaning', 'vectorizing', 'prediction', 'analysis'
+)}
+PREDICT_EMAIL_LENGTH = email_length_chars.labels('predict') if METRICS_ENABLED else NULL_CHILD
+
+
+def observe_batch(endpoint, texts, size):
+    """Record the size of a batch and the lengths of its emails."""
+    if METRICS_ENABLED:
+        batch_size_emails.labels(endpoint).observe(size)
+        lengths = email_length_chars.labels(endpoint)
+        for text in texts:
+            lengths.observe(len(text))
+
+
+def track_request(endpoint):
+    """Decorator recording the duration and status of a (sync or async) view."""
+    def decorator(view):
+        if not METRICS_ENABLED:
+            return view
+        duration = request_seconds.labels(endpoint)
+        # status code -> counter child
+        responses = {}
+        
+        def count(status):
+            counter = responses[status] = requests_total.labels(endpoint, status)
+            return counter
+        
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                start = perf_counter()
+                response = await view(request, *args, **kwargs)
+                duration.observe(perf_counter() - start)
+                (responses.get(response.status_code) or count(response.status_code)).inc()
+                return response
+            return async_wrapper
+        
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            start = perf_counter()
+            response = view(request, *args, **kwargs)
+            duration.observe(perf_counter() - start)
+            (responses.get(response.status_code) or count(response.status_code)).inc()
+            return response
+        return wrapper
+    return decorator
+
+
+def register_stats_metrics():
+    """Expose the stats of the caches, executor and model bundle as metrics."""
+    def stat(source, key):
+        return lambda: source()[key]
+    
+    for name, source, documentation in (
+        ('verdict_cache', verdict_cache.stats, 'verdict cache'),
+        ('near_duplicate', near_duplicate_index.stats, 'near-duplicate index'),
+        ('lemma_cache', lemma_cache_info, 'lemma cache'),
+    ):
+        metrics.callback(f'spam_{name}_hits_total', f'Hits of the {documentation}', 'counter', stat(source, 'hits'))
+        metrics.callback(f'spam_{name}_misses_total', f'Misses of the {documentation}', 'counter', stat(source, 'misses'))
+        metrics.callback(f'spam_{name}_entries', f'Entries in the {documentation}', 'gauge', stat(source, 'size'))
+    
+    metrics.callback('spam_executor_active', 'Predictions running on the executor', 'gauge',
+                     stat(prediction_executor.stats, 'active'))
+    metrics.callback('spam_executor_queue_depth', 'Predictions waiting for the executor', 'gauge',
+                     stat(prediction_executor.stats, 'queue_depth'))
+    metrics.callback('spam_executor_rejected_total', 'Predictions rejected by a full executor', 'counter',
+                     stat(prediction_executor.stats, 'rejected'))
+    metrics.callback('spam_model_reloads_total', 'Model bundles swapped in after startup', 'counter',
+                     stat(model_bundles.stats, 'reloads'))
+    metrics.callback('spam_model_info', 'Active model version', 'gauge',
+                     lambda: {(model_bundles.stats()['version'] or '',): 1}, labelnames=('version',))
+
+
+if METRICS_ENABLED:
+    register_stats_metrics()
+
+
+# Opt-in request profiling; profiles are listed on /api/admin/profiles/
+PROFILING_ENABLED = getattr(settings, 'PROFILING_ENABLED', False)
+PROFILE_SAMPLE_RATE = getattr(settings, 'PROFILE_SAMPLE_RATE', 0.0)
+PROFILE_HEADER_VALUES = ('1', 'true', 'yes', 'on')
+profile_store = ProfileStore(
+    getattr(settings, 'PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles')),
+    max_profiles=getattr(settings, 'PROFILE_MAX_FILES', 50)
+)
+
+
+def profile_request(endpoint):
+    """
+    Decorator running a sync view under cProfile when the request has a
+    true X-Profile header ("1", "true", "yes", "on") and a valid admin
+    token, or is picked by PROFILE_SAMPLE_RATE. The profile id is returned
+    in the X-Profile-Id response header. Without PROFILING_ENABLED the
+    view is not wrapped.
+    """
+    def decorator(view):
+        if not PROFILING_ENABLED:
+            return view
+        
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            header = request.headers.get('X-Profile', '').strip().lower()
+            if header in PROFILE_HEADER_VALUES and admin_authorized(request):
+                trigger = 'header'
+            elif PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+                trigger = 'sample'
+            else:
+                return view(request, *args, **kwargs)
+            
+            # Read the body before the view does; one over Django's upload
+            # limit is left unread for the view to reject, and not hashed
+            try:
+                body = request.body
+            except RequestDataTooBig:
+                body = None
+            
+            bundle = active_bundle()
+            response, profiler, seconds = run_profiled(view, request, *args, **kwargs)
+            try:
+                profile_id = profile_store.save(profiler, endpoint, body, {
+                    'trigger': trigger,
+                    'status': response.status_code,
+                    'duration_ms': round(seconds * 1000, 3),
+                    'model_version': bundle.version if bundle is not None else None,
+                })
+            except OSError as e:
+                print(f"⚠️ Could not store profile: {e}")
+            else:
+                response['X-Profile-Id'] = profile_id
+            return response
+        return wrapper
+    return decorator
+
+
+# URL pattern used to count links in spam indicator analysis
+URL_COUNT_PATTERN = re.compile(
+    r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
+)
+
+# Every byte except A-Z, for counting uppercase letters in ASCII text
+NON_UPPERCASE_BYTES = bytes(b for b in range(256) if not 65 <= b <= 90)
+
+
+def count_uppercase(text):
+    """Count uppercase characters without a per-character Python loop."""
+    if text.isascii():
+        return len(text.encode('ascii').translate(None, NON_UPPERCASE_BYTES))
+    return sum(map(str.isupper, text))
+
+
+def analyze_spam_indicators(text, text_lower=None):
     """
     Analyze email text for spam indicators.
+    text_lower may be passed when the lowercased text is already known.
     Returns dictionary with various spam signals.
     """
     indicators = {
@@ -73,57 +386,26 @@ def analyze_spam_indicators(text):
         'urgency_words': []
     }
     
-    # Define spam keyword lists
-    spam_keywords = [
-        'free', 'win', 'winner', 'cash', 'prize', 'claim', 'urgent', 'limited',
-        'offer', 'deal', 'discount', 'save', 'money', 'credit', 'loan', 'debt',
-        'guarantee', 'bonus', 'gift', 'congratulations', 'selected', 'apply now',
-        'click here', 'act now', 'order now', 'buy now', 'subscribe', 'unsubscribe'
-    ]
-    
-    money_keywords = [
-        '$', '€', '£', 'usd', 'dollar', 'price', 'cost', 'pay', 'payment',
-        'money', 'cash', 'credit', 'account', 'bank', 'invest', 'profit'
-    ]
-    
-    urgency_keywords = [
-        'urgent', 'immediate', 'now', 'hurry', 'limited time', 'expires',
-        'act now', 'don\'t miss', 'last chance', 'today only', 'asap'
-    ]
-    
-    text_lower = text.lower()
-    
-    # Detect suspicious keywords
-    for keyword in spam_keywords:
-        if keyword in text_lower:
-            indicators['suspicious_keywords'].append(keyword.upper())
+    # Detect suspicious keywords, money terms and urgency words in one pass
+    if text_lower is None:
+        text_lower = text.lower()
+    matches = keyword_matcher.find(text_lower)
     
     # Count URLs
-    url_pattern = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-    indicators['url_count'] = len(re.findall(url_pattern, text))
+    indicators['url_count'] = len(URL_COUNT_PATTERN.findall(text))
     
     # Calculate capitalization percentage
     if len(text) > 0:
-        caps_count = sum(1 for c in text if c.isupper())
+        caps_count = count_uppercase(text)
         indicators['caps_percentage'] = round((caps_count / len(text)) * 100, 2)
     
     # Count exclamation marks
     indicators['exclamation_count'] = text.count('!')
     
-    # Detect money-related terms
-    for term in money_keywords:
-        if term in text_lower:
-            indicators['money_terms'].append(term.upper())
-    
-    # Detect urgency words
-    for word in urgency_keywords:
-        if word in text_lower:
-            indicators['urgency_words'].append(word.upper())
-    
     # Limit lists to top 10 items for readability
-    indicators['suspicious_keywords'] = indicators['suspicious_keywords'][:10]
-    indicators['money_terms'] = list(set(indicators['money_terms']))[:10]
-    indicators['urgency_words'] = list(set(indicators['urgency_words']))[:10]
+    indicators['suspicious_keywords'] = [k.upper() for k in matches['suspicious_keywords'][:10]]
+    indicators['money_terms'] = [k.upper() for k in matches['money_terms'][:10]]
+    indicators['urgency_words'] = [k.upper() for k in matches['urgency_words'][:10]]
     
     return indicators
 
@@ -222,142 +504,124 @@ def generate_safety_recommendations(prediction, risk_level):
     return recommendations
 
 
-def get_word_importance(email_text, cleaned_text, prediction):
+def get_word_importance(context):
     """
     Analyze word-level contribution to spam/ham classification.
     Returns list of words with their importance scores.
     """
     try:
-        if vectorizer is None or model is None:
-            return []
-        
-        # Get feature names from vectorizer
-        feature_names = vectorizer.get_feature_names_out()
-        
-        # Transform the cleaned text
-        text_vector = vectorizer.transform([cleaned_text])
-        
-        # Get model coefficients (for linear models like Logistic Regression)
-        word_scores = []
-        
-        if hasattr(model, 'coef_'):
-            # For linear models (Logistic Regression, SVM)
-            coefficients = model.coef_[0]
-            
-            # Get non-zero features in the current email
-            non_zero_features = text_vector.toarray()[0].nonzero()[0]
-            
-            for idx in non_zero_features:
-                word = feature_names[idx]
-                # Higher positive coefficient = more spam-like
-                # Higher negative coefficient = more ham-like
-                importance = float(coefficients[idx])
-                word_scores.append({
-                    'word': word,
-                    'importance': importance,
-                    'type': 'spam' if importance > 0 else 'ham'
-                })
-        
-        elif hasattr(model, 'feature_log_prob_'):
-            # For Naive Bayes
-            # Get log probabilities for spam (class 1) and ham (class 0)
-            spam_log_prob = model.feature_log_prob_[1]
-            ham_log_prob = model.feature_log_prob_[0]
-            
-            # Get non-zero features in the current email
-            non_zero_features = text_vector.toarray()[0].nonzero()[0]
-            
-            for idx in non_zero_features:
-                word = feature_names[idx]
-                # Difference in log probabilities
-                importance = float(spam_log_prob[idx] - ham_log_prob[idx])
-                word_scores.append({
-                    'word': word,
-                    'importance': importance,
-                    'type': 'spam' if importance > 0 else 'ham'
-                })
-        
-        # Sort by absolute importance and return top 20
-        word_scores.sort(key=lambda x: abs(x['importance']), reverse=True)
-        return word_scores[:20]
+        # Top 20 words by absolute importance, from precomputed tables
+        return context.bundle.explainer.explain(context.text_vector, top_n=20)
         
     except Exception as e:
         print(f"Error calculating word importance: {e}")
         return []
 
 
-def extract_patterns(text):
+# Maximum number of matches reported per pattern category
+PATTERN_LIMIT = 10
+
+# Bytes that are not ASCII digits, for counting digits in ASCII text
+NON_DIGIT_BYTES = bytes(b for b in range(256) if not 48 <= b <= 57)
+
+
+def count_digits(text):
     """
-    Extract various patterns from email text (URLs, emails, phone numbers, etc.)
-    Returns dictionary with detected patterns.
+    Count ASCII digits in text. Non-ASCII text may contain other digits
+    matched by \\d, so its length is returned as an upper bound instead.
     """
-    patterns = {
-        'urls': [],
-        'email_addresses': [],
-        'phone_numbers': [],
-        'ip_addresses': [],
-        'dollar_amounts': [],
-        'percentages': []
-    }
-    
+    if text.isascii():
+        return len(text.encode('ascii').translate(None, NON_DIGIT_BYTES))
+    return len(text)
+
+
+# (category, compiled pattern, necessary condition for any match).
+# The condition receives the text and its digit count; when it fails,
+# the pattern cannot match and its scan is skipped entirely.
+PATTERN_EXTRACTORS = [
     # URL pattern
-    url_pattern = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-    patterns['urls'] = re.findall(url_pattern, text)
-    
+    ('urls',
+     re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'),
+     lambda text, digits: '://' in text),
     # Email address pattern
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    patterns['email_addresses'] = re.findall(email_pattern, text)
-    
+    ('email_addresses',
+     re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
+     lambda text, digits: '@' in text),
     # Phone number patterns (various formats)
-    phone_pattern = r'(?:\+?1[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}'
-    patterns['phone_numbers'] = re.findall(phone_pattern, text)
-    
+    ('phone_numbers',
+     re.compile(r'(?:\+?1[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}'),
+     lambda text, digits: digits >= 10),
     # IP address pattern
-    ip_pattern = r'\b(?:\d{1,3}\.){3}\d{1,3}\b'
-    patterns['ip_addresses'] = re.findall(ip_pattern, text)
-    
+    ('ip_addresses',
+     re.compile(r'\b(?:\d{1,3}\.){3}\d{1,3}\b'),
+     lambda text, digits: digits >= 4 and '.' in text),
     # Dollar amounts
-    dollar_pattern = r'\$\s*\d+(?:,\d{3})*(?:\.\d{2})?'
-    patterns['dollar_amounts'] = re.findall(dollar_pattern, text)
-    
+    ('dollar_amounts',
+     re.compile(r'\$\s*\d+(?:,\d{3})*(?:\.\d{2})?'),
+     lambda text, digits: '$' in text and digits >= 1),
     # Percentages
-    percentage_pattern = r'\d+(?:\.\d+)?%'
-    patterns['percentages'] = re.findall(percentage_pattern, text)
+    ('percentages',
+     re.compile(r'\d+(?:\.\d+)?%'),
+     lambda text, digits: '%' in text and digits >= 1),
+]
+
+
+def extract_patterns(text):
+    """
+    Extract various patterns from email text (URLs, emails, phone numbers, etc.)
+    Returns dictionary with detected patterns.
+    """
+    patterns = {}
+    digits = count_digits(text)
     
-    # Limit each list to 10 items
-    for key in patterns:
-        patterns[key] = patterns[key][:10]
+    for key, pattern, may_match in PATTERN_EXTRACTORS:
+        if not may_match(text, digits):
+            patterns[key] = []
+            continue
+        # Stop scanning once PATTERN_LIMIT matches have been collected
+        patterns[key] = [match.group() for match in islice(pattern.finditer(text), PATTERN_LIMIT)]
     
     return patterns
 
 
-def get_all_model_predictions(email_text, cleaned_text):
+def get_all_model_predictions(context):
     """
     Get predictions from all available models for comparison.
     Returns list of model predictions with confidence scores.
     """
-    if not vectorizer or not all_models:
+    bundle = context.bundle
+    all_models = bundle.load_comparison_models()
+    if not all_models:
         return None
     
-    # Vectorize the input
-    email_vectorized = vectorizer.transform([cleaned_text])
-    
     model_results = []
     predictions_list = []
     
+    # Linear models are all scored with one sparse-dense product
+    stacked = bundle.comparison_engine.score(context.text_vector)
+    
     # Get prediction from each model
     for model_name, trained_model in all_models.items():
         try:
             # Get prediction and probability
-            prediction = trained_model.predict(email_vectorized)[0]
+            if model_name in stacked:
+                predictions, probabilities, decisions = stacked[model_name]
+                prediction = predictions[0]
+                proba = probabilities[0] if probabilities is not None else None
+            else:
+                # Other models run on their own (shared with the primary model)
+                prediction, proba = context.model_outputs(trained_model)
+                decisions = None
             
             # Get confidence (probability of predicted class)
-            if hasattr(trained_model, 'predict_proba'):
-                proba = trained_model.predict_proba(email_vectorized)[0]
+            if proba is not None:
                 confidence = float(max(proba))
             elif hasattr(trained_model, 'decision_function'):
                 # For SVM without probability
-                decision = trained_model.decision_function(email_vectorized)[0]
+                if decisions is not None:
+                    decision = decisions[0]
+                else:
+                    decision = trained_model.decision_function(context.text_vector)[0]
                 confidence = float(min(max(decision, 0), 1))
             else:
                 confidence = 0.5  # Default if no probability available
@@ -392,15 +656,546 @@ def get_all_model_predictions(email_text, cleaned_text):
     }
 
 
+def format_prediction_label(prediction):
+    """
+    Convert a raw model prediction to a "spam"/"ham" label.
+    Models may be trained on numeric (1/0) or string ('spam'/'ham') labels.
+    """
+    return "spam" if prediction in (1, 'spam') else "ham"
+
+
+# Optional /api/predict/ response fields, in response order. The verdict
+# (prediction, confidence, email and cleaned lengths) is always included.
+RESPONSE_FIELDS = (
+    'spam_indicators', 'risk_level', 'safety_recommendations',
+    'word_importance', 'patterns', 'model_comparison'
+)
+VERDICT_FIELDS = ('prediction', 'confidence', 'email_length', 'cleaned_length')
+
+# Named sets of optional fields for the "detail" request parameter
+DETAIL_LEVELS = {
+    'minimal': frozenset(),
+    # Everything that does not need another model pass
+    'standard': frozenset({'spam_indicators', 'risk_level', 'safety_recommendations', 'patterns'}),
+    'full': frozenset(RESPONSE_FIELDS),
+}
+
+
+def configured_default_detail():
+    """
+    Return the PREDICT_DEFAULT_DETAIL setting, or "full" (with a warning)
+    if it names no detail level, so a typo does not fail every request.
+    """
+    detail = getattr(settings, 'PREDICT_DEFAULT_DETAIL', 'full')
+    if not isinstance(detail, str) or detail not in DETAIL_LEVELS:
+        print(f"⚠️ Unknown PREDICT_DEFAULT_DETAIL {detail!r}; using 'full'. "
+              f"Available: {', '.join(DETAIL_LEVELS)}")
+        return 'full'
+    return detail
+
+
+# Level for requests that ask for neither "detail" nor "fields", checked once at startup
+PREDICT_DEFAULT_DETAIL = configured_default_detail()
+
+
+def check_detail_level(detail):
+    """Raise ValueError unless detail names one of DETAIL_LEVELS."""
+    # A JSON list or object would not even be hashable
+    if not isinstance(detail, str) or detail not in DETAIL_LEVELS:
+        raise ValueError(f"Unknown detail level: {detail}. Available: {', '.join(DETAIL_LEVELS)}")
+
+
+def resolve_response_fields(data):
+    """
+    Return the optional response fields a /api/predict/ body asks for:
+    its "fields" (a list or comma-separated string of field names), or
+    else its "detail" level (PREDICT_DEFAULT_DETAIL if absent).
+    Raises ValueError for unknown levels or field names.
+    """
+    fields = data.get('fields')
+    if fields is not None:
+        if isinstance(fields, str):
+            fields = [name.strip() for name in fields.split(',') if name.strip()]
+        if not isinstance(fields, list) or not all(isinstance(name, str) for name in fields):
+            raise ValueError('fields must be a list of field names')
+        unknown = set(fields) - set(RESPONSE_FIELDS) - set(VERDICT_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. "
+                             f"Available: {', '.join(RESPONSE_FIELDS)}")
+        return frozenset(fields) & DETAIL_LEVELS['full']
+    
+    detail = data.get('detail') or PREDICT_DEFAULT_DETAIL
+    check_detail_level(detail)
+    return DETAIL_LEVELS[detail]
+
+
+def score_cleaned_texts(cleaned_texts, bundle):
+    """
+    Score many cleaned texts with a single vectorizer and model pass.
+    Returns (labels, confidences) lists aligned with the input.
+    """
+    model = bundle.model
+    
+    # One sparse matrix for the whole batch
+    started = perf_counter()
+    text_matrix = bundle.vectorizer.transform(cleaned_texts)
+    BATCH_STAGES['vectorizing'].observe(perf_counter() - started)
+
+    # Verdicts and confidences are computed exactly as score_email_verdict()
+    # does, so an email gets the same answer from every endpoint. For SVC,
+    # predict() follows the decision function, which can disagree with the
+    # argmax of its Platt-scaled probabilities.
+    started = perf_counter()
+    decisions = None
+    if 'default' in bundle.default_engine:
+        predictions, probabilities, decisions = bundle.default_engine.score(text_matrix)['default']
+    elif hasattr(model, 'predict_proba'):
+        probabilities = model.predict_proba(text_matrix)
+        if getattr(model, 'probability', False):
+            predictions = model.predict(text_matrix)
+        else:
+            predictions = model.classes_[probabilities.argmax(axis=1)]
+    else:
+        predictions = model.predict(text_matrix)
+        probabilities = None
+    
+    if probabilities is not None:
+        confidences = probabilities.max(axis=1)
+    else:
+        if decisions is None and hasattr(model, 'decision_function'):
+            decisions = model.decision_function(text_matrix)
+        if decisions is not None:
+            confidences = 1 / (1 + np.abs(np.asarray(decisions, dtype=np.float64)))
+        else:
+            confidences = np.zeros(len(cleaned_texts))
+    BATCH_STAGES['prediction'].observe(perf_counter() - started)
+
+    labels = [format_prediction_label(prediction) for prediction in predictions]
+    return labels, confidences.tolist()
+
+
+def score_email_batch(emails, bundle=None, detail='standard', endpoint='batch'):
+    """
+    Score a list of {"id", "text"} entries for the batch endpoints.
+    With detail="minimal", results only carry the verdict and spam
+    indicators are not analyzed. endpoint labels the batch metrics.
+    Invalid entries get their own error result instead of failing the batch.
+    Returns a list of per-email results in input order.
+    """
+    # One model version for the whole batch, even if a reload happens meanwhile
+    bundle = bundle or active_bundle()
+    results = [None] * len(emails)
+    valid_positions = []
+    valid_texts = []
+
+    for position, email_data in enumerate(emails):
+        if not isinstance(email_data, dict):
+            results[position] = {
+                'id': '',
+                'status': 'error',
+                'message': 'Invalid email entry'
+            }
+            continue
+
+        email_id = email_data.get('id', '')
+        email_text = email_data.get('text', '')
+
+        if not email_text:
+            results[position] = {
+                'id': email_id,
+                'status': 'error',
+                'message': 'Empty email text'
+            }
+        elif not isinstance(email_text, str):
+            results[position] = {
+                'id': email_id,
+                'status': 'error',
+                'message': 'Email text must be a string'
+            }
+        else:
+            valid_positions.append(position)
+            valid_texts.append(email_text)
+
+    observe_batch(endpoint, valid_texts, len(emails))
+    if not valid_texts:
+        return results
+
+    # Clean all texts, then vectorize and predict them together
+    started = perf_counter()
+    cleaned_texts = batch_clean_texts(
+        valid_texts, n_jobs=getattr(settings, 'BATCH_CLEAN_WORKERS', 1))
+    BATCH_STAGES['cleaning'].observe(perf_counter() - started)
+    labels, confidences = score_cleaned_texts(cleaned_texts, bundle)
+
+    # Spam indicators and risk level, email by email
+    started = perf_counter()
+    for position, email_text, prediction_label, confidence in zip(
+            valid_positions, valid_texts, labels, confidences):
+        email_id = emails[position].get('id', '')
+        if detail == 'minimal':
+            results[position] = {
+                'id': email_id,
+                'status': 'success',
+                'prediction': prediction_label,
+                'confidence': round(confidence, 4),
+                'email_length': len(email_text)
+            }
+            continue
+        try:
+            spam_indicators = analyze_spam_indicators(email_text)
+            risk_level = calculate_risk_level(prediction_label, confidence, spam_indicators)
+
+            results[position] = {
+                'id': email_id,
+                'status': 'success',
+                'prediction': prediction_label,
+                'confidence': round(confidence, 4),
+                'risk_level': risk_level,
+                'email_length': len(email_text),
+                'url_count': spam_indicators['url_count'],
+                'suspicious_keywords_count': len(spam_indicators['suspicious_keywords'])
+            }
+        except Exception as e:
+            results[position] = {
+                'id': email_id,
+                'status': 'error',
+                'message': str(e)
+            }
+    BATCH_STAGES['analysis'].observe(perf_counter() - started)
+
+    return results
+
+
+def score_email_verdict(context, fields=RESPONSE_FIELDS):
+    """
+    Run the model-dependent stages for one email: prediction, confidence
+    and, if they are among the requested fields, word importance and
+    model comparison (None when not requested). Only the prediction and
+    confidence can be reused for near-duplicate emails.
+    """
+    model = context.bundle.model
+    
+    # Step 2: Vectorize (the context keeps the vector for later stages)
+    started = perf_counter()
+    if context.scorer is not None:
+        context.features
+    else:
+        context.text_vector
+    PREDICT_STAGES['vectorizing'].observe(perf_counter() - started)
+    
+    # Step 3: Predict
+    started = perf_counter()
+    decision = None
+    if context.scorer is not None:
+        prediction, probabilities, decision = context.compiled_outputs
+    elif 'default' in context.bundle.default_engine:
+        predictions, probabilities, decisions = context.bundle.default_engine.score(context.text_vector)['default']
+        prediction, decision = predictions[0], decisions[0]
+        if probabilities is not None:
+            probabilities = probabilities[0]
+    else:
+        prediction, probabilities = context.model_outputs(model)
+    PREDICT_STAGES['prediction'].observe(perf_counter() - started)
+    
+    # Step 4: Get confidence score (probability)
+    if probabilities is not None:
+        confidence = float(max(probabilities))
+    else:
+        # For models without predict_proba, use decision_function
+        if decision is None and hasattr(model, 'decision_function'):
+            decision = model.decision_function(context.text_vector)[0]
+        if decision is not None:
+            confidence = float(1 / (1 + abs(decision)))  # Simple conversion
+        else:
+            confidence = 0.0
+    
+    # Step 5: Format prediction label
+    prediction_label = format_prediction_label(prediction)
+    
+    # Step 9: Get word importance scores (if requested)
+    word_importance = None
+    if 'word_importance' in fields:
+        started = perf_counter()
+        word_importance = get_word_importance(context)
+        PREDICT_STAGES['word_importance'].observe(perf_counter() - started)
+    
+    # Step 11: Get predictions from all models (if available and requested)
+    model_comparison = None
+    if 'model_comparison' in fields:
+        started = perf_counter()
+        model_comparison = get_all_model_predictions(context)
+        PREDICT_STAGES['model_comparison'].observe(perf_counter() - started)
+    
+    return {
+        'prediction': prediction_label,
+        'confidence': confidence,
+        'word_importance': word_importance,
+        'model_comparison': model_comparison
+    }
+
+
+def build_prediction_response(data):
+    """
+    Run the single-email pipeline on a parsed /api/predict/ body.
+    Only the stages needed for the requested fields run.
+    Shared by the sync and async views.
+    Returns (response_data, status_code).
+    """
+    email_text = data.get('email_text', '')
+    
+    if not email_text:
+        return {
+            'status': 'error',
+            'message': 'Email text is required'
+        }, 400
+    
+    try:
+        fields = resolve_response_fields(data)
+    except ValueError as e:
+        return {
+            'status': 'error',
+            'message': str(e)
+        }, 400
+    
+    # Model comparison runs unless disabled by settings or by the request
+    compare = getattr(settings, 'MODEL_COMPARISON_ENABLED', True) and data.get('compare', True) is not False
+    if not compare:
+        fields = fields - {'model_comparison'}
+    
+    if isinstance(email_text, str):
+        PREDICT_EMAIL_LENGTH.observe(len(email_text))
+    
+    # Every step below uses this bundle, even if a reload happens meanwhile
+    bundle = active_bundle()
+    model_version = bundle.version
+    
+    content_key = None
+    if isinstance(email_text, str) and (verdict_cache.enabled or near_duplicate_index.enabled):
+        content_key = make_cache_key(email_text, model_version)
+        # Each selection of fields is cached separately
+        if fields == DETAIL_LEVELS['full']:
+            response_key = content_key
+        else:
+            response_key = f"{content_key}:{','.join(sorted(fields)) or 'minimal'}"
+    
+    # Repeated emails are answered from the verdict cache
+    if content_key is not None and verdict_cache.enabled:
+        cached_response = verdict_cache.get(response_key)
+        if cached_response is not None:
+            return cached_response, 200
+    
+    # Step 1: Clean and preprocess the text; later steps share the context
+    context = PredictionContext(email_text, bundle)
+    started = perf_counter()
+    cleaned_text = context.cleaned_text
+    PREDICT_STAGES['cleaning'].observe(perf_counter() - started)
+    
+    # Emails close to a recently scored one reuse its verdict
+    near_duplicate = None
+    if content_key is not None and near_duplicate_index.enabled:
+        near_duplicate = near_duplicate_index.query(context.tokens, model_version)
+    
+    # Steps 2-5, 9 and 11: model-dependent stages
+    if near_duplicate is not None:
+        # Only the verdict is reused; word importance and model comparison
+        # describe the words of this email, not the matched one
+        verdict = dict(near_duplicate.value, word_importance=None, model_comparison=None)
+        if 'word_importance' in fields:
+            started = perf_counter()
+            verdict['word_importance'] = get_word_importance(context)
+            PREDICT_STAGES['word_importance'].observe(perf_counter() - started)
+        if 'model_comparison' in fields:
+            started = perf_counter()
+            verdict['model_comparison'] = get_all_model_predictions(context)
+            PREDICT_STAGES['model_comparison'].observe(perf_counter() - started)
+    else:
+        verdict = score_email_verdict(context, fields)
+        if content_key is not None:
+            near_duplicate_index.add(content_key, context.tokens, {
+                'prediction': verdict['prediction'],
+                'confidence': verdict['confidence']
+            }, model_version)
+    
+    prediction_label = verdict['prediction']
+    confidence = verdict['confidence']
+    
+    response_data = {
+        'status': 'success',
+        'prediction': prediction_label,
+        'confidence': round(confidence, 4),
+        'email_length': len(email_text),
+        'cleaned_length': len(cleaned_text)
+    }
+    
+    # Risk level needs the indicators, recommendations need the risk level
+    if fields & {'spam_indicators', 'risk_level', 'safety_recommendations'}:
+        # Step 6: Analyze spam indicators
+        started = perf_counter()
+        spam_indicators = analyze_spam_indicators(email_text, context.text_lower)
+        PREDICT_STAGES['indicators'].observe(perf_counter() - started)
+        if 'spam_indicators' in fields:
+            response_data['spam_indicators'] = spam_indicators
+        
+        if fields & {'risk_level', 'safety_recommendations'}:
+            # Step 7: Calculate risk level
+            started = perf_counter()
+            risk_level = calculate_risk_level(prediction_label, confidence, spam_indicators)
+            PREDICT_STAGES['risk'].observe(perf_counter() - started)
+            if 'risk_level' in fields:
+                response_data['risk_level'] = risk_level
+            
+            # Step 8: Generate safety recommendations
+            if 'safety_recommendations' in fields:
+                started = perf_counter()
+                response_data['safety_recommendations'] = generate_safety_recommendations(
+                    prediction_label, risk_level)
+                PREDICT_STAGES['recommendations'].observe(perf_counter() - started)
+    
+    if 'word_importance' in fields:
+        response_data['word_importance'] = verdict['word_importance']
+    
+    # Step 10: Extract patterns
+    if 'patterns' in fields:
+        started = perf_counter()
+        response_data['patterns'] = extract_patterns(email_text)
+        PREDICT_STAGES['patterns'].observe(perf_counter() - started)
+    
+    # Add model comparison if requested and available
+    if 'model_comparison' in fields and verdict['model_comparison']:
+        response_data['model_comparison'] = verdict['model_comparison']
+    
+    # Point at the email whose verdict was reused
+    if near_duplicate is not None:
+        response_data['near_duplicate_of'] = near_duplicate.key
+        response_data['near_duplicate_similarity'] = round(near_duplicate.similarity, 4)
+    
+    if content_key is not None:
+        verdict_cache.set(response_key, response_data)
+    
+    return response_data, 200
+
+
+def build_batch_response(data):
+    """
+    Validate and score a parsed /api/predict-batch/ body.
+    Shared by the sync and async views.
+    Returns (response_data, status_code).
+    """
+    emails = data.get('emails', [])
+    
+    if not emails:
+        return {
+            'status': 'error',
+            'message': 'No emails provided for batch processing'
+        }, 400
+    
+    max_emails = getattr(settings, 'BATCH_MAX_EMAILS', 10000)
+    if len(emails) > max_emails:
+        return {
+            'status': 'error',
+            'message': f'Maximum {max_emails} emails allowed per batch'
+        }, 400
+    
+    detail = data.get('detail', 'standard')
+    try:
+        check_detail_level(detail)
+    except ValueError as e:
+        return {
+            'status': 'error',
+            'message': str(e)
+        }, 400
+    
+    results = score_email_batch(emails, detail=detail)
+    
+    # Calculate summary statistics
+    successful_predictions = [r for r in results if r.get('status') == 'success']
+    spam_count = sum(1 for r in successful_predictions if r['prediction'] == 'spam')
+    ham_count = len(successful_predictions) - spam_count
+    total_confidence = sum(r['confidence'] for r in successful_predictions)
+    avg_confidence = total_confidence / len(successful_predictions) if successful_predictions else 0
+    
+    return {
+        'status': 'success',
+        'results': results,
+        'summary': {
+            'total': len(emails),
+            'processed': len(successful_predictions),
+            'failed': len(emails) - len(successful_predictions),
+            'spam_count': spam_count,
+            'ham_count': ham_count,
+            'avg_confidence': round(avg_confidence, 4)
+        }
+    }, 200
+
+
+def build_health_response():
+    """Build the /api/health/ payload."""
+    bundle = active_bundle()
+    
+    return {
+        'status': 'healthy',
+        'models_loaded': bundle is not None,
+        'comparison_models_loaded': sorted(bundle.comparison_models) if bundle is not None else [],
+        'model_version': bundle.version if bundle is not None else None,
+        'model_metrics': bundle.metrics if bundle is not None else {},
+        'model_bundle': model_bundles.stats(),
+        'online_learning': online_learner.stats(),
+        'verdict_cache': verdict_cache.stats(),
+        'near_duplicate_index': near_duplicate_index.stats(),
+        'lemma_cache': lemma_cache_info(),
+        'executor': prediction_executor.stats(),
+        'message': 'Email Spam Detection API is running!'
+    }
+
+
+def models_unavailable_response():
+    """503 response returned while the model files are missing."""
+    return JsonResponse({
+        'status': 'error',
+        'message': 'Models not loaded. Please train the model first.'
+    }, status=503)
+
+
+def read_batch_body(request):
+    """
+    Read a batch request body within BATCH_MAX_BYTES.
+    The batch endpoints read the body stream themselves, so their byte
+    budget applies instead of DATA_UPLOAD_MAX_MEMORY_SIZE, which keeps
+    Django's default for every other endpoint.
+    Returns (body, None), or (None, 413 response) if the body is too large.
+    """
+    max_bytes = getattr(settings, 'BATCH_MAX_BYTES', 10 * 1024 * 1024)
+    too_large = JsonResponse({
+        'status': 'error',
+        'message': f'Batch request body exceeds {max_bytes} bytes'
+    }, status=413)
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > max_bytes:
+        return None, too_large
+    
+    # Bounded even when Content-Length is missing or wrong
+    body = request.read(max_bytes + 1)
+    if len(body) > max_bytes:
+        return None, too_large
+    return body, None
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
+@profile_request('predict')
+@track_request('predict')
 def predict_email(request):
     """
     API endpoint to predict if an email is spam or not.
     
     Request JSON:
     {
-        "email_text": "Your email content here..."
+        "email_text": "Your email content here...",
+        "detail": "minimal" | "standard" | "full",      (optional, default "full")
+        "fields": ["risk_level", "word_importance"]      (optional, instead of detail)
     }
     
     Response JSON:
@@ -409,86 +1204,21 @@ def predict_email(request):
         "confidence": 0.95,
         "status": "success"
     }
+    
+    "minimal" returns only the verdict, "standard" adds the spam
+    indicators, risk level, safety recommendations and patterns, and
+    "full" adds word importance and model comparison. Fields that are
+    not requested are not computed.
     """
     try:
         # Check if models are loaded
-        if model is None or vectorizer is None:
-            return JsonResponse({
-                'status': 'error',
-                'message': 'Models not loaded. Please train the model first.'
-            }, status=503)
+        if active_bundle() is None:
+            return models_unavailable_response()
         
         # Parse request body
         data = json.loads(request.body)
-        email_text = data.get('email_text', '')
-        
-        if not email_text:
-            return JsonResponse({
-                'status': 'error',
-                'message': 'Email text is required'
-            }, status=400)
-        
-        # Step 1: Clean and preprocess the text
-        cleaned_text = clean_text(email_text)
-        
-        # Step 2: Convert to TF-IDF vector
-        text_vector = vectorizer.transform([cleaned_text])
-        
-        # Step 3: Make prediction
-        prediction = model.predict(text_vector)[0]
-        
-        # Step 4: Get confidence score (probability)
-        if hasattr(model, 'predict_proba'):
-            probabilities = model.predict_proba(text_vector)[0]
-            confidence = float(max(probabilities))
-        else:
-            # For models without predict_proba, use decision_function
-            if hasattr(model, 'decision_function'):
-                decision = model.decision_function(text_vector)[0]
-                confidence = float(1 / (1 + abs(decision)))  # Simple conversion
-            else:
-                confidence = 0.0
-        
-        # Step 5: Format prediction label
-        prediction_label = "spam" if prediction == 1 else "ham"
-        
-        # Step 6: Analyze spam indicators
-        spam_indicators = analyze_spam_indicators(email_text)
-        
-        # Step 7: Calculate risk level
-        risk_level = calculate_risk_level(prediction_label, confidence, spam_indicators)
-        
-        # Step 8: Generate safety recommendations
-        safety_recommendations = generate_safety_recommendations(prediction_label, risk_level)
-        
-        # Step 9: Get word importance scores
-        word_importance = get_word_importance(email_text, cleaned_text, prediction)
-        
-        # Step 10: Extract patterns
-        patterns = extract_patterns(email_text)
-        
-        # Step 11: Get predictions from all models (if available)
-        model_comparison = get_all_model_predictions(email_text, cleaned_text)
-        
-        # Step 12: Return enhanced response
-        response_data = {
-            'status': 'success',
-            'prediction': prediction_label,
-            'confidence': round(confidence, 4),
-            'email_length': len(email_text),
-            'cleaned_length': len(cleaned_text),
-            'spam_indicators': spam_indicators,
-            'risk_level': risk_level,
-            'safety_recommendations': safety_recommendations,
-            'word_importance': word_importance,
-            'patterns': patterns
-        }
-        
-        # Add model comparison if available
-        if model_comparison:
-            response_data['model_comparison'] = model_comparison
-        
-        return JsonResponse(response_data)
+        response_data, status = build_prediction_response(data)
+        return JsonResponse(response_data, status=status)
         
     except json.JSONDecodeError:
         return JsonResponse({
@@ -508,17 +1238,24 @@ def health_check(request):
     """
     Health check endpoint to verify if the API is running.
     """
-    models_loaded = model is not None and vectorizer is not None
-    
-    return JsonResponse({
-        'status': 'healthy',
-        'models_loaded': models_loaded,
-        'message': 'Email Spam Detection API is running!'
-    })
+    return JsonResponse(build_health_response())
+
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """
+    Metrics endpoint in the Prometheus text format: request and per-stage
+    latency histograms, batch sizes, email lengths and cache counters.
+    """
+    if not METRICS_ENABLED:
+        return HttpResponseNotFound('Metrics are disabled (METRICS_ENABLED=False)\n')
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@profile_request('batch')
+@track_request('batch')
 def predict_batch(request):
     """
     API endpoint to predict multiple emails at once.
@@ -529,7 +1266,8 @@ def predict_batch(request):
             {"id": 1, "text": "Email content 1"},
             {"id": 2, "text": "Email content 2"},
             ...
-        ]
+        ],
+        "detail": "minimal"     (optional: only prediction and confidence per email)
     }
     
     Response JSON:
@@ -554,114 +1292,390 @@ def predict_batch(request):
     """
     try:
         # Check if models are loaded
-        if model is None or vectorizer is None:
-            return JsonResponse({
-                'status': 'error',
-                'message': 'Models not loaded. Please train the model first.'
-            }, status=503)
+        if active_bundle() is None:
+            return models_unavailable_response()
+        
+        # Read the body within the batch byte budget
+        body, too_large = read_batch_body(request)
+        if too_large is not None:
+            return too_large
         
         # Parse request body
-        data = json.loads(request.body)
-        emails = data.get('emails', [])
+        data = json.loads(body)
+        response_data, status = build_batch_response(data)
+        return JsonResponse(response_data, status=status)
         
-        if not emails:
-            return JsonResponse({
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Invalid JSON format'
+        }, status=400)
+    
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Batch prediction error: {str(e)}'
+        }, status=500)
+
+
+def stream_batch_predictions(lines, batch_size, detail='standard'):
+    """
+    Score an iterable of NDJSON lines in micro-batches.
+    Yields one NDJSON-encoded result per email, in input order,
+    followed by a final summary line.
+    """
+    total = 0
+    processed = 0
+    spam_count = 0
+    total_confidence = 0.0
+    pending = []
+
+    def flush():
+        nonlocal processed, spam_count, total_confidence
+        try:
+            results = score_email_batch(pending, detail=detail, endpoint='stream')
+        except Exception as e:
+            results = [{
+                'id': entry.get('id', '') if isinstance(entry, dict) else '',
                 'status': 'error',
-                'message': 'No emails provided for batch processing'
-            }, status=400)
-        
-        if len(emails) > 100:
-            return JsonResponse({
+                'message': f'Batch prediction error: {str(e)}'
+            } for entry in pending]
+        pending.clear()
+
+        for result in results:
+            if result['status'] == 'success':
+                processed += 1
+                total_confidence += result['confidence']
+                if result['prediction'] == 'spam':
+                    spam_count += 1
+        return ''.join(json.dumps(result) + '\n' for result in results)
+
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        total += 1
+
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # Emit earlier emails first so results stay in input order
+            if pending:
+                yield flush()
+            yield json.dumps({
+                'id': '',
                 'status': 'error',
-                'message': 'Maximum 100 emails allowed per batch'
-            }, status=400)
+                'message': f'Invalid JSON on line {line_number}'
+            }) + '\n'
+            continue
+
+        pending.append(entry)
+        if len(pending) >= batch_size:
+            yield flush()
+
+    if pending:
+        yield flush()
+
+    avg_confidence = total_confidence / processed if processed else 0
+    yield json.dumps({
+        'summary': {
+            'total': total,
+            'processed': processed,
+            'failed': total - processed,
+            'spam_count': spam_count,
+            'ham_count': processed - spam_count,
+            'avg_confidence': round(avg_confidence, 4)
+        }
+    }) + '\n'
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@track_request('stream')
+def predict_stream(request):
+    """
+    API endpoint to score a stream of emails as newline-delimited JSON.
+    
+    Emails are read from the request body and scored in micro-batches,
+    so memory stays flat and results are sent as soon as they are ready.
+    
+    Request body (NDJSON, one email per line):
+        {"id": 1, "text": "Email content 1"}
+        {"id": 2, "text": "Email content 2"}
+    
+    Response body (NDJSON, one result per line, then a summary):
+        {"id": 1, "status": "success", "prediction": "spam", "confidence": 0.95, ...}
+        {"id": 2, "status": "success", "prediction": "ham", "confidence": 0.91, ...}
+        {"summary": {"total": 2, "processed": 2, "failed": 0, ...}}
+    
+    ?detail=minimal leaves out the risk level and indicator counts.
+    """
+    # Check if models are loaded
+    if active_bundle() is None:
+        return models_unavailable_response()
+    
+    detail, invalid = stream_detail(request)
+    if invalid is not None:
+        return invalid
+    
+    batch_size = getattr(settings, 'STREAM_BATCH_SIZE', 64)
+    
+    # Iterating the request reads the body line by line
+    return StreamingHttpResponse(
+        stream_batch_predictions(request, batch_size, detail),
+        content_type='application/x-ndjson'
+    )
+
+
+def stream_detail(request):
+    """
+    Read the ?detail= level of a stream request.
+    Returns (detail, None), or (None, 400 response) for an unknown level.
+    """
+    detail = request.GET.get('detail', 'standard')
+    if detail not in DETAIL_LEVELS:
+        return None, JsonResponse({
+            'status': 'error',
+            'message': f"Unknown detail level: {detail}. Available: {', '.join(DETAIL_LEVELS)}"
+        }, status=400)
+    return detail, None
+
+
+def admin_authorized(request):
+    """Check the X-Admin-Token header against the ADMIN_API_TOKEN setting."""
+    token = getattr(settings, 'ADMIN_API_TOKEN', '')
+    if not token:
+        return False
+    supplied = request.headers.get('X-Admin-Token', '')
+    return hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8'))
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def reload_models(request):
+    """
+    Admin endpoint to load the model files again and swap them in.
+    Requires the X-Admin-Token header. Requests keep being served by the
+    old models while the new ones load. Only the worker process handling
+    this request reloads; other workers pick up new files through their
+    file watcher (MODEL_RELOAD_INTERVAL).
+    
+    Request JSON (optional):
+    {
+        "force": true    // reload even if the files are unchanged
+    }
+    """
+    if not admin_authorized(request):
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Admin token required'
+        }, status=403)
+    
+    try:
+        data = json.loads(request.body) if request.body else {}
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Invalid JSON format'
+        }, status=400)
+    
+    previous = active_bundle()
+    previous_version = previous.version if previous is not None else None
+    try:
+        reloaded = model_bundles.reload(force=data.get('force') is True)
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Reload failed: {str(e)}',
+            'model_version': previous_version
+        }, status=500)
+    
+    return JsonResponse({
+        'status': 'success',
+        'reloaded': reloaded,
+        'previous_version': previous_version,
+        'model_version': active_bundle().version
+    })
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def submit_feedback(request):
+    """
+    Admin endpoint to correct the label of a scored email. Requires the
+    X-Admin-Token header. The label is logged and learned by the next
+    online learning checkpoint (ONLINE_LEARNING_INTERVAL), which is then
+    served as a new model version.
+    
+    Request JSON:
+    {
+        "email_text": "Email content here...",
+        "label": "spam"    // or "ham"
+    }
+    """
+    if not admin_authorized(request):
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Admin token required'
+        }, status=403)
+    
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Invalid JSON format'
+        }, status=400)
+    
+    email_text = data.get('email_text', '') if isinstance(data, dict) else ''
+    if not isinstance(email_text, str) or not email_text.strip():
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Email text is required'
+        }, status=400)
+    
+    label = data.get('label')
+    if label not in FEEDBACK_LABELS:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'label must be one of: {", ".join(FEEDBACK_LABELS)}'
+        }, status=400)
+    
+    bundle = active_bundle()
+    model_version = bundle.version if bundle is not None else None
+    try:
+        online_learner.record(email_text, label, model_version=model_version)
+    except OSError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Could not store feedback: {str(e)}'
+        }, status=500)
+    
+    return JsonResponse({
+        'status': 'accepted',
+        'label': label,
+        'model_version': model_version,
+        # Logged feedback is only learned while the learner runs
+        'online_learning': online_learner.running
+    }, status=202)
+
+
+@require_http_methods(["GET"])
+def list_profiles(request):
+    """
+    Admin endpoint listing the stored request profiles, newest first.
+    Requires the X-Admin-Token header.
+    """
+    if not admin_authorized(request):
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Admin token required'
+        }, status=403)
+    
+    return JsonResponse({
+        'status': 'success',
+        'profiling_enabled': PROFILING_ENABLED,
+        'sample_rate': PROFILE_SAMPLE_RATE,
+        'profiles': profile_store.list()
+    })
+
+
+@require_http_methods(["GET"])
+def download_profile(request, profile_id):
+    """
+    Admin endpoint returning one stored profile as a pstats file, or with
+    ?format=text as a report sorted by cumulative time.
+    Requires the X-Admin-Token header.
+    """
+    if not admin_authorized(request):
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Admin token required'
+        }, status=403)
+    
+    path = profile_store.profile_path(profile_id)
+    if path is None:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Unknown profile: {profile_id}'
+        }, status=404)
+    
+    if request.GET.get('format') == 'text':
+        return HttpResponse(profile_store.summary(profile_id), content_type='text/plain; charset=utf-8')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{profile_id}.prof',
+                        content_type='application/octet-stream')
+
+
+def executor_saturated_response(error):
+    """503 response returned when the prediction executor is full."""
+    response = JsonResponse({
+        'status': 'error',
+        'message': f'Server busy: {str(error)}'
+    }, status=503)
+    response['Retry-After'] = '1'
+    return response
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@track_request('predict')
+async def predict_email_async(request):
+    """
+    Async variant of predict_email for ASGI servers.
+    The pipeline runs on the bounded prediction executor, so the event
+    loop keeps serving other requests while inference is in progress.
+    """
+    try:
+        # Check if models are loaded
+        if active_bundle() is None:
+            return models_unavailable_response()
         
-        results = []
-        total_confidence = 0
-        spam_count = 0
-        ham_count = 0
+        # Parse request body
+        data = json.loads(request.body)
+        response_data, status = await prediction_executor.run(build_prediction_response, data)
+        return JsonResponse(response_data, status=status)
         
-        for email_data in emails:
-            email_id = email_data.get('id', '')
-            email_text = email_data.get('text', '')
-            
-            if not email_text:
-                results.append({
-                    'id': email_id,
-                    'status': 'error',
-                    'message': 'Empty email text'
-                })
-                continue
-            
-            try:
-                # Clean and preprocess
-                cleaned_text = clean_text(email_text)
-                
-                # Transform to vector
-                text_vector = vectorizer.transform([cleaned_text])
-                
-                # Predict
-                prediction = model.predict(text_vector)[0]
-                
-                # Get confidence
-                if hasattr(model, 'predict_proba'):
-                    probabilities = model.predict_proba(text_vector)[0]
-                    confidence = float(max(probabilities))
-                else:
-                    confidence = 0.5
-                
-                # Format prediction
-                prediction_label = "spam" if prediction == 1 else "ham"
-                
-                # Analyze indicators
-                spam_indicators = analyze_spam_indicators(email_text)
-                
-                # Calculate risk level
-                risk_level = calculate_risk_level(prediction_label, confidence, spam_indicators)
-                
-                # Count spam/ham
-                if prediction_label == "spam":
-                    spam_count += 1
-                else:
-                    ham_count += 1
-                
-                total_confidence += confidence
-                
-                results.append({
-                    'id': email_id,
-                    'status': 'success',
-                    'prediction': prediction_label,
-                    'confidence': round(confidence, 4),
-                    'risk_level': risk_level,
-                    'email_length': len(email_text),
-                    'url_count': spam_indicators['url_count'],
-                    'suspicious_keywords_count': len(spam_indicators['suspicious_keywords'])
-                })
-                
-            except Exception as e:
-                results.append({
-                    'id': email_id,
-                    'status': 'error',
-                    'message': str(e)
-                })
+    except ExecutorSaturated as e:
+        return executor_saturated_response(e)
+    
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Invalid JSON format'
+        }, status=400)
+    
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Prediction error: {str(e)}'
+        }, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@track_request('batch')
+async def predict_batch_async(request):
+    """
+    Async variant of predict_batch for ASGI servers.
+    Scoring runs on the bounded prediction executor.
+    """
+    try:
+        # Check if models are loaded
+        if active_bundle() is None:
+            return models_unavailable_response()
         
-        # Calculate summary statistics
-        successful_predictions = [r for r in results if r.get('status') == 'success']
-        avg_confidence = total_confidence / len(successful_predictions) if successful_predictions else 0
+        # Read the body within the batch byte budget
+        body, too_large = read_batch_body(request)
+        if too_large is not None:
+            return too_large
         
-        return JsonResponse({
-            'status': 'success',
-            'results': results,
-            'summary': {
-                'total': len(emails),
-                'processed': len(successful_predictions),
-                'failed': len(emails) - len(successful_predictions),
-                'spam_count': spam_count,
-                'ham_count': ham_count,
-                'avg_confidence': round(avg_confidence, 4)
-            }
-        })
+        # Parse request body
+        data = json.loads(body)
+        response_data, status = await prediction_executor.run(build_batch_response, data)
+        return JsonResponse(response_data, status=status)
         
+    except ExecutorSaturated as e:
+        return executor_saturated_response(e)
+    
     except json.JSONDecodeError:
         return JsonResponse({
             'status': 'error',
@@ -673,3 +1687,65 @@ def predict_batch(request):
             'status': 'error',
             'message': f'Batch prediction error: {str(e)}'
         }, status=500)
+
+
+async def iterate_on_executor(chunks, first):
+    """
+    Async iterator over a sync chunk generator whose first chunk is
+    already computed. Each further chunk is produced on the prediction
+    executor; while the executor is full, the admitted stream waits for
+    a free slot instead of failing halfway.
+    """
+    yield first
+    while True:
+        try:
+            chunk = await prediction_executor.run(next, chunks, None)
+        except ExecutorSaturated:
+            await asyncio.sleep(STREAM_RETRY_SECONDS)
+            continue
+        if chunk is None:
+            return
+        yield chunk
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@track_request('stream')
+async def predict_stream_async(request):
+    """
+    Async variant of predict_stream for ASGI servers.
+    Django buffers a sync iterator completely before sending it under
+    ASGI, so this view streams an async iterator instead. Micro-batches
+    are scored on the bounded prediction executor and sent as soon as
+    they are ready; a full executor rejects the stream with 503 before
+    any result is sent.
+    """
+    # Check if models are loaded
+    if active_bundle() is None:
+        return models_unavailable_response()
+    
+    detail, invalid = stream_detail(request)
+    if invalid is not None:
+        return invalid
+    
+    batch_size = getattr(settings, 'STREAM_BATCH_SIZE', 64)
+    chunks = stream_batch_predictions(request, batch_size, detail)
+    try:
+        # The generator always yields at least the summary line
+        first = await prediction_executor.run(next, chunks)
+    except ExecutorSaturated as e:
+        return executor_saturated_response(e)
+    
+    return StreamingHttpResponse(
+        iterate_on_executor(chunks, first),
+        content_type='application/x-ndjson'
+    )
+
+
+@require_http_methods(["GET"])
+async def health_check_async(request):
+    """
+    Async variant of health_check. Answers directly on the event loop,
+    so it stays responsive while the executor is saturated.
+    """
+    return JsonResponse(build_health_response())
@@ -173,3 +173,149 @@ CSRF_TRUSTED_ORIGINS = [
 #        r"^moz-extension://[a-z0-9-]+$",
 #    ]
 
+
+# Batch prediction limits
+# Requests to /api/predict-batch/ are bounded by email count and body size
+# instead of a fixed 100-email cap. The batch endpoints enforce
+# BATCH_MAX_BYTES themselves; DATA_UPLOAD_MAX_MEMORY_SIZE keeps Django's
+# default for every other endpoint.
+BATCH_MAX_EMAILS = int(os.environ.get('BATCH_MAX_EMAILS', 10000))
+BATCH_MAX_BYTES = int(os.environ.get('BATCH_MAX_BYTES', 20 * 1024 * 1024))
+
+# Lemma cache
+# Bounded LRU cache of token -> lemma lookups shared by clean_text() and
+# batch_clean_texts(). Hit/miss counters are reported on /api/health/.
+LEMMA_CACHE_SIZE = int(os.environ.get('LEMMA_CACHE_SIZE', 50000))
+# Pre-seed the cache with the trained vectorizer's vocabulary at startup
+LEMMA_CACHE_WARMUP = os.environ.get('LEMMA_CACHE_WARMUP', 'True') == 'True'
+
+# Worker processes used to clean large batches (1 = serial, -1 = all CPUs).
+# Keep this at 1 when running many gunicorn workers per host.
+BATCH_CLEAN_WORKERS = int(os.environ.get('BATCH_CLEAN_WORKERS', 1))
+
+# Streaming prediction (/api/predict-stream/)
+# Emails are scored in micro-batches of this size; smaller batches return
+# the first results sooner, larger ones amortize model calls better.
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 64))
+
+# Async views
+# Set USE_ASYNC_VIEWS=True when serving spam_detection.asgi with uvicorn or
+# daphne. Predictions then run on a bounded thread pool; requests beyond
+# WORKERS + MAX_QUEUE are rejected with 503 instead of queueing forever.
+USE_ASYNC_VIEWS = os.environ.get('USE_ASYNC_VIEWS', 'False') == 'True'
+PREDICTION_EXECUTOR_WORKERS = int(os.environ.get('PREDICTION_EXECUTOR_WORKERS', os.cpu_count() or 1))
+PREDICTION_EXECUTOR_MAX_QUEUE = int(os.environ.get('PREDICTION_EXECUTOR_MAX_QUEUE', 64))
+
+# Verdict cache
+# Full /api/predict/ responses are cached by a hash of the email text and
+# the model artifact version. Set VERDICT_CACHE_SIZE=0 to disable;
+# VERDICT_CACHE_TTL is in seconds (0 = entries never expire).
+VERDICT_CACHE_SIZE = int(os.environ.get('VERDICT_CACHE_SIZE', 10000))
+VERDICT_CACHE_TTL = int(os.environ.get('VERDICT_CACHE_TTL', 300))
+
+# Near-duplicate index
+# Emails whose cleaned token sets are at least NEAR_DUPLICATE_THRESHOLD
+# similar (estimated Jaccard) to a recently scored email reuse its verdict
+# and report it as "near_duplicate_of". NEAR_DUPLICATE_MAX_ENTRIES=0
+# disables the index; emails with fewer distinct tokens than
+# NEAR_DUPLICATE_MIN_TOKENS are never matched.
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', 0.85))
+NEAR_DUPLICATE_MAX_ENTRIES = int(os.environ.get('NEAR_DUPLICATE_MAX_ENTRIES', 100000))
+NEAR_DUPLICATE_TTL = int(os.environ.get('NEAR_DUPLICATE_TTL', 3600))
+NEAR_DUPLICATE_MIN_TOKENS = int(os.environ.get('NEAR_DUPLICATE_MIN_TOKENS', 10))
+
+# Spam indicator keywords
+# Override the default lists from predictor/keywords.py by defining
+# SPAM_KEYWORDS, MONEY_KEYWORDS or URGENCY_KEYWORDS here. All lists are
+# compiled into one automaton, so extra keywords do not add extra passes.
+
+# Compiled scorer
+# With USE_COMPILED_SCORER=True, /api/predict/ vectorizes and scores the
+# default model with a NumPy-only scorer instead of sklearn. Build it with
+#   python -m predictor.ml.compiled
+# after every retraining; a scorer compiled from other model files is
+# ignored. COMPILED_MODEL_DIR defaults to predictor/ml/compiled/.
+USE_COMPILED_SCORER = os.environ.get('USE_COMPILED_SCORER', 'False') == 'True'
+COMPILED_MODEL_DIR = os.environ.get('COMPILED_MODEL_DIR', '')
+
+# Memory-mapped models
+# Model pickles are loaded with their arrays memory-mapped read-only, so
+# all gunicorn workers on a host share one copy through the page cache.
+# Artifacts must be saved uncompressed (joblib's default) and replaced by
+# renaming, never rewritten in place; train_all_models.py does both.
+MODEL_MMAP = os.environ.get('MODEL_MMAP', 'True') == 'True'
+
+# Model comparison
+# The comparison models (model_nb/lr/rf/svm.pkl) are loaded by the first
+# /api/predict/ request that includes "model_comparison". Requests can
+# skip it with {"compare": false}; MODEL_COMPARISON_ENABLED=False turns
+# it off entirely, so scoring-only workers only hold the default model
+# and the vectorizer.
+MODEL_COMPARISON_ENABLED = os.environ.get('MODEL_COMPARISON_ENABLED', 'True') == 'True'
+
+# Model hot reload
+# Each worker polls the model files every MODEL_RELOAD_INTERVAL seconds
+# (0 = off) and, once a change has settled for one interval, loads and
+# warms the new models in the background before swapping them in.
+# POST /api/admin/reload/ with the header "X-Admin-Token: <ADMIN_API_TOKEN>"
+# reloads the worker that receives it; admin endpoints are disabled
+# while ADMIN_API_TOKEN is empty.
+MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', 0))
+ADMIN_API_TOKEN = os.environ.get('ADMIN_API_TOKEN', '')
+
+# Model registry
+# train_all_models.py publishes each training run as an immutable version
+# under MODEL_REGISTRY_DIR (default predictor/ml/registry/) and points
+# registry/CURRENT at it. Workers verify the files against the version's
+# manifest and score its warmup corpus before serving it. MODEL_VERSION
+# pins a version instead of following CURRENT. Without any version the
+# loose files in predictor/ml/ are served. Manage versions with
+#   python -m predictor.ml.registry list|verify|activate|publish
+MODEL_REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR', '')
+MODEL_VERSION = os.environ.get('MODEL_VERSION', '')
+
+# Response detail
+# /api/predict/ bodies may set "detail" to "minimal" (verdict only),
+# "standard" (plus indicators, risk level, recommendations and patterns)
+# or "full" (plus word importance and model comparison), or list the
+# wanted "fields". Stages that are not requested are skipped.
+# PREDICT_DEFAULT_DETAIL applies to requests that ask for neither; an
+# unknown value is reported at startup and "full" is used instead.
+PREDICT_DEFAULT_DETAIL = os.environ.get('PREDICT_DEFAULT_DETAIL', 'full')
+
+# Metrics
+# GET /api/metrics/ serves request and per-stage latency histograms, batch
+# size and email length distributions and cache counters in the
+# Prometheus text format. Metrics are kept per worker process.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+
+# Request profiling
+# With PROFILING_ENABLED, /api/predict/ and /api/predict-batch/ requests
+# run under cProfile when they send "X-Profile: 1" with the admin token,
+# or with probability PROFILE_SAMPLE_RATE. Profiles are stored in
+# PROFILE_DIR under the hash of the request body (the newest
+# PROFILE_MAX_FILES are kept) and listed on GET /api/admin/profiles/.
+# Disabled, the views are not wrapped at all. The async views
+# (USE_ASYNC_VIEWS) are never profiled.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False') == 'True'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', str(BASE_DIR / 'profiles'))
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 50))
+
+# Online learning
+# POST /api/feedback/ (admin token) logs corrected labels to FEEDBACK_LOG.
+# Every ONLINE_LEARNING_INTERVAL seconds (0 = off) new labels are learned
+# with partial_fit by ONLINE_LEARNING_MODEL, which is published as a
+# registry checkpoint and served as the default model if it still
+# reproduces the warmup verdicts of the version it continues (otherwise
+# that version's default model keeps serving). ONLINE_LEARNING_SERVE=False
+# never replaces the default model. Online learning needs an active
+# registry version (python -m predictor.ml.registry publish).
+# Workers that do not publish it pick it up through MODEL_RELOAD_INTERVAL.
+# Only the newest FEEDBACK_KEEP_CHECKPOINTS checkpoints are kept.
+ONLINE_LEARNING_INTERVAL = float(os.environ.get('ONLINE_LEARNING_INTERVAL', 0))
+ONLINE_LEARNING_MODEL = os.environ.get('ONLINE_LEARNING_MODEL', 'Naive Bayes')
+ONLINE_LEARNING_SERVE = os.environ.get('ONLINE_LEARNING_SERVE', 'True') == 'True'
+FEEDBACK_LOG = os.environ.get('FEEDBACK_LOG', '')
+FEEDBACK_SAMPLE_WEIGHT = float(os.environ.get('FEEDBACK_SAMPLE_WEIGHT', 1))
+FEEDBACK_KEEP_CHECKPOINTS = int(os.environ.get('FEEDBACK_KEEP_CHECKPOINTS', 10))
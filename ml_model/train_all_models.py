@@ -1,108 +1,139 @@
 """
 Script to train and save all 4 models for model comparison feature.
-This script trains Naive Bayes, Logistic Regression, Random Forest, and SVM models.
+This script trains Naive Bayes, Logistic Regression, Random Forest, and SVM models
+and publishes them, with the vectorizer, as a new version of the model registry.
+The cleaned corpus and the fitted vectorizer are cached (see
+predictor/ml/training_cache.py), so runs that only change the models skip
+cleaning and vectorizing.
 """
 import pandas as pd
-import joblib
 import os
-from sklearn.model_selection import train_test_split
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.linear_model import LogisticRegression
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.svm import SVC
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 import sys
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from backend.predictor.ml.preprocess import clean_text
-
-print("🚀 Starting model training for all 4 models...")
-
-# Load cleaned dataset
-DATA_PATH = os.path.join(os.path.dirname(__file__), 'spam_cleaned.csv')
-if not os.path.exists(DATA_PATH):
-    print(f"❌ Dataset not found at {DATA_PATH}")
-    print("Please run the EDA notebook first to generate spam_cleaned.csv")
-    exit(1)
-
-print(f"📂 Loading dataset from {DATA_PATH}...")
-df = pd.read_csv(DATA_PATH)
-print(f"✅ Dataset loaded: {len(df)} emails")
-
-# Prepare data
-print("\n🧹 Cleaning email text...")
-df['cleaned_message'] = df['message'].apply(clean_text)
-
-# Create labels (0 for ham, 1 for spam)
-df['label_encoded'] = df['label'].map({'ham': 'ham', 'spam': 'spam'})
-
-# Split data
-X = df['cleaned_message']
-y = df['label_encoded']
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-print(f"📊 Training set: {len(X_train)} emails")
-print(f"📊 Test set: {len(X_test)} emails")
-
-# Create and fit vectorizer
-print("\n🔤 Creating TF-IDF vectorizer...")
-vectorizer = TfidfVectorizer(max_features=3000)
-X_train_vectorized = vectorizer.fit_transform(X_train)
-X_test_vectorized = vectorizer.transform(X_test)
-
-# Save vectorizer (only once)
-vectorizer_path = os.path.join(os.path.dirname(__file__), '..', 'backend', 'predictor', 'ml', 'vectorizer.pkl')
-joblib.dump(vectorizer, vectorizer_path)
-print(f"✅ Vectorizer saved to {vectorizer_path}")
-
-# Define all 4 models
-models = {
-    'Naive Bayes': MultinomialNB(),
-    'Logistic Regression': LogisticRegression(max_iter=1000, random_state=42),
-    'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42),
-    'SVM': SVC(kernel='linear', probability=True, random_state=42)
-}
-
-# Train and save each model
-print("\n🤖 Training all models...\n")
-ml_dir = os.path.join(os.path.dirname(__file__), '..', 'backend', 'predictor', 'ml')
-
-for model_name, model in models.items():
-    print(f"Training {model_name}...")
-    
-    # Train model
-    model.fit(X_train_vectorized, y_train)
-    
-    # Calculate accuracy
-    accuracy = model.score(X_test_vectorized, y_test)
-    print(f"   ✅ Accuracy: {accuracy * 100:.2f}%")
-    
-    # Save model
-    model_filename = {
-        'Naive Bayes': 'model_nb.pkl',
-        'Logistic Regression': 'model_lr.pkl',
-        'Random Forest': 'model_rf.pkl',
-        'SVM': 'model_svm.pkl'
-    }[model_name]
-    
-    model_path = os.path.join(ml_dir, model_filename)
-    joblib.dump(model, model_path)
-    print(f"   💾 Saved to {model_filename}\n")
-
-# Also save the best model as default model.pkl (SVM usually performs best)
-best_model = models['SVM']
-default_model_path = os.path.join(ml_dir, 'model.pkl')
-joblib.dump(best_model, default_model_path)
-print(f"🏆 Best model (SVM) also saved as model.pkl for default predictions")
-
-print("\n✨ All models trained and saved successfully!")
-print(f"📁 Models location: {ml_dir}")
-print("\n📋 Model files created:")
-print("   - model_nb.pkl (Naive Bayes)")
-print("   - model_lr.pkl (Logistic Regression)")
-print("   - model_rf.pkl (Random Forest)")
-print("   - model_svm.pkl (SVM)")
-print("   - model.pkl (Default - SVM)")
-print("   - vectorizer.pkl")
-print("\n🎉 Model comparison feature is now ready!")
+from backend.predictor.ml.preprocess import batch_clean_texts
+from backend.predictor.ml.registry import publish_version
+from backend.predictor.ml.training_cache import load_or_clean, load_or_vectorize
+
+# Worker processes for text cleaning (-1 = all CPUs)
+CLEAN_N_JOBS = int(os.environ.get('CLEAN_N_JOBS', -1))
+
+# Model registry that receives the new version (see predictor/ml/registry.py)
+REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR') or os.path.join(
+    os.path.dirname(__file__), '..', 'backend', 'predictor', 'ml', 'registry')
+
+# Test emails per class stored as the version's warmup corpus
+WARMUP_PER_CLASS = int(os.environ.get('WARMUP_PER_CLASS', 10))
+
+# Cache of the cleaned corpus and TF-IDF features (empty = no caching)
+TRAINING_CACHE_DIR = os.environ.get(
+    'TRAINING_CACHE_DIR', os.path.join(os.path.dirname(__file__), '.cache')) or None
+
+
+def main():
+
+    print("🚀 Starting model training for all 4 models...")
+
+    # Load cleaned dataset
+    DATA_PATH = os.path.join(os.path.dirname(__file__), 'spam_cleaned.csv')
+    if not os.path.exists(DATA_PATH):
+        print(f"❌ Dataset not found at {DATA_PATH}")
+        print("Please run the EDA notebook first to generate spam_cleaned.csv")
+        exit(1)
+
+    print(f"📂 Loading dataset from {DATA_PATH}...")
+    df = pd.read_csv(DATA_PATH)
+    print(f"✅ Dataset loaded: {len(df)} emails")
+
+    # Prepare data (cached under a hash of the dataset and preprocessing code)
+    print("\n🧹 Cleaning email text...")
+    corpus_key, df['cleaned_message'] = load_or_clean(
+        TRAINING_CACHE_DIR, DATA_PATH, df['message'].tolist(),
+        lambda texts: batch_clean_texts(texts, n_jobs=CLEAN_N_JOBS))
+
+    # Create labels (0 for ham, 1 for spam)
+    df['label_encoded'] = df['label'].map({'ham': 'ham', 'spam': 'spam'})
+
+    # Split data, then create and fit the vectorizer on the training rows
+    print("\n🔤 Creating TF-IDF vectorizer...")
+    features = load_or_vectorize(
+        TRAINING_CACHE_DIR, corpus_key, df['cleaned_message'].tolist(),
+        TfidfVectorizer(max_features=3000), test_size=0.2, random_state=42)
+    vectorizer = features.vectorizer
+    X_train_vectorized = features.X_train
+    X_test_vectorized = features.X_test
+    y = df['label_encoded']
+    y_train = y.iloc[features.train_index]
+    y_test = y.iloc[features.test_index]
+
+    print(f"📊 Training set: {len(y_train)} emails")
+    print(f"📊 Test set: {len(y_test)} emails")
+
+    # Define all 4 models
+    models = {
+        'Naive Bayes': MultinomialNB(),
+        'Logistic Regression': LogisticRegression(max_iter=1000, random_state=42),
+        'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42),
+        'SVM': SVC(kernel='linear', probability=True, random_state=42)
+    }
+
+    # Train each model
+    print("\n🤖 Training all models...\n")
+    metrics = {}
+
+    for model_name, model in models.items():
+        print(f"Training {model_name}...")
+
+        # Train model
+        model.fit(X_train_vectorized, y_train)
+
+        # Evaluate on the test set
+        y_pred = model.predict(X_test_vectorized)
+        metrics[model_name] = {
+            'accuracy': accuracy_score(y_test, y_pred),
+            'precision': precision_score(y_test, y_pred, pos_label='spam'),
+            'recall': recall_score(y_test, y_pred, pos_label='spam'),
+            'f1': f1_score(y_test, y_pred, pos_label='spam'),
+        }
+        print(f"   ✅ Accuracy: {metrics[model_name]['accuracy'] * 100:.2f}%\n")
+
+    # Raw test emails of both classes, scored by servers before they serve the version
+    warmup_texts = []
+    for label in ('spam', 'ham'):
+        test_indices = y_test[y_test == label].index[:WARMUP_PER_CLASS]
+        warmup_texts.extend(df.loc[test_indices, 'message'].tolist())
+
+    # Publish everything as one new, immutable registry version
+    # (SVM usually performs best and serves default predictions)
+    print("💾 Publishing model version...")
+    version = publish_version(
+        REGISTRY_DIR, vectorizer, models, 'SVM',
+        metrics=metrics,
+        warmup_texts=warmup_texts,
+        training={'dataset': os.path.basename(DATA_PATH),
+                  'train_size': len(y_train), 'test_size': len(y_test),
+                  'corpus_cache_key': corpus_key, 'features_cache_key': features.key},
+    )
+
+    print("\n✨ All models trained and saved successfully!")
+    print(f"📁 Registry: {REGISTRY_DIR}")
+    print(f"🏷️ Version {version} is now active")
+    print("   - model_nb.pkl (Naive Bayes)")
+    print("   - model_lr.pkl (Logistic Regression)")
+    print("   - model_rf.pkl (Random Forest)")
+    print("   - model_svm.pkl (SVM, default predictions)")
+    print("   - vectorizer.pkl")
+    print("   - compiled/ (NumPy-only scorer)")
+    print("   - manifest.json (hashes, metrics, warmup corpus)")
+    print("\n🎉 Running servers pick it up on reload (MODEL_RELOAD_INTERVAL or /api/admin/reload/)")
+
+
+if __name__ == "__main__":
+    main()
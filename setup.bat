@@ -10,7 +10,13 @@ REM Check Python installation
 echo Checking Python installation...
 python --version >nul 2>&1
 if errorlevel 1 (
-    echo [ERROR] Python is not installed. Please install Python 3.8+ first.
+    echo [ERROR] Python is not installed. Please install Python 3.10+ first.
+    pause
+    exit /b 1
+)
+python -c "import sys; sys.exit(sys.version_info < (3, 10))"
+if errorlevel 1 (
+    echo [ERROR] Django 5 requires Python 3.10+. Please upgrade Python first.
     pause
     exit /b 1
 )
@@ -16,7 +16,11 @@ NC='\033[0m' # No Color
 # Check Python installation
 echo "Checking Python installation..."
 if ! command -v python &> /dev/null; then
-    echo -e "${RED}❌ Python is not installed. Please install Python 3.8+ first.${NC}"
+    echo -e "${RED}❌ Python is not installed. Please install Python 3.10+ first.${NC}"
+    exit 1
+fi
+if ! python -c 'import sys; sys.exit(sys.version_info < (3, 10))'; then
+    echo -e "${RED}❌ Django 5 requires Python 3.10+. Found $(python --version).${NC}"
     exit 1
 fi
 echo -e "${GREEN}✅ Python found: $(python --version)${NC}"